@@ -0,0 +1,7 @@
+"""
+Benchmarks of the hot paths of radarscoped.py.
+
+Each benchmark is a module in this package. To run one, in the main project directory issue e.g.:
+
+$ python3 -m benchmarks.aircraft_batch
+"""
@@ -0,0 +1,63 @@
+"""
+Benchmark of the per-frame cost of projecting and colouring aircraft.
+
+Compares the pure Python and the vectorised NumPy implementations of RadarDaemon.render_aircraft() for 10, 100,
+1,000 and 10,000 aircraft scattered around the receiver.
+
+To run this benchmark, in the main project directory issue the following command:
+
+$ python3 -m benchmarks.aircraft_batch
+"""
+
+import random
+import timeit
+
+import radarscoped
+
+ORIGIN = (53.34, -6.22)
+RADIUS = 72
+
+
+def synthetic_positions(count, origin=ORIGIN, seed=0):
+    """
+    Generate random aircraft positions (lat, lon, altitude) around the origin.
+
+    :param int count: number of aircraft
+    :param (float, float) origin: GPS coordinates of the receiver
+    :param int seed: seed of the random number generator
+    :rtype: list[[float, float, int]]
+    """
+    generator = random.Random(seed)
+    return [[origin[0] + generator.uniform(-3, 3),
+             origin[1] + generator.uniform(-5, 5),
+             generator.randrange(0, 45000, 25)] for _ in range(count)]
+
+
+def measure(function, *args):
+    """
+    Return the best time in milliseconds of a single call to function.
+    """
+    timer = timeit.Timer(lambda: function(*args))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=5, number=number)) / number * 1000
+
+
+def main():
+    radard = radarscoped.RadarDaemon('/tmp/benchmark_radard.pid')
+    projection = radard.get_projection(RADIUS, ORIGIN)
+
+    print('{:>8} {:>12} {:>12} {:>8}'.format('aircraft', 'python [ms]', 'numpy [ms]', 'speedup'))
+    for count in (10, 100, 1000, 10000):
+        positions = synthetic_positions(count)
+        python_time = measure(radard.render_aircraft_python, positions, projection)
+
+        if radarscoped.np is None:
+            print('{:>8} {:>12.3f} {:>12} {:>8}'.format(count, python_time, 'n/a', 'n/a'))
+            continue
+
+        numpy_time = measure(radard.render_aircraft_numpy, positions, projection)
+        print('{:>8} {:>12.3f} {:>12.3f} {:>7.1f}x'.format(count, python_time, numpy_time, python_time / numpy_time))
+
+
+if __name__ == '__main__':
+    main()
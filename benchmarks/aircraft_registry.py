@@ -0,0 +1,81 @@
+"""
+Benchmark of the per-frame memory allocations of tracking aircraft.
+
+Compares rebuilding the list of aircraft positions from scratch on every frame (RadarDaemon.parse_positions()) with
+merging each snapshot into an AircraftRegistry in place. The allocations are measured with tracemalloc, by keeping
+the results of all frames alive and counting the memory blocks (allocated in radarscoped.py) left over per frame.
+Objects replacing ones which are freed in the same frame, such as updated timestamps, cancel out.
+
+To run this benchmark, in the main project directory issue the following command:
+
+$ python3 -m benchmarks.aircraft_registry
+"""
+
+import tracemalloc
+
+import radarscoped
+from benchmarks.aircraft_batch import synthetic_positions
+
+FRAMES = 100
+
+
+def synthetic_aircraft(count):
+    """
+    Generate a list of aircraft as listed in aircraft.json.
+
+    :param int count: number of aircraft
+    :rtype: list[dict]
+    """
+    return [{'hex': '{:06x}'.format(i), 'lat': lat, 'lon': lon, 'altitude': alt, 'track': 90.0, 'speed': 400.0,
+             'vert_rate': 0, 'seen': 0.5, 'seen_pos': 0.5}
+            for i, (lat, lon, alt) in enumerate(synthetic_positions(count))]
+
+
+def allocations(frame, frames=FRAMES):
+    """
+    Count the memory blocks and bytes allocated by a single call to frame, on average.
+
+    :return: blocks and bytes per frame
+    :rtype: (float, float)
+    """
+
+    results = list()
+    frame()     # warm up
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(frames):
+        results.append(frame())
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats if stat.traceback[0].filename == radarscoped.__file__)
+    size = sum(stat.size_diff for stat in stats if stat.traceback[0].filename == radarscoped.__file__)
+    return blocks / frames, size / frames
+
+
+def main():
+    header = ('aircraft', 'parse_positions', 'registry merge+render', 'registry render')
+    print('{:>8} {:>22} {:>22} {:>22}'.format(*header))
+    for count in (10, 100, 1000):
+        all_aircraft = synthetic_aircraft(count)
+        registry = radarscoped.AircraftRegistry()
+
+        def rebuild():
+            return radarscoped.RadarDaemon.parse_positions(all_aircraft)
+
+        def merge_and_render():
+            registry.merge(all_aircraft)
+            return registry.positions()
+
+        def render():
+            return registry.positions()
+
+        columns = ['{:>9.0f} blk {:>6.0f} kB'.format(blocks, size / 1024)
+                   for blocks, size in (allocations(rebuild), allocations(merge_and_render), allocations(render))]
+        print('{:>8} {} {} {}'.format(count, *columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark of decoding aircraft.json.
+
+Compares the JSON libraries supported by radarscoped.JSONDecoder (those installed) on synthetic aircraft.json
+documents with 100, 1,000 and 5,000 aircraft. The synthetic aircraft carry
+all the fields reported by a recent dump1090-fa, so the documents are about as large as real ones.
+
+To run this benchmark, in the main project directory issue the following command:
+
+$ python3 -m benchmarks.json_decoding
+"""
+
+import json
+import random
+import timeit
+
+import radarscoped
+
+ORIGIN = (53.34, -6.22)
+
+
+def synthetic_document(count, origin=ORIGIN, seed=0, now=1516655801.7):
+    """
+    Generate an aircraft.json document, formatted the same way as by dump1090-fa (one aircraft per line).
+
+    :param int count: number of aircraft
+    :param (float, float) origin: GPS coordinates of the receiver
+    :param int seed: seed of the random number generator
+    :param float now: the timestamp of the document
+    :rtype: bytes
+    """
+
+    generator = random.Random(seed)
+    lines = list()
+    for i in range(count):
+        plane = {
+            "hex": "{:06x}".format(i), "flight": "RYR{:<5}".format(i % 10000),
+            "alt_baro": generator.randrange(0, 40000, 25), "alt_geom": generator.randrange(0, 40000, 25),
+            "gs": round(generator.uniform(100, 500), 1), "ias": 292, "tas": 414, "mach": 0.664,
+            "track": round(generator.uniform(0, 360), 1), "track_rate": 0.0,
+            "roll": 0.2, "mag_heading": 92.1, "baro_rate": generator.randrange(-3000, 3000, 64), "geom_rate": 2400,
+            "squawk": "{:04o}".format(generator.randrange(0, 4096)), "emergency": "none", "category": "A3",
+            "nav_qnh": 1013.6, "nav_altitude_mcp": 36000,
+            "lat": round(origin[0] + generator.uniform(-3, 3), 6),
+            "lon": round(origin[1] + generator.uniform(-5, 5), 6),
+            "nic": 8, "rc": 186, "seen_pos": round(generator.uniform(0, 10), 1), "version": 2, "nic_baro": 1,
+            "nac_p": 10, "nac_v": 1, "sil": 3, "sil_type": "perhour", "gva": 2, "sda": 2, "mlat": [], "tisb": [],
+            "messages": generator.randrange(1, 10000), "seen": round(generator.uniform(0, 10), 1), "rssi": -8.3,
+        }
+        lines.append(json.dumps(plane, separators=(',', ':')))
+
+    document = '{{ "now" : {},\n  "messages" : 74522051,\n  "aircraft" : [\n    {}\n  ]\n}}\n'.format(
+        now, ',\n    '.join(lines))
+    return document.encode('utf-8')
+
+
+def main():
+    modules = {'orjson': radarscoped.orjson, 'ujson': radarscoped.ujson, 'json': radarscoped.json}
+    backends = [name for name in radarscoped.JSONDecoder.backends if modules[name] is not None]
+
+    print('{:>8} {:>8} {:>8} {:>14}'.format('aircraft', 'size', 'decoder', 'decode [ms]'))
+    for count in (100, 1000, 5000):
+        document = synthetic_document(count)
+        for backend in backends:
+            decoder = radarscoped.JSONDecoder(backend)
+            timer = timeit.Timer(lambda: decoder.decode(document))
+            number, _ = timer.autorange()
+            elapsed = min(timer.repeat(repeat=5, number=number)) / number * 1000
+            print('{:>8} {:>7.0f}k {:>8} {:>14.3f}'.format(count, len(document) / 1024, backend, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Benchmark of the whole fetch, decode, filter, project, colour, draw and show loop of the daemon, without a display.
+
+Drives RadarDaemon.fetch_snapshot(), update() and render() frame after frame from aircraft.json fixtures served from
+memory (no HTTP server is needed), onto a silent display. Each fixture is served once, so every frame decodes and
+renders a new document, like a receiver polled at the frame rate. The fixtures are either synthetic documents with a
+given number of aircraft, or the aircraft.json files of a directory (e.g. recorded from a real receiver), served in
+the order of their names.
+
+For every number of aircraft, the benchmark reports the frames per second, the median and 95th percentile latency of
+each stage of a frame (from the Metrics of the daemon), and the peak memory of a frame measured with tracemalloc. The
+synthetic fixtures are generated with fixed seeds, so results saved with --output on one commit can be compared with
+--compare on another.
+
+To run this benchmark, in the main project directory issue the following command:
+
+$ python3 -m benchmarks.render_loop
+
+or, for example, to compare the current tree with results saved before a change:
+
+$ python3 -m benchmarks.render_loop --aircraft 100 1000 --output before.json
+$ python3 -m benchmarks.render_loop --aircraft 100 1000 --compare before.json
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import time
+import tracemalloc
+
+import radarscoped
+from benchmarks.json_decoding import ORIGIN, synthetic_document
+
+RADIUS = 72
+RECEIVER = json.dumps({'version': '3.5.3', 'refresh': 1000, 'history': 120,
+                       'lat': ORIGIN[0], 'lon': ORIGIN[1]}).encode('utf-8')
+
+
+def synthetic_fixtures(count, fixtures=20):
+    """
+    Generate a series of aircraft.json documents, each with the same aircraft at other positions.
+
+    :param int count: number of aircraft
+    :param int fixtures: number of documents
+    :rtype: list[bytes]
+    """
+    return [synthetic_document(count, seed=i, now=1516655801.7 + i) for i in range(fixtures)]
+
+
+def read_fixtures(directory):
+    """
+    Read the aircraft.json documents of a directory, in the order of their names.
+
+    :param str directory: path of the directory
+    :rtype: list[bytes]
+    """
+
+    documents = list()
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name), 'rb') as file:
+                documents.append(file.read())
+    return documents
+
+
+class FixtureServer(object):
+    """
+    Serve receiver.json, and the aircraft.json fixtures one after another, in place of RadarDaemon.fetch().
+    """
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.served = 0
+        self.headers = http.client.HTTPMessage()
+        self.headers['Content-Type'] = 'application/json; charset=utf-8'
+
+    def fetch(self, url, headers=None):
+        if url.endswith('receiver.json'):
+            return 200, self.headers, RECEIVER
+        document = self.documents[self.served % len(self.documents)]
+        self.served += 1
+        return 200, self.headers, document
+
+
+def create_daemon(documents, display='null', vectorize=True, trail_length=0):
+    """
+    Create a daemon fetching from the fixtures and drawing on a display without hardware.
+
+    :rtype: radarscoped.RadarDaemon
+    """
+
+    radard = radarscoped.RadarDaemon('/tmp/benchmark_radard.pid')
+    radard.logger.setLevel(logging.WARNING)
+    radard.fetch = FixtureServer(documents).fetch
+    radard.set_display(radarscoped.create_display(display, shape=(16, 16)))
+    radard.scope_radius = RADIUS
+    radard.vectorize = vectorize
+    radard.apply_config({'trail_length': trail_length})
+    radard.metrics = radarscoped.Metrics()
+    return radard
+
+
+def frame(radard):
+    """
+    Fetch, merge and render one frame.
+    """
+    snapshot = radard.fetch_snapshot()
+    if snapshot is not None:
+        radard.update(snapshot)
+    radard.render()
+    radard.metrics.frame()
+
+
+def run(documents, frames, display='null', vectorize=True, trail_length=0):
+    """
+    Run the loop for a number of frames.
+
+    :return: frames per second, metrics summary and peak memory of a frame in kB
+    :rtype: (float, dict, float)
+    """
+
+    radard = create_daemon(documents, display, vectorize, trail_length)
+    frame(radard)      # warm up the caches, e.g. the origin and the background
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        frame(radard)
+    elapsed = time.perf_counter() - start
+    summary = radard.metrics.summary()
+
+    # tracing slows everything down, so the memory is measured on separate frames
+    tracemalloc.start()
+    for _ in range(min(frames, len(documents))):
+        frame(radard)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return frames / elapsed, summary, peak / 1024
+
+
+def report(results, baseline=None):
+    """
+    Print the results, and their ratio to the baseline results if given.
+    """
+
+    stages = radarscoped.Metrics.stages
+    for count, result in results.items():
+        base = (baseline or dict()).get(count)
+        line = '{} aircraft: {:.1f} fps, peak {:.0f} kB'.format(count, result['fps'], result['peak_kb'])
+        if base:
+            line += ' (baseline {:.1f} fps, x{:.2f}; {:.0f} kB)'.format(base['fps'], result['fps'] / base['fps'],
+                                                                       base['peak_kb'])
+        print(line)
+        print('{:>10} {:>10} {:>10}{}'.format('stage', 'p50 [us]', 'p95 [us]', '  baseline p50' if base else ''))
+        for stage in stages:
+            timing = result['stages'].get(stage)
+            if not timing:
+                continue
+            line = '{:>10} {:>10.1f} {:>10.1f}'.format(stage, timing['p50'] * 1e6, timing['p95'] * 1e6)
+            if base and stage in base['stages']:
+                line += '  {:>13.1f}'.format(base['stages'][stage]['p50'] * 1e6)
+            print(line)
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the fetch and render loop of the daemon')
+    parser.add_argument('--aircraft', type=int, nargs='+', default=[10, 100, 1000],
+                        help='numbers of synthetic aircraft')
+    parser.add_argument('--fixtures', help='directory of aircraft.json files to use instead of synthetic aircraft')
+    parser.add_argument('--frames', type=int, default=200, help='number of frames to time')
+    parser.add_argument('--display', default='null', choices=('null', 'memory'), help='display to draw on')
+    parser.add_argument('--trails', type=int, default=0, help='number of positions in the trail of each aircraft')
+    parser.add_argument('--no-vectorize', dest='vectorize', action='store_false', help='always render in Python')
+    parser.add_argument('--output', help='save the results as JSON to this file')
+    parser.add_argument('--compare', help='compare with the results saved to this file')
+    args = parser.parse_args()
+
+    if args.fixtures:
+        series = {os.path.basename(os.path.normpath(args.fixtures)): read_fixtures(args.fixtures)}
+    else:
+        series = {str(count): synthetic_fixtures(count) for count in args.aircraft}
+
+    results = dict()
+    for name, documents in series.items():
+        fps, summary, peak = run(documents, args.frames, args.display, args.vectorize, args.trails)
+        results[name] = {'fps': fps, 'peak_kb': peak,
+                         'stages': {stage: {'p50': timing['p50'], 'p95': timing['p95'], 'p99': timing['p99']}
+                                    for stage, timing in summary['stages'].items() if timing['count']}}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Soak test of the daemon replaying hours of recorded traffic as fast as possible.
+
+Replays a log recorded with record_file (or, if none is given, a synthetic log of aircraft crossing the scope, with
+about --aircraft of them at any time) through RadarDaemon.fetch_snapshot(), update() and render(), on the null
+display, one aircraft.json per frame. Every simulated hour, the benchmark reports the frames per second, the CPU time,
+the number of aircraft in the registry and the maximum resident set size of the process, so that growing memory or
+slowing frames over a long day of traffic show up in minutes.
+
+To run this benchmark, in the main project directory issue the following command:
+
+$ python3 -m benchmarks.replay_soak --hours 4
+
+or, to replay a recording:
+
+$ python3 -m benchmarks.replay_soak --log /var/tmp/adsb.log.gz
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import resource
+import tempfile
+import time
+
+import radarscoped
+from benchmarks.json_decoding import ORIGIN
+
+RADIUS = 72
+
+
+def synthetic_log(path, hours=1.0, aircraft=100, interval=1.0, seed=0):
+    """
+    Write a log of aircraft flying straight across the area around the receiver.
+
+    :param str path: path of the log file
+    :param float hours: duration of the traffic in hours
+    :param int aircraft: average number of aircraft at any time
+    :param float interval: number of seconds between two aircraft.json documents
+    :param int seed: seed of the random number generator
+    :return: number of aircraft.json documents written
+    :rtype: int
+    """
+
+    generator = random.Random(seed)
+    recorder = radarscoped.FeedRecorder(path)
+    start = 1516655801.0
+    recorder.record('receiver.json', json.dumps({'lat': ORIGIN[0], 'lon': ORIGIN[1]}).encode('utf-8'), start)
+
+    flights = dict()
+    serial = 0
+    documents = int(hours * 3600 / interval)
+    for n in range(documents):
+        now = start + n * interval
+        # every flight lasts about 20 minutes, so keep as many starting as ending
+        while len(flights) < aircraft or generator.random() < aircraft * interval / 1200:
+            serial += 1
+            flights[serial] = {'lat': ORIGIN[0] + generator.uniform(-2, 2), 'lon': ORIGIN[1] + generator.uniform(-3, 3),
+                               'track': generator.uniform(0, 360), 'gs': generator.uniform(150, 480),
+                               'alt_baro': generator.randrange(0, 40000, 25), 'until': now + generator.expovariate(
+                                   1 / 1200)}
+            if len(flights) >= aircraft * 2:
+                break
+
+        planes = list()
+        for number, flight in list(flights.items()):
+            if flight['until'] < now:
+                del flights[number]
+                continue
+            distance = flight['gs'] * interval / 3600 / 60
+            flight['lat'] += distance * math.cos(math.radians(flight['track']))
+            flight['lon'] += distance * math.sin(math.radians(flight['track'])) / math.cos(math.radians(flight['lat']))
+            planes.append('{{"hex":"{:06x}","alt_baro":{},"gs":{:.1f},"track":{:.1f},"lat":{:.6f},"lon":{:.6f},'
+                          '"seen_pos":0.4,"seen":0.1,"messages":100}}'.format(
+                              number, flight['alt_baro'], flight['gs'], flight['track'], flight['lat'], flight['lon']))
+
+        document = '{{ "now" : {:.1f},\n  "messages" : {},\n  "aircraft" : [\n    {}\n  ]\n}}\n'.format(
+            now, n * 100, ',\n    '.join(planes))
+        recorder.record('aircraft.json', document.encode('utf-8'), now)
+
+    recorder.close()
+    return documents
+
+
+def soak(path):
+    """
+    Replay a log as fast as possible, reporting every simulated hour.
+    """
+
+    radard = radarscoped.RadarDaemon('/tmp/benchmark_radard.pid')
+    radard.logger.setLevel(logging.WARNING)
+    radard.set_display(radarscoped.create_display('null', shape=(16, 16)))
+    radard.scope_radius = RADIUS
+    radard.apply_config({'source': 'replay', 'replay': (path, 0, False)})
+
+    print('{:>6} {:>8} {:>8} {:>9} {:>9} {:>12}'.format('hour', 'frames', 'fps', 'cpu [s]', 'aircraft', 'max rss [MB]'))
+    replay = radard.get_replay()
+    frames = hours = 0
+    started = last_time = time.perf_counter()
+    cpu_started = last_cpu = time.process_time()
+    last_frames = 0
+    clock_started = None
+
+    while not replay.finished:
+        snapshot = radard.fetch_snapshot()
+        if snapshot is not None:
+            radard.update(snapshot)
+        radard.render()
+        frames += 1
+        if clock_started is None:
+            clock_started = replay.clock()
+
+        if replay.clock() - clock_started >= (hours + 1) * 3600 or (replay.finished and frames > last_frames):
+            hours += 1
+            now, cpu = time.perf_counter(), time.process_time()
+            print('{:>6} {:>8} {:>8.0f} {:>9.1f} {:>9} {:>12.1f}'.format(
+                hours, frames, (frames - last_frames) / (now - last_time), cpu - last_cpu, len(radard.registry),
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+            last_frames, last_time, last_cpu = frames, now, cpu
+
+    elapsed = time.perf_counter() - started
+    print('{} frames ({:.1f} simulated hours) in {:.1f}s, {:.1f}s CPU'.format(
+        frames, (replay.clock() - clock_started) / 3600, elapsed, time.process_time() - cpu_started))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay hours of traffic through the daemon as fast as possible')
+    parser.add_argument('--log', help='log recorded with record_file to replay, instead of synthetic traffic')
+    parser.add_argument('--hours', type=float, default=2.0, help='hours of synthetic traffic')
+    parser.add_argument('--aircraft', type=int, default=100, help='average number of synthetic aircraft')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between synthetic aircraft.json')
+    args = parser.parse_args()
+
+    if args.log:
+        soak(args.log)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'adsb.log.gz')
+        started = time.perf_counter()
+        documents = synthetic_log(path, args.hours, args.aircraft, args.interval)
+        print('{} documents of synthetic traffic ({:.1f} MB compressed) generated in {:.1f}s'.format(
+            documents, os.path.getsize(path) / 1e6, time.perf_counter() - started))
+        soak(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark of the startup time and memory of importing a world airport file.
+
+Generates a synthetic file in the format of the airports.csv of OurAirports (about 70,000 rows), and the same
+airports as a GeoJSON FeatureCollection, and compares importing them with Waypoints (streamed and culled to the area
+covered by the scope) with adding every airport with RadarDaemon.add_airport(). The peak memory is measured with
+tracemalloc.
+
+To run this benchmark, in the main project directory issue the following command:
+
+$ python3 -m benchmarks.waypoint_import
+"""
+
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import radarscoped
+from benchmarks.aircraft_batch import ORIGIN, RADIUS
+
+ROWS = 70000
+TYPES = ('small_airport', 'heliport', 'closed', 'medium_airport', 'seaplane_base', 'large_airport', 'balloonport')
+
+
+def synthetic_airports(count, seed=0):
+    """
+    Generate rows of an OurAirports-like airports.csv, scattered over the whole world.
+
+    :param int count: number of airports
+    :param int seed: seed of the random number generator
+    :rtype: list[list]
+    """
+    generator = random.Random(seed)
+    rows = list()
+    for i in range(count):
+        ident = 'X{:05d}'.format(i)
+        lat = generator.uniform(-60, 70)
+        lon = generator.uniform(-180, 180)
+        rows.append([i, ident, generator.choice(TYPES), 'Airport {}'.format(i), round(lat, 6), round(lon, 6),
+                     generator.randrange(0, 5000), 'EU', 'IE', 'IE-D', 'Somewhere', 'no', ident, '', ident,
+                     '', '', ''])
+    return rows
+
+
+def write_files(directory, rows):
+    """
+    Write the airports as a CSV file and as a GeoJSON file.
+
+    :return: paths of the CSV and the GeoJSON file
+    :rtype: (str, str)
+    """
+
+    csv_path = os.path.join(directory, 'airports.csv')
+    with open(csv_path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['id', 'ident', 'type', 'name', 'latitude_deg', 'longitude_deg', 'elevation_ft', 'continent',
+                         'iso_country', 'iso_region', 'municipality', 'scheduled_service', 'gps_code', 'iata_code',
+                         'local_code', 'home_link', 'wikipedia_link', 'keywords'])
+        writer.writerows(rows)
+
+    geojson_path = os.path.join(directory, 'airports.geojson')
+    with open(geojson_path, 'w', encoding='utf-8') as file:
+        features = [{'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [row[5], row[4]]},
+                     'properties': {'ident': row[1], 'type': row[2], 'name': row[3]}} for row in rows]
+        json.dump({'type': 'FeatureCollection', 'features': features}, file)
+
+    return csv_path, geojson_path
+
+
+def measure(function):
+    """
+    Measure the time and the peak memory of a call to function.
+
+    :return: time in milliseconds and peak memory in kB
+    :rtype: (float, float)
+    """
+
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+
+    # tracing slows everything down, so the memory is measured in a separate call
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 1024
+
+
+def main():
+    radard = radarscoped.RadarDaemon('/tmp/benchmark_radard.pid')
+    span = radard.coord_span(RADIUS, ORIGIN)
+    bounds = (span['lat']['min'], span['lat']['max'], span['lon']['min'], span['lon']['max'])
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path, geojson_path = write_files(directory, synthetic_airports(ROWS))
+
+        def add_airports():
+            radard.airports = list()
+            with open(csv_path, encoding='utf-8', newline='') as file:
+                for row in csv.DictReader(file):
+                    radard.add_airport(row['ident'], float(row['latitude_deg']), float(row['longitude_deg']))
+
+        def import_csv():
+            waypoints = radarscoped.Waypoints([csv_path])
+            waypoints.cull(bounds)
+            return waypoints
+
+        def import_geojson():
+            waypoints = radarscoped.Waypoints([geojson_path])
+            waypoints.cull(bounds)
+            return waypoints
+
+        print('{} airports, {} within {} NM of {}'.format(ROWS, len(import_csv()), RADIUS, ORIGIN))
+        print('{:>28} {:>10} {:>12}'.format('', 'time [ms]', 'peak [kB]'))
+        for name, function in (('add_airport() all rows', add_airports),
+                               ('Waypoints CSV', import_csv),
+                               ('Waypoints GeoJSON', import_geojson)):
+            print('{:>28} {:>10.0f} {:>12.0f}'.format(name, *measure(function)))
+
+
+if __name__ == '__main__':
+    main()
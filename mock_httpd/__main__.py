@@ -1,16 +1,31 @@
 """
 Mock HTTP server serving aircraft.json and receiver.json files used for testing.
-By default the server runs on port 10080 (to change, modify tcp_port variable
-at the bottom of the script.
+By default the server runs on port 10080 (to change, use the --port option).
+
+Instead of the static aircraft.json, the server can also serve synthetic traffic: a given number of aircraft flying
+around the receiver, regenerated every second like dump1090 does, to stress the daemon at realistic or worst-case
+scale.
 
 To run this daemon, in the main project directory issue the following command:
 
 $ python3 -m mock_httpd
+
+or, e.g. for 5,000 aircraft within 150 NM of a receiver in Dublin:
+
+$ python3 -m mock_httpd --aircraft 5000 --lat 53.34 --lon -6.22 --radius 150
 """
 
-from http.server import SimpleHTTPRequestHandler, HTTPServer
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import email.utils
+import gzip
+import json
+import math
 import os
+import random
 import sys
+import threading
+import time
 
 class MockHttpdRequestHandler(SimpleHTTPRequestHandler):
     """
@@ -21,15 +36,28 @@ class MockHttpdRequestHandler(SimpleHTTPRequestHandler):
     from the current directory, as long as the URL passed to the server in the
     GET request ends with 'receiver.json' or 'aircraft.json'.
 
+    Responses are sent with HTTP/1.1 keep-alive, the same as lighttpd on a PiAware box does. Like lighttpd, the
+    server also supports conditional requests (ETag / Last-Modified validators) and gzip compression. The files are
+    cached in memory (both plain and compressed) until they change on disk. If the server generates synthetic traffic,
+    its aircraft.json and receiver.json are served instead of the files.
+
     Note, this is only meant to be used for code testing during development.
     """
 
     base = os.path.dirname(__file__)
+    protocol_version = 'HTTP/1.1'
+    # the headers and the body are sent separately, which Nagle's algorithm would delay by up to 40ms per request
+    disable_nagle_algorithm = True
 
     # handle GET requests
     def do_GET(self):
         try:
-            if self.path.endswith('receiver.json'):
+            traffic = getattr(self.server, 'traffic', None)
+            if traffic is not None and self.path.endswith('receiver.json'):
+                self.send_json(*traffic.receiver)
+            elif traffic is not None and self.path.endswith('aircraft.json'):
+                self.send_json(*traffic.document)
+            elif self.path.endswith('receiver.json'):
                 self.handle_json('receiver.json')
             elif self.path.endswith('aircraft.json'):
                 self.handle_json('aircraft.json')
@@ -38,6 +66,60 @@ class MockHttpdRequestHandler(SimpleHTTPRequestHandler):
         except Exception as e:
             print('Failed in do_GET(): {} {}'.format(type(e).__name__, e), file=sys.stderr)
 
+    def not_modified(self, etag, mtime):
+        """
+        Check the validators of a conditional request.
+
+        :param str etag: the current ETag of the file
+        :param int mtime: the current modification time of the file
+        :return: True if the client's copy of the file is up to date
+        """
+
+        if 'If-None-Match' in self.headers:
+            return etag in [tag.strip() for tag in self.headers['If-None-Match'].split(',')]
+
+        if 'If-Modified-Since' in self.headers:
+            try:
+                since = email.utils.parsedate_to_datetime(self.headers['If-Modified-Since'])
+            except (TypeError, ValueError):
+                return False
+            return mtime <= since.timestamp()
+
+        return False
+
+    def send_json(self, body, gzipped, etag, mtime):
+        """
+        Send a JSON document to the client, compressed if the client accepts it, unless the client's copy is current.
+
+        :param bytes body: the document
+        :param bytes gzipped: the document compressed with gzip
+        :param str etag: the ETag of the document
+        :param int mtime: the time the document was last modified
+        """
+
+        last_modified = email.utils.formatdate(mtime, usegmt=True)
+        if self.not_modified(etag, mtime):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.end_headers()
+            return
+
+        compressed = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if compressed:
+            body = gzipped
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.send_header('Vary', 'Accept-Encoding')
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
     def handle_json(self, jsonfile):
         """
         Return the json file to the client
@@ -47,27 +129,216 @@ class MockHttpdRequestHandler(SimpleHTTPRequestHandler):
         jsonfile = os.path.join(self.base, jsonfile)
 
         if os.path.exists(jsonfile):
-            with open(jsonfile, 'rt') as f:
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(bytes(f.read(), 'utf-8'))
+            stat = os.stat(jsonfile)
+            etag = '"{:x}-{:x}"'.format(stat.st_mtime_ns, stat.st_size)
+
+            cache = getattr(self.server, 'cache', dict())
+            cached = cache.get(jsonfile)
+            if cached is None or cached[2] != etag:
+                with open(jsonfile, 'rb') as f:
+                    body = f.read()
+                cached = cache[jsonfile] = (body, gzip.compress(body, 6), etag, int(stat.st_mtime))
+            self.send_json(*cached)
 
         else:
+            body = bytes('File {} not found\n'.format(jsonfile), 'utf-8')
             self.send_response(404)
             self.send_header('Content-type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
-            self.wfile.write(bytes('File {} not found\n'.format(jsonfile), 'utf-8'))
+            self.wfile.write(body)
+
+
+class SyntheticTraffic(threading.Thread):
+    """
+    A thread simulating aircraft flying around a receiver, and keeping their aircraft.json serialised in memory.
+
+    Every interval seconds (1 second, like dump1090), the aircraft are moved along their tracks at their ground speed,
+    climbing or descending towards their cruising altitude and turning now and then, and aircraft.json is regenerated
+    (and compressed) once, to be served to any number of clients until the next update. Aircraft flying out of radius
+    are replaced by new ones entering the area from its edge, so the number of aircraft stays the same.
+    """
+
+    def __init__(self, count=100, origin=(53.34, -6.22), radius=150.0, interval=1.0, seed=None):
+        """
+        :param int count: number of aircraft
+        :param (float, float) origin: GPS coordinates of the receiver
+        :param float radius: radius in Nautical Miles of the area the aircraft fly in
+        :param float interval: number of seconds between updates of aircraft.json
+        :param int seed: seed of the random number generator
+        """
+        super().__init__(name='synthetic-traffic', daemon=True)
+        self.origin = origin
+        self.radius = radius
+        self.interval = interval
+        self.random = random.Random(seed)
+        self.stopped = threading.Event()
+        self.messages = 0
+        self.updates = 0
+        self.spawned = 0
+
+        self.aircraft = [self.spawn(anywhere=True) for _ in range(count)]
+        body = json.dumps({'version': 'mock', 'refresh': int(interval * 1000), 'history': 0,
+                           'lat': origin[0], 'lon': origin[1]}).encode('utf-8')
+        self.receiver = (body, gzip.compress(body, 6), '"receiver"', int(time.time()))
+        self.document = None
+        self.update(0.0)
+
+    def spawn(self, anywhere=False):
+        """
+        Create a new aircraft, either anywhere in the area or entering it from its edge.
+
+        :param bool anywhere: whether to place the aircraft anywhere in the area
+        :return: the aircraft, with the same fields as in aircraft.json (and a few more)
+        :rtype: dict
+        """
 
+        self.spawned += 1
+        serial = self.spawned
+        bearing = self.random.uniform(0, 360)
+        distance = self.radius * (math.sqrt(self.random.random()) if anywhere else 0.98)
+        lat = self.origin[0] + distance * math.cos(math.radians(bearing)) / 60
+        lon = self.origin[1] + distance * math.sin(math.radians(bearing)) / 60 / math.cos(math.radians(self.origin[0]))
+        cruise = self.random.randrange(5000, 41000, 1000)
+        altitude = self.random.randrange(0, cruise, 25) if anywhere else cruise
 
-def run(port):
+        return {
+            'hex': '{:06x}'.format((0x400000 + serial * 7919) % 0xffffff),
+            'flight': '{}{:<5}'.format(self.random.choice(('RYR', 'EIN', 'BAW', 'DLH', 'AFR')), serial % 10000),
+            'alt_baro': altitude, 'cruise': cruise,
+            'gs': round(self.random.uniform(180, 480) if cruise > 20000 else self.random.uniform(100, 250), 1),
+            # inbound aircraft head roughly towards the receiver
+            'track': (bearing + 180 + self.random.uniform(-60, 60)) % 360 if not anywhere else bearing,
+            'track_rate': 0.0, 'baro_rate': 0,
+            'squawk': '{:04o}'.format(self.random.randrange(0, 4096)), 'category': 'A3',
+            'lat': lat, 'lon': lon, 'nic': 8, 'rc': 186, 'version': 2,
+            'messages': 0, 'seen': 0.0, 'seen_pos': 0.0, 'rssi': round(self.random.uniform(-30, -3), 1)
+        }
+
+    def move(self, aircraft, elapsed):
+        """
+        Move an aircraft along its track for elapsed seconds.
+
+        :param dict aircraft: the aircraft
+        :param float elapsed: number of seconds
+        :return: whether the aircraft is still within radius of the receiver
+        :rtype: bool
+        """
+
+        if self.random.random() < 0.01 * elapsed:
+            aircraft['track_rate'] = self.random.choice((0.0, 0.0, -1.5, 1.5, -3.0, 3.0))
+        aircraft['track'] = (aircraft['track'] + aircraft['track_rate'] * elapsed) % 360
+
+        # the altitude is kept exact, and only rounded to 25 ft in aircraft.json, or small steps would be lost
+        climb = aircraft['cruise'] - aircraft['alt_baro']
+        aircraft['baro_rate'] = max(-1500, min(2000, climb * 4))
+        if abs(climb) <= max(25, abs(aircraft['baro_rate']) * elapsed / 60):
+            aircraft['alt_baro'], aircraft['baro_rate'] = aircraft['cruise'], 0
+        else:
+            aircraft['alt_baro'] += aircraft['baro_rate'] * elapsed / 60
+
+        distance = aircraft['gs'] * elapsed / 3600 / 60
+        track = math.radians(aircraft['track'])
+        aircraft['lat'] += distance * math.cos(track)
+        aircraft['lon'] += distance * math.sin(track) / math.cos(math.radians(aircraft['lat']))
+
+        messages = self.random.randrange(0, int(20 * elapsed) + 1)
+        aircraft['messages'] += messages
+        self.messages += messages
+        aircraft['seen'] = round(self.random.uniform(0, 1), 1)
+        aircraft['seen_pos'] = round(self.random.uniform(0, 2), 1)
+
+        dlat = (aircraft['lat'] - self.origin[0]) * 60
+        dlon = (aircraft['lon'] - self.origin[1]) * 60 * math.cos(math.radians(self.origin[0]))
+        return dlat * dlat + dlon * dlon <= self.radius * self.radius
+
+    def update(self, elapsed):
+        """
+        Move all the aircraft, and regenerate aircraft.json.
+
+        :param float elapsed: number of seconds since the last update
+        """
+
+        for i, aircraft in enumerate(self.aircraft):
+            if elapsed and not self.move(aircraft, elapsed):
+                self.aircraft[i] = self.spawn()
+
+        now = time.time()
+        lines = list()
+        for aircraft in self.aircraft:
+            lines.append('{{"hex":"{hex}","flight":"{flight}","alt_baro":{altitude},"alt_geom":{altitude},'
+                         '"gs":{gs},"track":{track:.1f},"baro_rate":{baro_rate:.0f},"squawk":"{squawk}",'
+                         '"category":"{category}","lat":{lat:.6f},"lon":{lon:.6f},"nic":{nic},"rc":{rc},'
+                         '"seen_pos":{seen_pos},"version":{version},"mlat":[],"tisb":[],"messages":{messages},'
+                         '"seen":{seen},"rssi":{rssi}}}'.format(altitude=round(aircraft['alt_baro'] / 25) * 25,
+                                                                 **aircraft))
+
+        # formatted the same way as by dump1090-fa, one aircraft per line
+        body = '{{ "now" : {:.1f},\n  "messages" : {},\n  "aircraft" : [\n    {}\n  ]\n}}\n'.format(
+            now, self.messages, ',\n    '.join(lines)).encode('utf-8')
+        self.updates += 1
+        self.document = (body, gzip.compress(body, 6), '"{:x}"'.format(self.updates), int(now))
+
+    def run(self):
+        last = time.monotonic()
+        while not self.stopped.wait(max(0.0, last + self.interval - time.monotonic())):
+            now = time.monotonic()
+            self.update(now - last)
+            last = now
+
+    def stop(self):
+        self.stopped.set()
+
+
+class MockHttpdServer(ThreadingHTTPServer):
+    """
+    Threading HTTP server, optionally generating synthetic traffic.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, server_address, traffic=None):
+        """
+        :param (str, int) server_address: address and port to listen on
+        :param SyntheticTraffic traffic: the synthetic traffic to serve instead of the static aircraft.json
+        """
+        self.traffic = traffic
+        self.cache = dict()
+        super().__init__(server_address, MockHttpdRequestHandler)
+
+    def serve_forever(self, poll_interval=0.5):
+        if self.traffic is not None and not self.traffic.is_alive():
+            self.traffic.start()
+        super().serve_forever(poll_interval)
+
+    def server_close(self):
+        if self.traffic is not None:
+            self.traffic.stop()
+        super().server_close()
+
+
+def run(port, traffic=None):
     print('starting the server')
     server_address = ('localhost', port)
-    httpd = HTTPServer(server_address, MockHttpdRequestHandler)
+    httpd = MockHttpdServer(server_address, traffic)
     print('running the server')
     httpd.serve_forever()
 
 
 if __name__ == '__main__':
-    tcp_port = 10080
-    run(tcp_port)
+    parser = argparse.ArgumentParser(description='Mock dump1090-fa HTTP server')
+    parser.add_argument('--port', type=int, default=10080, help='TCP port to listen on')
+    parser.add_argument('--aircraft', type=int, default=0,
+                        help='number of synthetic aircraft to serve instead of the static aircraft.json')
+    parser.add_argument('--lat', type=float, default=53.34, help='latitude of the synthetic receiver')
+    parser.add_argument('--lon', type=float, default=-6.22, help='longitude of the synthetic receiver')
+    parser.add_argument('--radius', type=float, default=150.0, help='radius in NM the synthetic aircraft fly in')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between updates of aircraft.json')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the synthetic traffic')
+    args = parser.parse_args()
+
+    synthetic = None
+    if args.aircraft:
+        synthetic = SyntheticTraffic(args.aircraft, (args.lat, args.lon), args.radius, args.interval, args.seed)
+    run(args.port, synthetic)
@@ -0,0 +1,105 @@
+"""
+Mock SBS-1 (BaseStation) server replaying recorded dump1090 messages, used for testing.
+By default the server runs on port 10030 (to change, modify tcp_port variable
+at the bottom of the script). A real dump1090 serves the same format on port 30003.
+
+To run this daemon, in the main project directory issue the following command:
+
+$ python3 -m mock_sbs
+"""
+
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+import datetime
+import os
+import sys
+import time
+
+
+class MockSBSRequestHandler(StreamRequestHandler):
+    """
+    SBS Request Handler class.
+
+    Every client connecting to the server gets the recorded messages from the messages.sbs file, replayed with the
+    same timing as they were recorded with (as per the time the messages were generated), sped up by the server's
+    speed factor. If the server's loop flag is set, the recording is replayed over and over again.
+
+    Note, this is only meant to be used for code testing during development.
+    """
+
+    def handle(self):
+        try:
+            while True:
+                self.replay()
+                if not self.server.loop:
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            print('Failed in handle(): {} {}'.format(type(e).__name__, e), file=sys.stderr)
+
+    def replay(self):
+        """
+        Send all recorded messages to the client.
+        """
+
+        previous = None
+        for line, generated in self.server.messages:
+            if previous is not None and self.server.speed:
+                time.sleep(max(0.0, (generated - previous).total_seconds() / self.server.speed))
+            previous = generated
+
+            self.wfile.write(line)
+            self.wfile.flush()
+
+
+class MockSBSServer(ThreadingTCPServer):
+    """
+    Threading TCP server holding the recorded messages.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, server_address, recording=None, speed=1.0, loop=True):
+        """
+        :param (str, int) server_address: address and port to listen on
+        :param str recording: path of the file with recorded messages; defaults to messages.sbs
+        :param float speed: replay speed factor; 0 replays the messages as fast as possible
+        :param bool loop: replay the recording over and over again
+        """
+        self.messages = self.load(recording or os.path.join(os.path.dirname(__file__), 'messages.sbs'))
+        self.speed = speed
+        self.loop = loop
+        super().__init__(server_address, MockSBSRequestHandler)
+
+    @staticmethod
+    def load(recording):
+        """
+        Load recorded messages along with the time each one was generated.
+
+        :param str recording: path of the file with recorded messages
+        :return: a list of messages (with CRLF line endings, as sent by dump1090) and their generation time
+        :rtype: list[(bytes, datetime.datetime)]
+        """
+
+        messages = list()
+        with open(recording, 'rt') as f:
+            for line in f:
+                fields = line.strip().split(',')
+                if len(fields) < 8:
+                    continue
+                generated = datetime.datetime.strptime(fields[6] + ' ' + fields[7], '%Y/%m/%d %H:%M:%S.%f')
+                messages.append((bytes(line.strip() + '\r\n', 'utf-8'), generated))
+        return messages
+
+
+def run(port):
+    print('starting the server')
+    server = MockSBSServer(('localhost', port))
+    print('running the server')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    tcp_port = 10030
+    run(tcp_port)
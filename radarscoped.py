@@ -9,23 +9,53 @@ The receiver location is in the middle of the screen.
 """
 
 import argparse
+import array
 import atexit
+import collections
 import colorsys
+import concurrent.futures
 import configparser
+import contextlib
+import csv
 import grp
+import gzip
+import http.client
+import http.server
+import itertools
 import json
 import logging
 import logging.handlers
 import math
 import os
 import pwd
+import queue
+import re
 import select
 import signal
 import socket
+import struct
 import sys
+import threading
 import time
-import urllib.request
 import urllib.error
+import urllib.parse
+import urllib.request
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
 
 try:
     import unicornhathd as uh
@@ -214,7 +244,7 @@ class Daemon(object):
         self.create_pidfile()
 
         # Setup signal handlers
-        # signal.signal(signal.SIGHUP, self.sighup_handler)
+        signal.signal(signal.SIGHUP, self.sighup_handler)
         signal.signal(signal.SIGINT, self.sigterm_handler)
         signal.signal(signal.SIGQUIT, self.sigterm_handler)
         signal.signal(signal.SIGTERM, self.sigterm_handler)
@@ -338,6 +368,15 @@ class Daemon(object):
         self.logger.warning("Exiting.")
         raise SystemExit(1)
 
+    def sighup_handler(self, signo, frame):
+        """
+        Sighup handler method. By default this will simply log a message.
+
+        If the daemon can reload its configuration, this method should be overridden in the child class.
+        """
+
+        self.logger.info("Received SIGHUP signal")
+
     def sigusr_handler(self, signo, frame):
         """
         Siginfo handler method. By default his will simply display the status.
@@ -355,359 +394,3660 @@ class Daemon(object):
         raise NotImplementedError
 
 
-class RadarDaemon(Daemon):
+class HTTPConnectionPool(object):
     """
-    Subclass of the Daemon class.
+    A pool of persistent HTTP/1.1 connections.
 
-    This subclass builds on top of the generic Daemon class to implement a daemon process, reading a list of aircraft
-    within the range of the ADSB receiver and plotting their relative positions to that of the receiver on the
-    UnicornHAT HD mounted on the host Raspberry PI.
+    Idle connections are kept open per host and reused for subsequent requests, which saves a TCP handshake on every
+    poll of the ADSB receiver. Every response is read to the end before its connection is handed back to the pool (or
+    closed, if the server doesn't support keep-alive), so sockets are never leaked.
+
+    Failed requests are retried a bounded number of times, with an exponential backoff between attempts. A request
+    failing on a reused connection is retried straight away on a fresh connection, as the server may simply have
+    closed the idle connection in the meantime.
     """
 
-    def __init__(self, pidfile, config_file=None, stdin='/dev/null', stdout='/dev/null', stderr='/dev/null'):
+    def __init__(self, connect_timeout=2.0, read_timeout=5.0, retries=2, backoff=0.5, maxsize=2):
         """
-        Override the init() method of the Daemon class to add extra properties.
+        :param float connect_timeout: timeout in seconds for establishing a connection
+        :param float read_timeout: timeout in seconds for reading the response
+        :param int retries: number of times a failed request is retried
+        :param float backoff: delay in seconds before the first retry, doubled with every further retry
+        :param int maxsize: maximum number of idle connections kept open per host
         """
-        self.adsb_host = 'localhost'
-        self.receiverurl = "http://{}/dump1090-fa/data/receiver.json".format(self.adsb_host)
-        self.aircrafturl = "http://{}/dump1090-fa/data/aircraft.json".format(self.adsb_host)
-        self.scope_radius = 60
-        self.scope_brightness = 0.5
-        self.airport_brightness = 0.2
-        self.scope_rotation = 0
-        self.airports = list()
-        self.aircraft_in_range = 0
-
-        self.sockaddr = ('localhost', 12345)
-        self.socket = None
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.maxsize = maxsize
 
-        super().__init__(pidfile, config_file, stdin, stdout, stderr, daemon_name="radarscoped")
+        self.idle = dict()
+        self.lock = threading.Lock()
+        self.closed = False
 
-    def configure(self):
+    def acquire(self, scheme, netloc):
         """
-        Override the Daemon.configure() method to configure RadarDaemon.
+        Get an idle connection to a given host from the pool, or open a new one.
+
+        :param str scheme: either http or https
+        :param str netloc: host name, optionally followed by a port number
+        :return: the connection and a flag set if the connection has been used before
+        :rtype: (http.client.HTTPConnection, bool)
         """
 
-        self.configuration = configparser.ConfigParser(interpolation=configparser.ExtendedInterpolation())
+        with self.lock:
+            connections = self.idle.get((scheme, netloc))
+            if connections:
+                return connections.pop(), True
 
-        if not self.config_file:
-            self.logger.info('No configuration file specified. Running with defaults')
-            return
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(netloc, timeout=self.connect_timeout)
+        else:
+            conn = http.client.HTTPConnection(netloc, timeout=self.connect_timeout)
 
-        if not os.path.exists(self.config_file):
-            print("Configuration file {} does not exist. Exiting".format(self.config_file))
-            raise SystemExit(1)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        return conn, False
 
-        self.configuration.read(self.config_file)
-
-        if self.configuration.has_section('main'):
-            if not self.username:
-                if 'username' in self.configuration['main']:
-                    self.username = self.configuration.get('main', 'username')
-
-            loglevel = self.configuration.get('main', 'loglevel', fallback='INFO')
-            loglevel = getattr(logging, loglevel.upper())
-            self.logger.setLevel(loglevel)
-
-        if self.configuration.has_section('scope'):
-            self.scope_radius = self.configuration.getint('scope', 'radius', fallback=60)
-            self.scope_brightness = self.configuration.getfloat('scope', 'scope_brightness', fallback=0.5)
-            self.airport_brightness = self.configuration.getfloat('scope', 'airport_brightness', fallback=0.5)
-            self.scope_rotation = self.configuration.getint('scope', 'rotation', fallback=0)
-
-        if self.configuration.has_section('ADSB'):
-            self.adsb_host = self.configuration.get('ADSB', 'adsb_host', fallback='localhost')
-            self.receiverurl = self.configuration.get('ADSB', 'receiver_url',
-                                                      fallback='http://{}/dump1090-fa/data/receiver.json'.format(
-                                                          self.adsb_host
-                                                      ))
-            self.aircrafturl = self.configuration.get('ADSB', 'aircraft_url',
-                                                      fallback='http://{}/dump1090-fa/data/aircraft.json'.format(
-                                                          self.adsb_host
-                                                      ))
-
-        if self.configuration.has_section('airports'):
-            for airport in self.configuration.items(section='airports'):
-                icao_code = airport[0]
-                coordinates = airport[1].strip().split(',')
-                self.add_airport(icao_code, float(coordinates[0]), float(coordinates[1]))
+    def release(self, scheme, netloc, conn):
+        """
+        Return a connection to the pool, closing it if the pool for that host is already full, or if the pool has been
+        closed (e.g. replaced by a reload while the request was in flight).
+        """
 
-    def setup_server_socket(self):
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.bind(self.sockaddr)
-        self.socket.listen()
+        with self.lock:
+            if not self.closed:
+                connections = self.idle.setdefault((scheme, netloc), list())
+                if len(connections) < self.maxsize:
+                    connections.append(conn)
+                    return
 
-    def destroy_server_socket(self):
-        # self.socket.shutdown(socket.SHUT_RDWR)
-        self.socket.close()
-        self.socket = None
+        conn.close()
 
-    def connection_handler(self, socket):
-        conn, _ = socket.accept()
-        buffer = conn.recv(4096)
-        cmd = buffer.decode('utf-8')
+    def request(self, url, headers=None):
+        """
+        Send a GET request and return the response.
+
+        :param str url: URL to fetch
+        :param dict headers: extra request headers
+        :return: HTTP status, response headers and the response body
+        :rtype: (int, http.client.HTTPMessage, bytes)
+        :raises OSError: if the request still fails after all retries
+        :raises http.client.HTTPException: if the server still sends an invalid response after all retries
+        """
 
-        if cmd == 'restart':
-            conn.close()
-            self.restart()
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme or 'http'
+        path = parts.path or '/'
+        if parts.query:
+            path = '{}?{}'.format(path, parts.query)
 
-    def send_command(self, command):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect(self.sockaddr)
-        sock.send(bytes(command.encode('utf-8')))
-        sock.shutdown(socket.SHUT_RDWR)
-        sock.close()
+        attempt = 0
+        while True:
+            conn = None
+            reused = False
+            try:
+                conn, reused = self.acquire(scheme, parts.netloc)
+                conn.request('GET', path, headers=headers or {})
+                response = conn.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                if conn is not None:
+                    conn.close()
+                if reused:
+                    continue
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+                continue
 
-    def add_airport(self, icao_code, latitude, longitude):
-        """
-        Add an airport to the static list of airports for plotting
-        :param str icao_code: ICAO code of the airport (e.g. EIDW for Dublin)
-        :param float latitude: latitude of the ARP
-        :param float longitude: longitude of the ARP
-        """
+            if response.will_close:
+                conn.close()
+            else:
+                self.release(scheme, parts.netloc, conn)
 
-        self.airports.append({
-            "icao_code": icao_code,
-            "lat": latitude,
-            "lon": longitude
-        })
+            return response.status, response.headers, body
 
-    @staticmethod
-    def departure(lat, chlon=1):
+    def close(self):
         """
-        Calculate the geographical departure - an East-West distance at a given latitude.
-
-        :param float lat: the latitude at which to calculate the departure.
-        :param float chlon: change of longitude in degrees
-        :return float: geographic departure in Nautical Miles.
+        Close all idle connections. The connections still in use are closed as they are released.
         """
 
-        return chlon * 60 * math.cos(math.radians(lat))
+        with self.lock:
+            self.closed = True
+            connections = [conn for pool in self.idle.values() for conn in pool]
+            self.idle.clear()
 
-    def coord_span(self, radius, origin=(0, 0)):
-        """
-        Calculate the span of latitudes and longitudes "visible" on the screen for a given radius (in Nautical Miles)
-        from the centre position as set by the origin.
+        for conn in connections:
+            conn.close()
 
-        For example, given GPS coordinates of the origin as (53, -6) and a radius of 72 NM, the span of coordinates
-        visible on the screen will be:
 
-            minimum latitude:   51.8°
-            maximum latitude:   54.2°
-            span of latitudes:   1.2°
+class JSONDecoder(object):
+    """
+    A pluggable JSON decoder.
 
-            minimum longitude:  -7.99°
-            maximum longitude:  -4.00°
-            span of longitudes:  1.99°
+    The decoder uses the fastest JSON library available, in order of preference: orjson, ujson and the json module
+    from the standard library. The data is decoded straight from the bytes of the response, without an intermediate
+    str (as long as it is UTF-8 encoded).
 
-        :param int radius: the radius for which to calculate the lat/lon span
-        :param (float, float) origin: GPS coordinates of centre point
-        :return: a dictionary with minimum, maximum and spans for latitudes and longitudes
-        :rtype: dict
+    The aircraft are kept as decoded, with all their fields: AircraftRegistry.merge() only reads the few it uses.
+    """
+
+    backends = ('orjson', 'ujson', 'json')
+
+    def __init__(self, backend='auto'):
+        """
+        :param str backend: one of orjson, ujson or json, or auto to use the fastest one installed
+        :raises ValueError: if the backend is unknown or not installed
         """
 
-        lat = origin[0]
-        lon = origin[1]
+        modules = {'orjson': orjson, 'ujson': ujson, 'json': json}
 
-        lat_delta = float(radius / 60.0)
-        lon_delta = float(radius / self.departure(lat))
+        if backend == 'auto':
+            backend = next(name for name in self.backends if modules[name] is not None)
+        if backend not in modules:
+            raise ValueError('Unknown JSON decoder {}'.format(backend))
+        if modules[backend] is None:
+            raise ValueError('JSON decoder {} is not installed'.format(backend))
 
-        return {
-            "lat": {
-                "min": lat - lat_delta,
-                "max": lat + lat_delta,
-                "delta": lat_delta
-            },
-            "lon": {
-                "min": lon - lon_delta,
-                "max": lon + lon_delta,
-                "delta": lon_delta
-            }
-        }
+        self.backend = backend
+        self.loads = modules[backend].loads
 
-    def get_json(self, url):
+    def decode(self, data, encoding='utf-8'):
         """
-        Fetch JSON data from a web server and return a dictionary with same.
+        Decode a JSON document.
 
-        :param str url: URL where to fetch the JSON data from
-        :return: a dictionary with JSON data
-        :rtype: dict
+        :param bytes data: the JSON document
+        :param str encoding: character encoding of the document
+        :return: the decoded document
+        :raises ValueError: if the document is not valid JSON
         """
-       
-        json_data = dict()
 
-        try:
-            request = urllib.request.urlopen(url)
-        except urllib.error.URLError as e:
-            self.logger.error("{}: Error opening url: {}".format(type(e).__name__, url))
-            return json_data
+        if encoding.lower().replace('-', '') != 'utf8':
+            data = data.decode(encoding)
 
-        data = request.read()
-        encoding = request.info().get_content_charset('utf-8')
-        json_data = json.loads(data.decode(encoding))
-        return json_data
+        return self.loads(data)
+
+
+class AircraftFeed(object):
+    """
+    The aircraft.json feed of an ADSB receiver.
+
+    dump1090-fa rewrites aircraft.json only about once per second, so polling it more often mostly fetches the same
+    document again. To avoid that, the feed is fetched with a conditional GET (If-None-Match / If-Modified-Since) and
+    gzip compression. If the server responds with 304 Not Modified, or the "now" timestamp at the start of the
+    document hasn't changed, the document is not parsed again and the previously fetched aircraft are returned.
+
+    After every call to get_aircraft(), the changed attribute tells if the returned aircraft are new, and the failed
+    attribute if the fetch failed (and the returned aircraft are those of the last successful fetch). The number of
+    fetches, 304 responses and unchanged documents are counted in the fetches, not_modified and unchanged attributes.
+    The fetch and decode times, 304 responses, unchanged documents and fetch errors are also recorded in Metrics. If
+    the feed is given a name, e.g. when aircraft are merged from several receivers, its fetch times and errors are
+    recorded as those of the named feed instead.
+
+    The seen and seen_pos ages of the aircraft are relative to the time attribute: the "now" timestamp of the document
+    they were listed in, or if it has none, the time it was fetched. It stays the same as long as the same aircraft
+    are returned, so that they don't look any fresher than when they were first fetched.
+    """
+
+    now_pattern = re.compile(rb'"now"\s*:\s*([0-9.]+)')
+
+    def __init__(self, url, fetch, decoder, logger=None, metrics=None, name=None):
+        """
+        :param str url: URL of the aircraft.json file
+        :param fetch: a callable taking url and headers and returning (status, headers, body) of the HTTP response
+        :param JSONDecoder decoder: decoder for the JSON document
+        :param logging.Logger logger: logger to report fetch errors to
+        :param Metrics metrics: metrics to record the timings in
+        :param str name: name of the feed to record the fetch times and errors of; None to record the fetch stage
+        """
+        self.url = url
+        self.name = name
+        self.fetch = fetch
+        self.decoder = decoder
+        self.logger = logger or logging.getLogger(__name__)
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        self.aircraft = list()
+        self.now = None
+        self.time = None
+        self.etag = None
+        self.last_modified = None
+        self.changed = False
+        self.failed = False
+
+        self.fetches = 0
+        self.not_modified = 0
+        self.unchanged = 0
 
     def get_aircraft(self):
         """
-        Get a list of aircraft within the range of the ADSB receiver
+        Fetch the list of aircraft, unless it hasn't changed since the last fetch.
 
-        :return: a dictionary with all aircraft in the range of the receiver.
-        :rtype: dict
+        If the fetch fails, the previously fetched aircraft are returned.
+
+        :return: aircraft as listed in aircraft.json
+        :rtype: list[dict]
         """
 
-        data = self.get_json(self.aircrafturl)
-        
-        if 'aircraft' in data.keys():
-            return data["aircraft"]
-        else:
-            return data
+        self.changed = False
+        self.failed = False
 
-    def get_receiver_origin(self):
+        headers = {'Accept-Encoding': 'gzip'}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+
+        try:
+            self.fetches += 1
+            timer = self.metrics.timer('fetch') if self.name is None else self.metrics.feed_timer(self.name)
+            with timer:
+                status, response_headers, body = self.fetch(self.url, headers)
+
+            if status == 304:
+                self.not_modified += 1
+                self.metrics.count('not_modified')
+                return self.aircraft
+
+            started = time.perf_counter()
+            if response_headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+
+            etag = response_headers.get('ETag')
+            last_modified = response_headers.get('Last-Modified')
+
+            # dump1090 puts the timestamp of the document at its very start
+            match = self.now_pattern.search(body, 0, 256)
+            now = match.group(1) if match else None
+            if now is not None and now == self.now:
+                self.unchanged += 1
+                self.metrics.count('unchanged')
+                self.etag, self.last_modified = etag, last_modified
+                return self.aircraft
+
+            data = self.decoder.decode(body, response_headers.get_content_charset('utf-8'))
+            self.metrics.record('decode', time.perf_counter() - started)
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            self.logger.error("{}: Error fetching aircraft from {}: {}".format(type(e).__name__, self.url, e))
+            self.metrics.count('fetch_errors')
+            self.failed = True
+            if self.name is not None:
+                self.metrics.feed(self.name, error=True)
+            return self.aircraft
+
+        self.aircraft = data.get('aircraft', list()) if isinstance(data, dict) else list()
+        self.now = now
+        self.time = float(now) if now is not None else time.time()
+        self.etag, self.last_modified = etag, last_modified
+        self.changed = True
+        return self.aircraft
+
+
+class ReceiverOriginCache(object):
+    """
+    A cache for the GPS coordinates of the ADSB receiver.
+
+    The position of the receiver almost never changes, so there is no need to fetch receiver.json on every frame.
+    The cached origin is served for up to ttl seconds. Once it expires, the cached origin is still returned while it is
+    revalidated in a background thread, using a conditional GET (If-None-Match / If-Modified-Since) so that an
+    unchanged receiver.json costs only a 304 response. If a fetch fails, the last known origin keeps being used.
+    """
+
+    def __init__(self, fetch, url, ttl=300, retry_interval=10, logger=None, decoder=None):
         """
-        Get the GPS coordinates of the ADSB receiver
+        :param fetch: a callable taking url and headers and returning (status, headers, body) of the HTTP response
+        :param str url: URL of the receiver.json file
+        :param float ttl: number of seconds the origin is considered fresh
+        :param float retry_interval: number of seconds to wait before retrying a failed fetch
+        :param logging.Logger logger: logger to report fetch errors to
+        :param JSONDecoder decoder: decoder of receiver.json; defaults to the fastest one installed
+        """
+        self.fetch = fetch
+        self.url = url
+        self.ttl = ttl
+        self.retry_interval = min(retry_interval, ttl)
+        self.logger = logger or logging.getLogger(__name__)
+        self.decoder = decoder or JSONDecoder()
+
+        self.origin = None
+        self.etag = None
+        self.last_modified = None
+        self.expires = 0
+
+        self.lock = threading.Lock()
+        self.revalidation = None
+
+    def get(self):
+        """
+        Get the GPS coordinates of the ADSB receiver.
 
-        :return: lat/lon of the ADSB receiver
+        The first call blocks until receiver.json has been fetched. Subsequent calls return immediately, triggering a
+        background revalidation once the cached origin has expired.
+
+        :return: lat/lon of the ADSB receiver, or (None, None) if it has never been successfully fetched
         :rtype: (float, float)
         """
 
-        data = self.get_json(self.receiverurl)
-        if "lat" in data and "lon" in data:
-            latitude = data["lat"]
-            longitude = data["lon"]
-            return latitude, longitude
-        else:
+        if self.origin is None:
+            if time.monotonic() >= self.expires:
+                self.refresh()
+        elif time.monotonic() >= self.expires:
+            self.revalidate()
+
+        if self.origin is None:
             return None, None
+        return self.origin
 
-    @staticmethod
-    def pixel_origin():
+    def revalidate(self):
         """
-        Get the pixel coordinates of the ADSB receiver on the UnicornHat HD
-
-        This should always be the centre of the LED matrix.
-        :return: pixel coordinates of the ADSB receiver
-        :rtype: (int, int)
+        Refresh the cached origin in a background thread, unless a revalidation is already in progress.
         """
 
-        shape = uh.get_shape()
-        x = math.floor(shape[0] / 2)
-        y = math.floor(shape[1] / 2)
-        return int(x), int(y)
+        with self.lock:
+            if self.revalidation is not None and self.revalidation.is_alive():
+                return
+            self.revalidation = threading.Thread(target=self.refresh, name='receiver-origin', daemon=True)
+            self.revalidation.start()
 
-    @staticmethod
-    def pixel_radius():
+    def refresh(self):
         """
-        Find and return the radius in pixels for the LED Matrix.
-
-        This function will return a minimum of half the length or half the height of the screen in pixels.
-        :return: a length of radius in pixels
-        :rtype: int
+        Fetch receiver.json (conditionally, if validators are known) and update the cached origin.
         """
 
-        shape = uh.get_shape()
-        radius = math.floor(max(shape[0] / 2, shape[1] / 2))
-        return radius
+        headers = dict()
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
 
-    def pixel_pos(self, radius, origin, position):
-        """
-        Calculate the pixel coordinates for a GPS position given the GPS coordinates of the origin and a radius in
-        Nautical Miles.
+        try:
+            status, response_headers, body = self.fetch(self.url, headers)
+            if status == 304:
+                self.expires = time.monotonic() + self.ttl
+                return
+
+            data = self.decoder.decode(body)
+            origin = (data["lat"], data["lon"])
+        except (OSError, http.client.HTTPException, ValueError, KeyError, TypeError) as e:
+            self.logger.warning("{}: Error fetching receiver origin from {}: {}".format(type(e).__name__, self.url, e))
+            self.expires = time.monotonic() + self.retry_interval
+            return
+
+        self.origin = origin
+        self.etag = response_headers.get('ETag')
+        self.last_modified = response_headers.get('Last-Modified')
+        self.expires = time.monotonic() + self.ttl
+
+
+class Projection(object):
+    """
+    An immutable projection of GPS coordinates onto the pixels of the LED matrix.
+
+    All constants used by RadarDaemon.pixel_pos() depend only on the scope radius, the GPS coordinates of the receiver
+    and the shape of the display, so they are calculated once when the projection is created. Projecting a position
+    then takes only a few arithmetic operations. The results are the same as those of RadarDaemon.pixel_pos().
+    """
+
+    __slots__ = ('radius', 'origin', 'shape', 'deg_per_px_lat', 'deg_per_px_lon',
+                 'x_origin', 'y_origin', 'x_sign', 'y_sign', 'flip_x', 'flip_y', 'max_x', 'max_y')
 
+    def __init__(self, radius, origin, shape):
+        """
         :param int radius: radius in Nautical Miles
         :param (float, float) origin: GPS coordinates of the centre point (origin)
-        :param (float, float) position: GPS coordinates to plot (i.e. of the aircraft)
-        :return: a tuple of pixel coordinates (x, y)
-        :rtype: (int, int)
+        :param (int, int) shape: width and height of the display in pixels
         """
 
-        span = self.coord_span(radius, origin)
-        shape = uh.get_shape()
+        lat, lon = origin
+        pixel_radius = math.floor(max(shape[0] / 2, shape[1] / 2))
+
+        lat_delta = float(radius / 60.0)
+        lon_delta = float(radius / (60 * math.cos(math.radians(lat))))
+
+        constants = {
+            'radius': radius,
+            'origin': (lat, lon),
+            'shape': tuple(shape),
+            'deg_per_px_lat': lat_delta / pixel_radius,
+            'deg_per_px_lon': lon_delta / pixel_radius,
+            'x_origin': int(math.floor(shape[1] / 2)),
+            'y_origin': int(math.floor(shape[0] / 2)),
+            'x_sign': -1 if lon < 0 else 1,
+            'y_sign': -1 if lat < 0 else 1,
+            'flip_x': lon < 0,
+            'flip_y': lat < 0,
+            'max_x': shape[0] - 1,
+            'max_y': shape[1] - 1,
+        }
+        for name, value in constants.items():
+            object.__setattr__(self, name, value)
 
-        deg_per_px_lat = span["lat"]["delta"] / self.pixel_radius()
-        deg_per_px_lon = span["lon"]["delta"] / self.pixel_radius()
+    def __setattr__(self, name, value):
+        raise AttributeError('Projection is immutable')
 
-        delta_lat = position[0] - origin[0]
-        delta_lon = position[1] - origin[1]
+    def matches(self, radius, origin, shape):
+        """
+        Check if this projection was created for a given radius, origin and display shape.
+
+        :rtype: bool
+        """
+        return self.radius == radius and self.origin == tuple(origin) and self.shape == tuple(shape)
 
-        delta_x = delta_lon / deg_per_px_lon
-        delta_y = delta_lat / deg_per_px_lat
+    def project(self, lat, lon):
+        """
+        Calculate the pixel coordinates for a GPS position.
 
-        x_sign = 1
-        y_sign = 1
+        Positions outside of the scope are placed on its border.
 
-        if origin[1] < 0:
-            x_sign = -1
-        if origin[0] < 0:
-            y_sign = -1
+        :param float lat: latitude to plot (i.e. of the aircraft)
+        :param float lon: longitude to plot
+        :return: a tuple of pixel coordinates (x, y)
+        :rtype: (int, int)
+        """
 
-        x = self.pixel_origin()[1] + (delta_x * x_sign)
-        y = self.pixel_origin()[0] + (delta_y * y_sign)
+        x = self.x_origin + ((lon - self.origin[1]) / self.deg_per_px_lon) * self.x_sign
+        y = self.y_origin + ((lat - self.origin[0]) / self.deg_per_px_lat) * self.y_sign
 
-        if origin[1] < 0:
-            x = shape[0] - x
-        if origin[0] < 0:
-            y = shape[1] - y
+        if self.flip_x:
+            x = self.shape[0] - x
+        if self.flip_y:
+            y = self.shape[1] - y
 
         if x < 0:
             x = 0
-        if x > shape[0] - 1:
-            x = shape[0] - 1
+        if x > self.max_x:
+            x = self.max_x
 
         if y < 0:
             y = 0
-        if y > shape[1] - 1:
-            y = shape[1] - 1
+        if y > self.max_y:
+            y = self.max_y
 
         return int(x), int(y)
 
-    @staticmethod
-    def normalise(value, min_value=0, max_value=45000, bottom=0.0, top=1.0):
+    def project_many(self, positions):
         """
-        Scale a measured value (by default from a range 0..45000) to a fraction between 0.0 and 1.0.
+        Calculate the pixel coordinates for a sequence of GPS positions.
 
-        All values below or above the min/max range are clipped to min/max respectively.
+        :param positions: GPS positions, where each position is a sequence starting with lat, lon
+        :return: a list of pixel coordinates (x, y), in the same order as positions
+        :rtype: list[(int, int)]
+        """
 
-        The calculation is taken from Ask Dr Math page:
-        http://mathforum.org/library/drmath/view/60433.html
+        project = self.project
+        return [project(position[0], position[1]) for position in positions]
 
-        :param float value: actual measured value
-        :param float min_value: minimum of the range of values
-        :param float max_value: maximum of the range of values
-        :param float bottom: minimum of the normalised range
-        :param float top: maximum of the normalised range
-        :return: a normalised value
-        :rtype: float
-        """
-        if value < min_value:
-            value = min_value
-        if value > max_value:
-            value = max_value
-        normalised = bottom + (value - min_value) * (top - bottom)/(max_value - min_value)
-        return normalised
 
-    @staticmethod
-    def hsv2rgb(h, s, v):
-        """
-        A wrapper method for colorsys.hsv_to_rgb().
+class SBSSource(threading.Thread):
+    """
+    An input backend streaming aircraft from the SBS-1 (BaseStation) output of dump1090 (port 30003 by default).
 
-        The colorsys.hsv_to_rgb() uses and returns normalised values for each colour coordinate (i.e. values from
-        0.0 to 1.0). unicornhathd.set_pixel() requires RGB colors as values from 0 to 255.
+    Instead of re-downloading and re-parsing the whole aircraft.json on every poll, this keeps a TCP connection open
+    and updates an in-memory table of aircraft, keyed by the ICAO hex address, with every message pushed by dump1090.
+    get_aircraft() returns the table in the same format as aircraft.json, so it can be used in place of
+    RadarDaemon.get_aircraft(). Aircraft not heard from for expiry seconds are dropped from the table.
 
-        This method converts normalised values to 8-bit integers.
+    The connection is re-established (with an exponential backoff) whenever it fails, is closed by the server, or
+    stays silent for longer than timeout seconds.
+    """
 
-        :param float h: hue
-        :param float s: saturation
-        :param float v: value
-        :return: RGB colour components as (r, g, b)
-        :rtype: (int, int, int)
+    def __init__(self, host, port=30003, expiry=300, timeout=60, reconnect_delay=1.0, max_reconnect_delay=30.0,
+                 logger=None):
         """
-        return tuple(int(i * 255) for i in colorsys.hsv_to_rgb(h, s, v))
+        :param str host: host name of the device running dump1090
+        :param int port: TCP port of the SBS-1 output
+        :param float expiry: number of seconds after which an aircraft not heard from is dropped
+        :param float timeout: number of seconds of silence after which the connection is re-established
+        :param float reconnect_delay: delay in seconds before the first reconnection attempt
+        :param float max_reconnect_delay: maximum delay in seconds between reconnection attempts
+        :param logging.Logger logger: logger to report connection errors to
+        """
+        super().__init__(name='sbs-source', daemon=True)
+        self.host = host
+        self.port = port
+        self.expiry = expiry
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.aircraft = dict()
+        self.times = dict()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.sock = None
+        self.connections = 0
+        self.messages = 0
 
-    def get_altitude_colour(self, altitude=None, highlight=False):
+    def run(self):
+        """
+        The connection loop.
         """
-        Get a colour corresponding to a given altitude.
 
-        This calculates an RGB colour for any altitude between 0 and 45000ft in a similar fashion as per dump1090-fa
-        web interface.
+        delay = self.reconnect_delay
+        while not self.stopped.is_set():
+            try:
+                with socket.create_connection((self.host, self.port), timeout=self.timeout) as sock:
+                    self.sock = sock
+                    self.connections += 1
+                    self.logger.info('Connected to SBS output at {}:{}'.format(self.host, self.port))
+                    delay = self.reconnect_delay
+                    self.receive(sock)
+            except OSError as e:
+                if not self.stopped.is_set():
+                    self.logger.warning('{}: SBS connection to {}:{} failed: {}'.format(
+                        type(e).__name__, self.host, self.port, e))
+            finally:
+                self.sock = None
+
+            self.stopped.wait(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def receive(self, sock):
+        """
+        Receive messages from the socket until the connection is closed or the source is stopped.
+
+        :raises OSError: if the connection fails or is closed by the server
+        """
+
+        buffer = b''
+        while not self.stopped.is_set():
+            data = sock.recv(65536)
+            if not data:
+                raise ConnectionError('connection closed by the server')
+
+            lines = (buffer + data).split(b'\n')
+            buffer = lines.pop()
+            for line in lines:
+                self.handle_message(line)
+
+    def handle_message(self, line):
+        """
+        Update the aircraft table with a single SBS-1 message.
+
+        The fields of a message are: MSG, transmission type, session ID, aircraft ID, hex ident, flight ID, date and
+        time generated, date and time logged, callsign, altitude, ground speed, track, lat, lon, vertical rate,
+        squawk, alert, emergency, SPI and on ground flag. Only the fields present in a given message are updated.
+
+        :param bytes line: the message
+        """
+
+        fields = line.decode('ascii', 'replace').strip().split(',')
+        if len(fields) < 22 or fields[0] != 'MSG' or not fields[4]:
+            return
+
+        icao = fields[4].lower()
+        now = time.monotonic()
+
+        # parse every field before updating the aircraft, so an invalid message doesn't leave it half updated
+        update = dict()
+        try:
+            if fields[10]:
+                update['flight'] = fields[10]
+            if fields[11]:
+                update['altitude'] = int(fields[11])
+            if fields[12]:
+                update['speed'] = float(fields[12])
+            if fields[13]:
+                update['track'] = float(fields[13])
+            if fields[14] and fields[15]:
+                update['lat'] = float(fields[14])
+                update['lon'] = float(fields[15])
+            if fields[16]:
+                update['vert_rate'] = int(fields[16])
+            if fields[17]:
+                update['squawk'] = fields[17]
+        except ValueError:
+            self.logger.debug('Invalid SBS message: {}'.format(line))
+            update = dict()
+
+        with self.lock:
+            self.messages += 1
+            plane = self.aircraft.get(icao)
+            if plane is None:
+                plane = self.aircraft[icao] = {'hex': icao}
+                self.times[icao] = [now, None]
+            times = self.times[icao]
+            times[0] = now
+            plane.update(update)
+            if 'lat' in update:
+                times[1] = now
+
+    def expire(self, now=None):
+        """
+        Drop aircraft not heard from for longer than expiry seconds.
+
+        :param float now: time.monotonic() time; defaults to now
+        """
+
+        if now is None:
+            now = time.monotonic()
+
+        with self.lock:
+            expired = [icao for icao, times in self.times.items() if now - times[0] > self.expiry]
+            for icao in expired:
+                del self.aircraft[icao]
+                del self.times[icao]
+
+    def get_aircraft(self):
+        """
+        Get a list of aircraft within the range of the ADSB receiver, in the same format as aircraft.json.
+
+        :return: a list of aircraft, each as a dict with the same fields as in aircraft.json
+        :rtype: list[dict]
+        """
+
+        now = time.monotonic()
+        self.expire(now)
+
+        all_aircraft = list()
+        with self.lock:
+            for icao, plane in self.aircraft.items():
+                plane = dict(plane)
+                last_seen, last_pos = self.times[icao]
+                plane['seen'] = now - last_seen
+                if last_pos is not None:
+                    plane['seen_pos'] = now - last_pos
+                all_aircraft.append(plane)
+        return all_aircraft
+
+    def stop(self):
+        """
+        Stop the source and close the connection.
+        """
+
+        self.stopped.set()
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class FeedRecorder(object):
+    """
+    A recorder appending the documents fetched from the ADSB receiver to a compressed, append-only log.
+
+    Every record is a header line with the time.time() timestamp, the name (e.g. aircraft.json) and the length of the
+    document, followed by the document itself. The log is gzip compressed, and flushed after every record, so that a
+    crash loses at most the record being written. Each time the log is opened, a new gzip member is appended to it, so
+    a recording can be resumed after a restart. A document identical to the last one recorded under the same name is
+    not recorded again.
+    """
+
+    def __init__(self, path, logger=None):
+        """
+        :param str path: path of the log file
+        :param logging.Logger logger: logger to report errors to
+        """
+        self.path = path
+        self.logger = logger or logging.getLogger(__name__)
+        self.file = None
+        self.last = dict()
+        self.lock = threading.Lock()
+        self.records = 0
+
+    def record(self, name, body, timestamp=None):
+        """
+        Append a document to the log.
+
+        :param str name: name of the document, e.g. aircraft.json
+        :param bytes body: the document
+        :param float timestamp: time.time() time when the document was fetched; defaults to now
+        """
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self.lock:
+            if self.last.get(name) == body:
+                return
+            try:
+                if self.file is None:
+                    self.file = gzip.open(self.path, 'ab')
+                self.file.write('{:.3f} {} {}\n'.format(timestamp, name, len(body)).encode('ascii'))
+                self.file.write(body)
+                self.file.write(b'\n')
+                self.file.flush()
+            except OSError as e:
+                self.logger.error('{}: Error recording to {}: {}'.format(type(e).__name__, self.path, e))
+                return
+            self.last[name] = body
+            self.records += 1
+
+    def close(self):
+        """
+        Close the log.
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    @staticmethod
+    def read(path, logger=None):
+        """
+        Read the records of a log, one by one.
+
+        A truncated record at the end of the log, e.g. if the recorder was killed, ends the log.
+
+        :param str path: path of the log file
+        :param logging.Logger logger: logger to report a truncated log to
+        :return: timestamp, name and document of each record
+        :rtype: collections.Iterator[(float, str, bytes)]
+        """
+
+        logger = logger or logging.getLogger(__name__)
+        with gzip.open(path, 'rb') as file:
+            while True:
+                try:
+                    header = file.readline()
+                    if not header:
+                        return
+                    timestamp, name, length = header.decode('ascii').split()
+                    body = file.read(int(length) + 1)[:-1]
+                    if len(body) != int(length):
+                        raise EOFError('Truncated record')
+                except (EOFError, OSError, zlib.error, ValueError) as e:
+                    logger.warning('{}: End of log {}: {}'.format(type(e).__name__, path, e))
+                    return
+                yield float(timestamp), name, body
+
+
+class FeedReplay(object):
+    """
+    A replay of a log recorded by FeedRecorder, in place of the ADSB receiver.
+
+    fetch() serves the recorded documents as if fetched from the receiver, so the rest of the daemon runs as usual.
+    The log is replayed in real time (speed 1), accelerated (e.g. speed 60 replays an hour in a minute) or, with speed
+    0, as fast as possible, every fetch of aircraft.json serving the next recorded document. When replaying in (or
+    faster than) real time, a fetch serves the latest document due, skipping those in between, like a receiver polled
+    less often than it updates aircraft.json.
+
+    clock() runs at the speed of the replay, to be used as the time.monotonic() time of the snapshots and frames, so
+    that the aircraft expire and are extrapolated as they would have been at the time of the recording.
+    """
+
+    def __init__(self, path, speed=1.0, loop=False, logger=None):
+        """
+        :param str path: path of the log file
+        :param float speed: speed of the replay, relative to real time; 0 for as fast as possible
+        :param bool loop: whether to start over at the end of the log
+        :param logging.Logger logger: logger to report errors to
+        """
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.headers = http.client.HTTPMessage()
+        self.headers['Content-Type'] = 'application/json; charset=utf-8'
+        self.lock = threading.Lock()
+
+        self.records = None
+        self.pending = None
+        self.documents = dict()
+        self.first = None           # timestamp of the first record of the log
+        self.position = None        # timestamp of the last record replayed
+        self.started = None         # time.monotonic() time the replay started
+        self.offset = 0.0           # duration of the log, times the number of times it was replayed
+        self.replayed = 0
+        self.finished = False
+
+    def open(self):
+        """
+        Start replaying the log from its first record.
+
+        :raises OSError: if the log is empty or cannot be read
+        """
+
+        self.records = FeedRecorder.read(self.path, self.logger)
+        self.pending = next(self.records, None)
+        if self.pending is None:
+            raise OSError('No records in {}'.format(self.path))
+        self.first = self.position = self.pending[0]
+
+    def elapsed(self):
+        """
+        Get the time elapsed in the recording since the replay started.
+
+        :rtype: float
+        """
+        if self.started is None:
+            return 0.0
+        if self.speed > 0:
+            return (time.monotonic() - self.started) * self.speed
+        return self.offset + self.position - self.first
+
+    def clock(self):
+        """
+        Get the time.monotonic() time the replay is at.
+
+        :rtype: float
+        """
+        with self.lock:
+            if self.started is None:
+                return time.monotonic()
+            return self.started + self.elapsed()
+
+    def advance(self):
+        """
+        Replay the records due, up to the next aircraft.json if replaying as fast as possible.
+        """
+
+        restarted = False
+        while True:
+            if self.pending is None:
+                if restarted:
+                    return
+                if not self.loop:
+                    if not self.finished:
+                        self.logger.info('End of replay of {}'.format(self.path))
+                        self.finished = True
+                    return
+                self.offset += self.position - self.first
+                self.open()
+                restarted = True
+
+            timestamp, name, body = self.pending
+            if self.speed > 0 and self.offset + timestamp - self.first > self.elapsed():
+                return
+
+            self.documents[name] = body
+            self.position = timestamp
+            self.replayed += 1
+            self.pending = next(self.records, None)
+            if self.speed <= 0 and name == 'aircraft.json':
+                return
+
+    def fetch(self, url, headers=None):
+        """
+        Serve a recorded document, in place of RadarDaemon.fetch().
+
+        :param str url: URL of the document; only the name of the document (e.g. receiver.json) is looked at
+        :param dict headers: request headers (ignored)
+        :return: HTTP status, response headers and the document
+        :rtype: (int, http.client.HTTPMessage, bytes)
+        :raises urllib.error.HTTPError: if there is no such document in the log
+        :raises OSError: if the log cannot be read
+        """
+
+        name = urllib.parse.urlsplit(url).path.rsplit('/', 1)[-1]
+        with self.lock:
+            if self.records is None:
+                self.open()
+                self.started = time.monotonic()
+                # the receiver position may be recorded just after the first aircraft
+                self.documents = {name: body for _, name, body in itertools.islice(
+                    FeedRecorder.read(self.path, self.logger), 16) if name != 'aircraft.json'}
+
+            if name == 'aircraft.json':
+                self.advance()
+            body = self.documents.get(name)
+
+        if body is None:
+            raise urllib.error.HTTPError(url, 404, 'Not Found', self.headers, None)
+        return 200, self.headers, body
+
+
+class GridIndex(object):
+    """
+    A spatial index of aircraft, bucketing them into a grid of lat/lon cells.
+
+    Each cell covers cell_size degrees of latitude and longitude, and holds the items positioned in it, keyed by their
+    ICAO hex address. Moving an item within its cell is free, so the index can be kept up to date as every snapshot is
+    merged. A bounding box query only visits the cells overlapping the box, and a nearest item query searches rings
+    of cells outwards from the given position, stopping as soon as no unvisited cell can hold anything closer.
+
+    The number of occupied cells in every row and column of the grid is counted as cells are filled and emptied, so
+    the extent of the occupied cells, which bounds the nearest item search, is known without looking at every cell.
+    """
+
+    def __init__(self, cell_size=0.5):
+        """
+        :param float cell_size: size of a grid cell in degrees
+        """
+        self.cell_size = cell_size
+        self.cells = dict()
+        self.cell_of = dict()
+        self.rows = dict()
+        self.cols = dict()
+        self.extent = None
+
+    def __len__(self):
+        return len(self.cell_of)
+
+    def cell(self, lat, lon):
+        """
+        Get the grid cell a GPS position falls in.
+
+        :param float lat: latitude
+        :param float lon: longitude
+        :return: row and column of the grid cell
+        :rtype: (int, int)
+        """
+        return int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size))
+
+    def update(self, key, item, lat, lon):
+        """
+        Add an item to the index, or move it to a new position.
+
+        :param str key: key of the item, e.g. the ICAO hex address of an aircraft
+        :param item: the item to index
+        :param float lat: latitude of the item
+        :param float lon: longitude of the item
+        """
+
+        cell = self.cell(lat, lon)
+        old = self.cell_of.get(key)
+        if old == cell:
+            return
+        if old is not None:
+            self.discard(key)
+
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            bucket = self.cells[cell] = dict()
+            self.occupy(cell)
+        bucket[key] = item
+        self.cell_of[key] = cell
+
+    def discard(self, key):
+        """
+        Remove an item from the index, if it is there.
+
+        :param str key: key of the item
+        """
+
+        cell = self.cell_of.pop(key, None)
+        if cell is None:
+            return
+        bucket = self.cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self.cells[cell]
+            self.vacate(cell)
+
+    def occupy(self, cell):
+        """
+        Count a newly occupied cell in its row and column, and widen the extent of the occupied cells to it.
+
+        :param (int, int) cell: row and column of the cell
+        """
+
+        row, col = cell
+        self.rows[row] = self.rows.get(row, 0) + 1
+        self.cols[col] = self.cols.get(col, 0) + 1
+        if self.extent is None:
+            self.extent = [row, row, col, col]
+        else:
+            extent = self.extent
+            extent[0], extent[1] = min(extent[0], row), max(extent[1], row)
+            extent[2], extent[3] = min(extent[2], col), max(extent[3], col)
+
+    def vacate(self, cell):
+        """
+        Uncount a cell which has been emptied, and narrow the extent of the occupied cells if it was on its edge.
+
+        Only when the last cell of an outermost row or column is emptied are the remaining rows or columns looked at.
+
+        :param (int, int) cell: row and column of the cell
+        """
+
+        row, col = cell
+        extent = self.extent
+        self.rows[row] -= 1
+        if not self.rows[row]:
+            del self.rows[row]
+            if row in (extent[0], extent[1]) and self.rows:
+                extent[0], extent[1] = min(self.rows), max(self.rows)
+        self.cols[col] -= 1
+        if not self.cols[col]:
+            del self.cols[col]
+            if col in (extent[2], extent[3]) and self.cols:
+                extent[2], extent[3] = min(self.cols), max(self.cols)
+        if not self.cells:
+            self.extent = None
+
+    def query(self, lat_min, lat_max, lon_min, lon_max):
+        """
+        Iterate over the items in the cells overlapping a bounding box.
+
+        The items are only filtered by their cell, so some of them may lie just outside the box itself.
+
+        :param float lat_min: minimum latitude of the box
+        :param float lat_max: maximum latitude of the box
+        :param float lon_min: minimum longitude of the box
+        :param float lon_max: maximum longitude of the box
+        :rtype: collections.Iterator
+        """
+
+        row_min, col_min = self.cell(lat_min, lon_min)
+        row_max, col_max = self.cell(lat_max, lon_max)
+        cells = self.cells
+
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(cells):
+            # the box covers more cells than there are occupied ones
+            for (row, col), bucket in cells.items():
+                if row_min <= row <= row_max and col_min <= col <= col_max:
+                    yield from bucket.values()
+            return
+
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                bucket = cells.get((row, col))
+                if bucket is not None:
+                    yield from bucket.values()
+
+    def nearest(self, lat, lon, position=None):
+        """
+        Find the item closest to a GPS position.
+
+        The cells are searched in rings around the cell the position falls in. After a ring is searched, anything not
+        yet seen is at least as many cell widths away as the number of rings searched, so the search stops once the
+        closest item found is nearer than that, typically after a ring or two.
+
+        :param float lat: latitude
+        :param float lon: longitude
+        :param position: function returning the lat, lon of an item; defaults to its lat and lon attributes
+        :return: the closest item and its great circle distance in Nautical Miles, or (None, None) if the index is empty
+        :rtype: (object, float)
+        """
+
+        if position is None:
+            def position(item):
+                return item.lat, item.lon
+
+        if not self.cells:
+            return None, None
+
+        row, col = self.cell(lat, lon)
+        row_min, row_max, col_min, col_max = self.extent
+        max_ring = max(abs(row - row_min), abs(row - row_max), abs(col - col_min), abs(col - col_max))
+
+        best, best_distance = None, None
+        for ring in range(max_ring + 1):
+            for cell in self.ring(row, col, ring):
+                bucket = self.cells.get(cell)
+                if bucket is None:
+                    continue
+                for item in bucket.values():
+                    item_lat, item_lon = position(item)
+                    distance = self.haversine(lat, lon, item_lat, item_lon)
+                    if best_distance is None or distance < best_distance:
+                        best, best_distance = item, distance
+            if best_distance is not None:
+                # the narrowest the cells searched so far get, in Nautical Miles
+                reach = math.radians(min(abs(lat) + (ring + 1) * self.cell_size, 90))
+                if best_distance <= ring * self.cell_size * 60.0 * math.cos(reach):
+                    break
+        return best, best_distance
+
+    @staticmethod
+    def ring(row, col, radius):
+        """
+        Iterate over the grid cells at a given Chebyshev distance from a cell.
+
+        :param int row: row of the centre cell
+        :param int col: column of the centre cell
+        :param int radius: distance from the centre cell, in cells
+        :rtype: collections.Iterator[(int, int)]
+        """
+
+        if radius == 0:
+            yield row, col
+            return
+        for c in range(col - radius, col + radius + 1):
+            yield row - radius, c
+            yield row + radius, c
+        for r in range(row - radius + 1, row + radius):
+            yield r, col - radius
+            yield r, col + radius
+
+    @staticmethod
+    def haversine(lat1, lon1, lat2, lon2):
+        """
+        Calculate the great circle distance between two GPS positions.
+
+        :param float lat1: latitude of the first position
+        :param float lon1: longitude of the first position
+        :param float lat2: latitude of the second position
+        :param float lon2: longitude of the second position
+        :return: the distance in Nautical Miles
+        :rtype: float
+        """
+
+        phi1 = math.radians(lat1)
+        phi2 = math.radians(lat2)
+        a = math.sin((phi2 - phi1) / 2) ** 2 + \
+            math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+        return 2 * 60 * math.degrees(math.asin(min(1.0, math.sqrt(a))))
+
+
+class Trail(object):
+    """
+    The last positions of an aircraft, kept in a ring buffer of a fixed number of samples.
+
+    The coordinates and altitudes are kept in arrays allocated once, when the trail is created. Once the buffer is
+    full, every new sample overwrites the oldest one, so a trail never grows, however long the aircraft is tracked.
+    Unknown altitudes are kept as -1.
+    """
+
+    __slots__ = ('size', 'lat', 'lon', 'altitude', 'head', 'count')
+
+    def __init__(self, size):
+        """
+        :param int size: number of samples kept
+        :raises ValueError: if size is not a positive number
+        """
+        if size < 1:
+            raise ValueError('Invalid trail size {}'.format(size))
+        self.size = size
+        self.lat = array.array('f', bytes(4 * size))
+        self.lon = array.array('f', bytes(4 * size))
+        self.altitude = array.array('i', bytes(4 * size))
+        self.head = 0           # index of the next sample to write
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, lat, lon, altitude=None):
+        """
+        Add a position to the trail, overwriting the oldest one if the trail is full.
+
+        :param float lat: latitude
+        :param float lon: longitude
+        :param int altitude: altitude in feet; anything else than an integer is an unknown altitude
+        """
+
+        head = self.head
+        self.lat[head] = lat
+        self.lon[head] = lon
+        self.altitude[head] = altitude if type(altitude) is int else -1
+        self.head = head + 1 if head + 1 < self.size else 0
+        if self.count < self.size:
+            self.count += 1
+
+    def clear(self):
+        """
+        Drop all the samples, keeping the arrays to be reused.
+        """
+        self.head = 0
+        self.count = 0
+
+
+class Aircraft(object):
+    """
+    The last known state of an aircraft, as tracked by AircraftRegistry.
+
+    The position attribute is a list of lat, lon and altitude, ready to be plotted. It is updated in place, both when
+    a new snapshot is merged and when the position is extrapolated, so no new objects are created per frame.
+    """
+
+    __slots__ = ('hex', 'lat', 'lon', 'altitude', 'track', 'speed', 'vert_rate', 'last_seen', 'last_pos', 'position',
+                 'trail')
+
+    def __init__(self, icao):
+        """
+        :param str icao: ICAO hex address of the aircraft
+        """
+        self.hex = icao
+        self.lat = None
+        self.lon = None
+        self.altitude = None
+        self.track = None
+        self.speed = None
+        self.vert_rate = None
+        self.last_seen = None
+        self.last_pos = None
+        self.position = [None, None, None]
+        self.trail = None
+
+
+class AircraftRegistry(object):
+    """
+    A table of aircraft, keyed by their ICAO hex address.
+
+    Each snapshot of aircraft fetched from the receiver is merged into the table in place, updating the existing
+    Aircraft records rather than building new ones. The times each aircraft was last seen and last reported its
+    position are tracked, and aircraft not seen for longer than expiry seconds are dropped. The aircraft with a known
+    position are also kept in a GridIndex, so that only those within range of the scope need to be looked at.
+
+    If trail_length is set, the last trail_length positions reported by each aircraft are kept in its Trail. The
+    trails of expired aircraft are kept aside and reused for new aircraft, so once the busiest moment of the day has
+    passed, no new trails are allocated.
+    """
+
+    def __init__(self, expiry=60, cell_size=0.5, trail_length=0):
+        """
+        :param float expiry: number of seconds after which an aircraft not seen is dropped
+        :param float cell_size: size of a cell of the spatial index in degrees
+        :param int trail_length: number of positions kept in the trail of each aircraft; 0 for no trails
+        """
+        self.expiry = expiry
+        self.aircraft = dict()
+        self.index = GridIndex(cell_size)
+        self.trail_length = max(trail_length, 0)
+        self.spare_trails = list()
+
+    def __len__(self):
+        return len(self.aircraft)
+
+    def __iter__(self):
+        return iter(self.aircraft.values())
+
+    def merge(self, all_aircraft, timestamp=None):
+        """
+        Merge a list of aircraft reported by the ADSB receiver into the table.
+
+        Aircraft which are not in the list are kept until they expire. The barometric altitude is preferred over the
+        geometric one. Both the old (speed, vert_rate) and the new (gs, baro_rate/geom_rate) dump1090-fa field names
+        are understood.
+
+        :param list[dict] all_aircraft: aircraft as listed in aircraft.json
+        :param float timestamp: time.monotonic() time when the list was fetched; defaults to now
+        """
+
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        for plane in all_aircraft:
+            icao = plane.get("hex")
+            if icao is None:
+                continue
+
+            aircraft = self.aircraft.get(icao)
+            if aircraft is None:
+                aircraft = self.aircraft[icao] = Aircraft(icao)
+
+            aircraft.last_seen = timestamp - plane.get("seen", 0)
+
+            if "alt_baro" in plane:
+                aircraft.altitude = plane["alt_baro"]
+            elif "alt_geom" in plane:
+                aircraft.altitude = plane["alt_geom"]
+            else:
+                aircraft.altitude = plane.get("altitude")
+
+            aircraft.track = plane.get("track")
+            aircraft.speed = plane.get("gs", plane.get("speed"))
+            aircraft.vert_rate = plane.get("baro_rate", plane.get("geom_rate", plane.get("vert_rate")))
+
+            if "lat" in plane and "lon" in plane:
+                moved = plane["lat"] != aircraft.lat or plane["lon"] != aircraft.lon
+                aircraft.lat = plane["lat"]
+                aircraft.lon = plane["lon"]
+                aircraft.last_pos = timestamp - plane.get("seen_pos", 0)
+                self.index.update(icao, aircraft, aircraft.lat, aircraft.lon)
+                if self.trail_length and moved:
+                    trail = aircraft.trail
+                    if trail is None:
+                        trail = aircraft.trail = self.spare_trails.pop() if self.spare_trails else \
+                            Trail(self.trail_length)
+                    trail.append(aircraft.lat, aircraft.lon, aircraft.altitude)
+            else:
+                aircraft.lat = aircraft.lon = aircraft.last_pos = None
+                self.index.discard(icao)
+
+            position = aircraft.position
+            position[0] = aircraft.lat
+            position[1] = aircraft.lon
+            position[2] = aircraft.altitude
+
+    def expire(self, now=None):
+        """
+        Drop aircraft not seen for longer than expiry seconds.
+
+        :param float now: time.monotonic() time; defaults to now
+        """
+
+        if now is None:
+            now = time.monotonic()
+
+        expired = [icao for icao, aircraft in self.aircraft.items() if now - aircraft.last_seen > self.expiry]
+        for icao in expired:
+            trail = self.aircraft.pop(icao).trail
+            if trail is not None:
+                trail.clear()
+                self.spare_trails.append(trail)
+            self.index.discard(icao)
+
+    def reset_positions(self):
+        """
+        Put every aircraft back at its last reported position, dropping the extrapolated ones.
+        """
+
+        for aircraft in self.aircraft.values():
+            position = aircraft.position
+            position[0] = aircraft.lat
+            position[1] = aircraft.lon
+            position[2] = aircraft.altitude
+
+    def set_trail_length(self, trail_length):
+        """
+        Change the number of positions kept in the trail of each aircraft, dropping the trails kept so far.
+
+        :param int trail_length: number of positions; 0 (or less) for no trails
+        """
+
+        trail_length = max(trail_length, 0)
+        if trail_length != self.trail_length:
+            self.trail_length = trail_length
+            self.spare_trails = list()
+            for aircraft in self.aircraft.values():
+                aircraft.trail = None
+
+    def trails(self, bounds=None):
+        """
+        Iterate over the trails of the aircraft with a known position.
+
+        :param (float, float, float, float) bounds: minimum and maximum latitude, minimum and maximum longitude of
+                the box the aircraft are looked up in (see positioned())
+        :rtype: collections.Iterator[Trail]
+        """
+        return (aircraft.trail for aircraft in self.positioned(bounds) if aircraft.trail is not None)
+
+    def positioned(self, bounds=None):
+        """
+        Iterate over the aircraft with a known position.
+
+        If bounds are given, only the aircraft in the grid cells overlapping the bounding box are returned. Some of
+        them may still lie just outside the box itself.
+
+        :param (float, float, float, float) bounds: minimum and maximum latitude, minimum and maximum longitude
+        :rtype: collections.Iterator[Aircraft]
+        """
+
+        if bounds is None:
+            return (aircraft for aircraft in self.aircraft.values() if aircraft.lat is not None)
+        return self.index.query(*bounds)
+
+    def positions(self, now=None, max_extrapolation=30.0, bounds=None, centre=None, radius=None):
+        """
+        Get the positions of all aircraft with a known position.
+
+        If now is given, the positions are extrapolated to that moment, based on the track, ground speed and vertical
+        rate of each aircraft, for at most max_extrapolation seconds from the time each position was reported (after
+        which a stale aircraft stays in place). Aircraft not reporting their track and speed are not moved.
+        Extrapolated altitudes are rounded to 25ft, the resolution of the altitude colour lookup table.
+
+        If bounds are given, only the aircraft within the bounding box are returned, and if a centre and radius are
+        given too, only those within radius Nautical Miles (great circle distance) of the centre. The candidates are
+        looked up in the spatial index, so aircraft far out of range are never even looked at.
+
+        :param float now: time.monotonic() time to extrapolate the positions to; None not to extrapolate
+        :param float max_extrapolation: maximum number of seconds to extrapolate a position for
+        :param (float, float, float, float) bounds: minimum and maximum latitude, minimum and maximum longitude
+        :param (float, float) centre: GPS coordinates of the centre of the radial cut
+        :param float radius: radius of the radial cut in Nautical Miles
+        :return: list of aircraft positions, where each element of the list is a list of lat, lon, altitude
+        :rtype: list[[float, float, float]]
+        """
+
+        candidates = self.positioned()
+        if bounds is not None:
+            lat_min, lat_max, lon_min, lon_max = bounds
+            if now is not None:
+                # an extrapolated aircraft may have moved into the box from a neighbouring cell
+                pad = self.index.cell_size
+                candidates = self.index.query(lat_min - pad, lat_max + pad, lon_min - pad, lon_max + pad)
+            else:
+                candidates = self.index.query(lat_min, lat_max, lon_min, lon_max)
+        if centre is None or radius is None:
+            centre = None
+
+        positions = list()
+        for aircraft in candidates:
+            position = aircraft.position
+            lat, lon, alt = aircraft.lat, aircraft.lon, aircraft.altitude
+
+            if now is not None:
+                age = min(now - aircraft.last_pos, max_extrapolation)
+                if aircraft.track is not None and aircraft.speed is not None and age > 0:
+                    lat, lon = self.dead_reckon(lat, lon, aircraft.track, aircraft.speed, age)
+                    if aircraft.vert_rate and type(alt) is int:
+                        alt = max(0, int(round((alt + aircraft.vert_rate * age / 60.0) / 25.0)) * 25)
+
+            if bounds is not None and not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
+                continue
+            if centre is not None and GridIndex.haversine(centre[0], centre[1], lat, lon) > radius:
+                continue
+
+            position[0] = lat
+            position[1] = lon
+            position[2] = alt
+            positions.append(position)
+        return positions
+
+    def nearest(self, lat, lon):
+        """
+        Find the aircraft closest to a GPS position, e.g. to the receiver.
+
+        The reported positions are used, not the extrapolated ones.
+
+        :param float lat: latitude
+        :param float lon: longitude
+        :return: the closest aircraft and its distance in Nautical Miles, or (None, None) if no position is known
+        :rtype: (Aircraft, float)
+        """
+        return self.index.nearest(lat, lon)
+
+    @staticmethod
+    def dead_reckon(lat, lon, track, speed, seconds):
+        """
+        Advance a GPS position along a track at a given ground speed.
+
+        The distances involved are only a few miles, so the Earth is treated as flat (a plane sailing).
+
+        :param float lat: latitude of the starting position
+        :param float lon: longitude of the starting position
+        :param float track: true track in degrees
+        :param float speed: ground speed in knots
+        :param float seconds: time elapsed since the aircraft was at the starting position
+        :return: the GPS coordinates of the aircraft after the elapsed time
+        :rtype: (float, float)
+        """
+
+        distance = speed * seconds / 3600.0
+        track = math.radians(track)
+        lat_delta = distance * math.cos(track) / 60.0
+        lon_delta = distance * math.sin(track) / (60.0 * math.cos(math.radians(lat)))
+        return lat + lat_delta, lon + lon_delta
+
+
+class Snapshot(object):
+    """
+    The list of aircraft reported by the ADSB receiver at a given moment, along with the receiver position.
+    """
+
+    def __init__(self, aircraft, origin, timestamp=None):
+        """
+        :param list[dict] aircraft: aircraft as listed in aircraft.json
+        :param (float, float) origin: GPS coordinates of the receiver, or (None, None) if not known
+        :param float timestamp: time.monotonic() time when the snapshot was taken; defaults to now
+        """
+        self.aircraft = aircraft
+        self.origin = origin
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+
+
+class Metrics(object):
+    """
+    Timings and counters of the stages of fetching and drawing the aircraft.
+
+    The durations of the last window samples of each stage are kept, to report rolling percentiles (p50, p95, p99).
+    The count and total duration of each stage are kept since the start, as well as counters (e.g. fetch errors) and
+    gauges (e.g. aircraft in range). The achieved frame rate is calculated from the times of the last window frames.
+
+    When aircraft are merged from several receivers, the fetch times and errors of each feed are kept the same way.
+
+    The metrics are updated from both the fetcher thread and the render loop, so they are guarded by a lock.
+    """
+
+    stages = ('fetch', 'decode', 'filter', 'project', 'colour', 'draw', 'show')
+    quantiles = (50, 95, 99)
+
+    def __init__(self, window=1000):
+        """
+        :param int window: number of samples of each stage the percentiles are calculated from
+        """
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {stage: collections.deque(maxlen=window) for stage in self.stages}
+        self.totals = {stage: [0, 0.0] for stage in self.stages}
+        self.counters = dict()
+        self.gauges = dict()
+        self.frames = collections.deque(maxlen=window)
+        self.feeds = dict()
+
+    def record(self, stage, seconds):
+        """
+        Record the duration of a stage.
+
+        :param str stage: name of the stage
+        :param float seconds: duration in seconds
+        """
+
+        with self.lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = collections.deque(maxlen=self.window)
+                self.totals[stage] = [0, 0.0]
+            samples.append(seconds)
+            totals = self.totals[stage]
+            totals[0] += 1
+            totals[1] += seconds
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        """
+        Time the stage run in a with block.
+
+        :param str stage: name of the stage
+        """
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def feed(self, name, seconds=None, error=False):
+        """
+        Record the fetch time, or a fetch error, of a feed.
+
+        :param str name: name of the feed
+        :param float seconds: duration of the fetch in seconds
+        :param bool error: whether the fetch failed
+        """
+
+        with self.lock:
+            feed = self.feeds.get(name)
+            if feed is None:
+                feed = self.feeds[name] = {'samples': collections.deque(maxlen=self.window), 'count': 0, 'sum': 0.0,
+                                           'errors': 0}
+            if seconds is not None:
+                feed['samples'].append(seconds)
+                feed['count'] += 1
+                feed['sum'] += seconds
+            if error:
+                feed['errors'] += 1
+
+    @contextlib.contextmanager
+    def feed_timer(self, name):
+        """
+        Time the fetch of a feed run in a with block.
+
+        :param str name: name of the feed
+        """
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.feed(name, time.perf_counter() - started)
+
+    def count(self, counter, increment=1):
+        """
+        Increment a counter.
+
+        :param str counter: name of the counter
+        :param int increment: number to add to the counter
+        """
+
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + increment
+
+    def set(self, gauge, value):
+        """
+        Set a gauge.
+
+        :param str gauge: name of the gauge
+        :param float value: value of the gauge
+        """
+
+        with self.lock:
+            self.gauges[gauge] = value
+
+    def frame(self, now=None):
+        """
+        Record that a frame was drawn.
+
+        :param float now: time.monotonic() time of the frame; defaults to now
+        """
+
+        with self.lock:
+            self.frames.append(time.monotonic() if now is None else now)
+
+    def frame_rate(self):
+        """
+        Get the achieved frame rate, averaged over the last frames.
+
+        :return: frames per second
+        :rtype: float
+        """
+
+        with self.lock:
+            if len(self.frames) < 2 or self.frames[-1] == self.frames[0]:
+                return 0.0
+            return (len(self.frames) - 1) / (self.frames[-1] - self.frames[0])
+
+    @staticmethod
+    def percentile(ordered, quantile):
+        """
+        Get a percentile of sorted samples, using the nearest rank method.
+
+        :param list[float] ordered: samples in ascending order
+        :param float quantile: percentile to get, from 0 to 100
+        :rtype: float
+        """
+
+        if not ordered:
+            return None
+        rank = max(int(math.ceil(quantile / 100.0 * len(ordered))), 1)
+        return ordered[rank - 1]
+
+    def summary(self):
+        """
+        Get a summary of all the metrics.
+
+        :return: count, total and percentiles (in seconds) of each stage and feed, counters, gauges and the frame rate
+        :rtype: dict
+        """
+
+        with self.lock:
+            samples = {stage: sorted(durations) for stage, durations in self.samples.items()}
+            totals = {stage: list(total) for stage, total in self.totals.items()}
+            counters = dict(self.counters)
+            feeds = {name: dict(feed, samples=sorted(feed['samples'])) for name, feed in self.feeds.items()}
+            gauges = dict(self.gauges)
+
+        stages = dict()
+        for stage, ordered in samples.items():
+            stages[stage] = {'count': totals[stage][0], 'sum': totals[stage][1]}
+            for quantile in self.quantiles:
+                stages[stage]['p{}'.format(quantile)] = self.percentile(ordered, quantile)
+
+        for feed in feeds.values():
+            ordered = feed.pop('samples')
+            for quantile in self.quantiles:
+                feed['p{}'.format(quantile)] = self.percentile(ordered, quantile)
+
+        summary = {'stages': stages, 'counters': counters, 'gauges': gauges, 'frame_rate': self.frame_rate()}
+        if feeds:
+            summary['feeds'] = feeds
+        return summary
+
+    def prometheus(self):
+        """
+        Format the metrics in the Prometheus text exposition format.
+
+        :rtype: str
+        """
+
+        summary = self.summary()
+        lines = [
+            '# HELP radarscope_stage_seconds Time spent in each stage of fetching and drawing the aircraft.',
+            '# TYPE radarscope_stage_seconds summary',
+        ]
+        for stage, stats in summary['stages'].items():
+            for quantile in self.quantiles:
+                value = stats['p{}'.format(quantile)]
+                lines.append('radarscope_stage_seconds{{stage="{}",quantile="{}"}} {}'.format(
+                    stage, quantile / 100.0, 'NaN' if value is None else repr(value)))
+            lines.append('radarscope_stage_seconds_sum{{stage="{}"}} {!r}'.format(stage, stats['sum']))
+            lines.append('radarscope_stage_seconds_count{{stage="{}"}} {}'.format(stage, stats['count']))
+
+        if summary.get('feeds'):
+            lines.append('# HELP radarscope_feed_seconds Time spent fetching aircraft.json from each receiver.')
+            lines.append('# TYPE radarscope_feed_seconds summary')
+            for name, stats in sorted(summary['feeds'].items()):
+                for quantile in self.quantiles:
+                    value = stats['p{}'.format(quantile)]
+                    lines.append('radarscope_feed_seconds{{feed="{}",quantile="{}"}} {}'.format(
+                        name, quantile / 100.0, 'NaN' if value is None else repr(value)))
+                lines.append('radarscope_feed_seconds_sum{{feed="{}"}} {!r}'.format(name, stats['sum']))
+                lines.append('radarscope_feed_seconds_count{{feed="{}"}} {}'.format(name, stats['count']))
+            lines.append('# TYPE radarscope_feed_errors_total counter')
+            for name, stats in sorted(summary['feeds'].items()):
+                lines.append('radarscope_feed_errors_total{{feed="{}"}} {}'.format(name, stats['errors']))
+
+        for counter, value in sorted(summary['counters'].items()):
+            lines.append('# TYPE radarscope_{}_total counter'.format(counter))
+            lines.append('radarscope_{}_total {}'.format(counter, value))
+
+        gauges = dict(summary['gauges'], frame_rate=summary['frame_rate'])
+        for gauge, value in sorted(gauges.items()):
+            lines.append('# TYPE radarscope_{} gauge'.format(gauge))
+            lines.append('radarscope_{} {!r}'.format(gauge, value))
+
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves the metrics of the server's daemon at /metrics, in the Prometheus text format.
+    """
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = self.server.metrics.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(http.server.ThreadingHTTPServer):
+    """
+    An HTTP server exposing Metrics to Prometheus, run in a background thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, metrics):
+        """
+        :param (str, int) server_address: address and port to listen on
+        :param Metrics metrics: the metrics to expose
+        """
+        super().__init__(server_address, MetricsRequestHandler)
+        self.metrics = metrics
+        self.thread = threading.Thread(target=self.serve_forever, name='metrics-server', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class PollScheduler(object):
+    """
+    Adapts the interval between two polls of the ADSB receiver to the traffic.
+
+    While the aircraft are changing and some are in range of the scope, the receiver is polled every min_interval
+    seconds. Whenever a poll brings nothing new (aircraft.json is unchanged, or its now field hasn't advanced), or
+    there are no aircraft in range, the interval is doubled, up to max_interval seconds. The interval is also kept
+    long enough for polling to use at most cpu_budget of a CPU, measured as the CPU time the last poll took.
+    """
+
+    def __init__(self, min_interval=1.0, max_interval=1.0, cpu_budget=None, traffic=None, backoff=2.0):
+        """
+        :param float min_interval: shortest number of seconds between the starts of two polls
+        :param float max_interval: longest number of seconds between the starts of two polls
+        :param float cpu_budget: fraction of a CPU polling may use, e.g. 0.1; None for no limit
+        :param traffic: a callable returning the number of aircraft in range in the Snapshot just fetched; None to only
+                look for changes
+        :param float backoff: factor the interval is multiplied by after each idle poll
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.cpu_budget = cpu_budget
+        self.traffic = traffic
+        self.backoff = backoff
+        self.interval = min_interval
+
+    def next_interval(self, changed, cpu_time=0.0, snapshot=None):
+        """
+        Calculate the interval until the next poll.
+
+        :param bool changed: whether the last poll brought new aircraft data
+        :param float cpu_time: CPU time in seconds the last poll took
+        :param Snapshot snapshot: the snapshot the last poll brought, if any, to look for aircraft in range in
+        :return: number of seconds between the start of the last poll and the start of the next one
+        :rtype: float
+        """
+
+        if changed and (self.traffic is None or self.traffic(snapshot) > 0):
+            interval = self.min_interval
+        else:
+            interval = self.interval * self.backoff
+
+        if self.cpu_budget:
+            interval = max(interval, cpu_time / self.cpu_budget)
+
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+        return self.interval
+
+
+class AircraftFetcher(threading.Thread):
+    """
+    A producer thread polling the ADSB receiver.
+
+    Every interval seconds, the fetcher takes a new Snapshot and puts it in a bounded queue, to be picked up by the
+    renderer (unless there is nothing new to render). If the renderer falls behind and the queue is full, the oldest
+    snapshot is dropped, since only the latest one is worth rendering. A slow response from the receiver delays the
+    next snapshot, but never the renderer.
+
+    If a PollScheduler is given, it sets the interval after every fetch instead. The current interval is kept in the
+    poll_interval gauge of the metrics.
+    """
+
+    def __init__(self, fetch, snapshots, interval=1.0, logger=None, scheduler=None, metrics=None):
+        """
+        :param fetch: a callable returning a new Snapshot, or None if nothing has changed
+        :param queue.Queue snapshots: a bounded queue to put the snapshots in
+        :param float interval: number of seconds between the starts of two consecutive fetches
+        :param logging.Logger logger: logger to report errors to
+        :param PollScheduler scheduler: scheduler adapting the interval to the traffic; None for a fixed interval
+        :param Metrics metrics: metrics to report the interval in
+        """
+        super().__init__(name='aircraft-fetcher', daemon=True)
+        self.fetch = fetch
+        self.snapshots = snapshots
+        self.interval = interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.scheduler = scheduler
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.stopped = threading.Event()
+        self.fetches = 0
+        self.metrics.set('poll_interval', interval)
+
+    def run(self):
+        """
+        The fetcher's loop.
+        """
+
+        while not self.stopped.is_set():
+            started = time.monotonic()
+            cpu_started = time.thread_time()
+            snapshot = None
+
+            try:
+                snapshot = self.fetch()
+            except Exception as e:
+                self.logger.exception('{}: Error fetching aircraft: {}'.format(type(e).__name__, e))
+            else:
+                if snapshot is not None:
+                    self.put(snapshot)
+            self.fetches += 1
+
+            if self.scheduler is not None:
+                interval = self.scheduler.next_interval(snapshot is not None, time.thread_time() - cpu_started,
+                                                        snapshot)
+                if interval != self.interval:
+                    self.logger.debug('Polling every {:.1f}s'.format(interval))
+                    self.set_interval(interval)
+
+            self.stopped.wait(max(0, self.interval - (time.monotonic() - started)))
+
+    def set_interval(self, interval):
+        """
+        Change the interval between two fetches, from the next fetch on.
+
+        :param float interval: number of seconds between the starts of two consecutive fetches
+        """
+        self.interval = interval
+        self.metrics.set('poll_interval', interval)
+
+    def put(self, snapshot):
+        """
+        Put a snapshot in the queue, dropping the oldest snapshot if the queue is full.
+        """
+
+        while True:
+            try:
+                self.snapshots.put_nowait(snapshot)
+                return
+            except queue.Full:
+                try:
+                    self.snapshots.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def stop(self):
+        """
+        Ask the fetcher to stop. The fetch in progress, if any, is completed first.
+        """
+        self.stopped.set()
+
+
+class FrameBuffer(object):
+    """
+    A frame buffer sitting in front of the display.
+
+    Frames are drawn into an in-memory buffer. When a frame is shown, it is compared with the previous one and only
+    the pixels that have changed are sent to the display. If nothing has changed at all, the (expensive) update of the
+    display is skipped entirely.
+
+    Static content, such as the receiver and the airports, can be drawn once and kept as the background, which each
+    frame starts with when it is cleared.
+
+    The number of pixels changed in the last frame, as well as the number of shown and skipped frames, are kept in
+    the changed_pixels, shows and skipped_shows attributes.
+    """
+
+    def __init__(self, display, shape):
+        """
+        :param display: the display module (e.g. unicornhathd), providing clear(), set_pixel() and show()
+        :param (int, int) shape: width and height of the display in pixels
+        """
+        self.display = display
+        self.width, self.height = shape
+        self.blank = bytes(self.width * self.height * 3)
+        self.background = self.blank
+        self.frame = bytearray(self.blank)
+        self.previous = bytearray(self.blank)
+        self.valid = False
+
+        self.changed_pixels = 0
+        self.shows = 0
+        self.skipped_shows = 0
+
+    def clear(self):
+        """
+        Clear the frame being drawn, leaving only the background.
+        """
+        self.frame[:] = self.background
+
+    def set_background(self):
+        """
+        Keep the frame drawn so far as the background, which every frame starts with after clear().
+        """
+        self.background = bytes(self.frame)
+
+    def clear_background(self):
+        """
+        Remove the background, so that clear() blanks the frame.
+        """
+        self.background = self.blank
+
+    def set_pixel(self, x, y, r, g, b):
+        """
+        Set the colour of a pixel in the frame being drawn.
+
+        :param int x: horizontal pixel coordinate
+        :param int y: vertical pixel coordinate
+        :param int r: red colour component, 0 to 255
+        :param int g: green colour component, 0 to 255
+        :param int b: blue colour component, 0 to 255
+        """
+        i = (x * self.height + y) * 3
+        self.frame[i] = int(r)
+        self.frame[i + 1] = int(g)
+        self.frame[i + 2] = int(b)
+
+    def get_pixel(self, x, y):
+        """
+        Get the colour of a pixel in the frame being drawn.
+
+        :return: colour values in RGB
+        :rtype: (int, int, int)
+        """
+        i = (x * self.height + y) * 3
+        return self.frame[i], self.frame[i + 1], self.frame[i + 2]
+
+    def invalidate(self):
+        """
+        Forget the contents of the display, so that the next frame is sent to it in full.
+        """
+        self.valid = False
+
+    def show(self):
+        """
+        Send the pixels that changed since the previous frame to the display and update it.
+
+        :return: False if the frame was identical to the previous one and the display was not updated
+        :rtype: bool
+        """
+
+        frame = self.frame
+        previous = self.previous
+
+        if self.valid and frame == previous:
+            self.changed_pixels = 0
+            self.skipped_shows += 1
+            return False
+
+        if not self.valid:
+            self.display.clear()
+
+        changed = 0
+        set_pixel = self.display.set_pixel
+        height = self.height
+        for i in range(0, len(frame), 3):
+            if self.valid and frame[i] == previous[i] and frame[i + 1] == previous[i + 1] \
+                    and frame[i + 2] == previous[i + 2]:
+                continue
+            x, y = divmod(i // 3, height)
+            set_pixel(x, y, frame[i], frame[i + 1], frame[i + 2])
+            changed += 1
+
+        self.display.show()
+        previous[:] = frame
+        self.valid = True
+
+        self.changed_pixels = changed
+        self.shows += 1
+        return True
+
+
+class NullDisplay(object):
+    """
+    A display which discards everything, e.g. for benchmarking the daemon without any display at all.
+
+    Like all the displays, it provides the functions of the unicornhathd module used by the daemon.
+    """
+
+    def __init__(self, shape=(16, 16)):
+        """
+        :param (int, int) shape: width and height of the display in pixels
+        """
+        self.shape = tuple(shape)
+        self.brightness_value = 1.0
+        self.rotation_value = 0
+
+    def get_shape(self):
+        return self.shape
+
+    def clear(self):
+        pass
+
+    def off(self):
+        pass
+
+    def show(self):
+        pass
+
+    def set_pixel(self, x, y, r, g, b):
+        pass
+
+    def brightness(self, b):
+        self.brightness_value = b
+
+    def rotation(self, r):
+        self.rotation_value = r
+
+
+class MemoryDisplay(NullDisplay):
+    """
+    A silent display keeping the pixels in memory.
+
+    The pixels being set are kept in the pixels bytearray, in the same layout as the frames of FrameBuffer (the RGB
+    values of each column (x) of pixels one after another), and copied into the frame bytes by show(), so the frames
+    shown can be compared with FrameBuffer.frame directly. The number of frames shown is kept in the shows attribute.
+    The rotation is recorded, but not applied to the pixels.
+    """
+
+    def __init__(self, shape=(16, 16)):
+        """
+        :param (int, int) shape: width and height of the display in pixels
+        """
+        super().__init__(shape)
+        self.width, self.height = self.shape
+        self.pixels = bytearray(self.width * self.height * 3)
+        self.frame = bytes(self.pixels)
+        self.shows = 0
+
+    def clear(self):
+        self.pixels[:] = bytes(len(self.pixels))
+
+    def off(self):
+        self.clear()
+        self.show()
+
+    def set_pixel(self, x, y, r, g, b):
+        i = (x * self.height + y) * 3
+        self.pixels[i] = int(r)
+        self.pixels[i + 1] = int(g)
+        self.pixels[i + 2] = int(b)
+
+    def get_pixel(self, x, y):
+        """
+        Get the colour of a pixel in the frame shown.
+
+        :rtype: (int, int, int)
+        """
+        i = (x * self.height + y) * 3
+        return self.frame[i], self.frame[i + 1], self.frame[i + 2]
+
+    def show(self):
+        self.frame = bytes(self.pixels)
+        self.shows += 1
+
+
+class ImageDisplay(MemoryDisplay):
+    """
+    A display writing every frame shown to an image file, as PNG or as PPM (depending on the extension of the path).
+
+    If the path contains a format field, e.g. /tmp/scope-{:06d}.png, it is filled with the number of the frame, so
+    every frame is kept in a file of its own. Otherwise, the file is overwritten with every frame. Each pixel of the
+    display is scaled up to a square of scale x scale pixels in the image.
+    """
+
+    def __init__(self, path, shape=(16, 16), scale=1):
+        """
+        :param str path: path of the image files
+        :param (int, int) shape: width and height of the display in pixels
+        :param int scale: size in pixels of the square each pixel of the display is drawn as
+        """
+        super().__init__(shape)
+        self.path = path
+        self.scale = scale
+        self.png = os.path.splitext(path)[1].lower() == '.png'
+
+    def show(self):
+        super().show()
+        path = self.path.format(self.shows) if '{' in self.path else self.path
+        with open(path, 'wb') as file:
+            file.write(self.encode())
+
+    def rows(self):
+        """
+        Get the rows of the image, scaled up.
+
+        The frame is kept by columns, so every row is gathered from the pixels at the same height in each column.
+
+        :rtype: list[bytes]
+        """
+
+        rows = list()
+        stride = self.width * 3
+        column = self.height * 3
+        for y in range(self.height):
+            row = b''.join(self.frame[x * column + y * 3:x * column + y * 3 + 3] for x in range(self.width))
+            if self.scale > 1:
+                row = b''.join(row[i:i + 3] * self.scale for i in range(0, stride, 3))
+            rows.extend([row] * self.scale)
+        return rows
+
+    def encode(self):
+        """
+        Encode the frame shown as a PNG or PPM image.
+
+        :rtype: bytes
+        """
+
+        width, height = self.width * self.scale, self.height * self.scale
+        if not self.png:
+            return 'P6 {} {} 255\n'.format(width, height).encode('ascii') + b''.join(self.rows())
+
+        def chunk(kind, data):
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+        # 8 bit RGB, no interlacing, every row with filter type 0 (none)
+        header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+        data = zlib.compress(b''.join(b'\x00' + row for row in self.rows()))
+        return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', data) + chunk(b'IEND', b'')
+
+
+def create_display(name='hat', path=None, shape=(16, 16)):
+    """
+    Create a display backend.
+
+    :param str name: one of hat (the UnicornHAT HD, or its mock module), memory, image or null
+    :param str path: path of the image files, for the image display
+    :param (int, int) shape: width and height of the display in pixels, except for the UnicornHAT HD
+    :return: the display, providing the functions of the unicornhathd module used by the daemon
+    :raises ValueError: if the display is not known, or no path is given for the image display
+    """
+
+    if name == 'hat':
+        return uh
+    elif name == 'memory':
+        return MemoryDisplay(shape)
+    elif name == 'image':
+        if not path:
+            raise ValueError('No path given for the image display')
+        return ImageDisplay(path, shape)
+    elif name == 'null':
+        return NullDisplay(shape)
+    raise ValueError('Unknown display {}'.format(name))
+
+
+def hsv_palette(altitude, highlight=False):
+    """
+    The default altitude palette of the Radar Scope.
+
+    The hue runs from red at 0ft through orange, yellow, green, cyan and blue to purple at 40000ft, in a similar
+    fashion as per dump1090-fa web interface. Highlighted pixels are brighter and less saturated.
+
+    :param int altitude: altitude in feet, between 0 and 40000
+    :param bool highlight: make the pixel brighter
+    :return: colour values in RGB
+    :rtype: (int, int, int)
+    """
+
+    hue = 0.0 + (altitude - 0) * (0.85 - 0.0) / (40000 - 0)
+    if highlight:
+        intensity = 1
+        saturation = 0.50
+    else:
+        intensity = 0.66
+        saturation = 1
+    return tuple(int(i * 255) for i in colorsys.hsv_to_rgb(hue, saturation, intensity))
+
+
+def dump1090_palette(altitude, highlight=False):
+    """
+    The altitude palette of the dump1090-fa web interface (ColorByAlt in its config.js).
+
+    The hue is interpolated between 20° at 2000ft, 140° at 10000ft and 300° at 40000ft, with saturation of 88% and
+    lightness of 44%. Highlighted pixels use the "selected" adjustment of dump1090-fa: -10% saturation, +20% lightness.
+
+    :param int altitude: altitude in feet, between 0 and 40000
+    :param bool highlight: make the pixel brighter
+    :return: colour values in RGB
+    :rtype: (int, int, int)
+    """
+
+    stops = ((2000, 20), (10000, 140), (40000, 300))
+
+    if altitude <= stops[0][0]:
+        hue = stops[0][1]
+    else:
+        hue = stops[-1][1]
+        for (alt_low, hue_low), (alt_high, hue_high) in zip(stops, stops[1:]):
+            if altitude <= alt_high:
+                hue = hue_low + (hue_high - hue_low) * (altitude - alt_low) / (alt_high - alt_low)
+                break
+
+    saturation = 0.88
+    lightness = 0.44
+    if highlight:
+        saturation -= 0.10
+        lightness += 0.20
+    return tuple(int(i * 255) for i in colorsys.hls_to_rgb(hue / 360, lightness, saturation))
+
+
+def colourblind_palette(altitude, highlight=False):
+    """
+    A colour-blind safe altitude palette.
+
+    The colour is interpolated along the viridis colour map (dark purple - blue - teal - green - yellow), which is
+    perceptually uniform and readable with all common forms of colour blindness. Highlighted pixels are blended
+    halfway towards white.
+
+    :param int altitude: altitude in feet, between 0 and 40000
+    :param bool highlight: make the pixel brighter
+    :return: colour values in RGB
+    :rtype: (int, int, int)
+    """
+
+    stops = ((68, 1, 84), (59, 82, 139), (33, 145, 140), (94, 201, 98), (253, 231, 37))
+
+    position = altitude / 40000 * (len(stops) - 1)
+    index = min(int(position), len(stops) - 2)
+    fraction = position - index
+    colour = [low + (high - low) * fraction for low, high in zip(stops[index], stops[index + 1])]
+
+    if highlight:
+        colour = [c + (255 - c) * 0.5 for c in colour]
+    return tuple(int(c) for c in colour)
+
+
+PALETTES = {
+    'default': hsv_palette,
+    'dump1090-fa': dump1090_palette,
+    'colourblind': colourblind_palette,
+}
+
+
+class AltitudeColourMap(object):
+    """
+    A lookup table of altitude colours.
+
+    The colours of a palette for altitudes between 0 and 40000ft, in steps of 25ft (the resolution of the altitude
+    reported by Mode S transponders), are calculated once, both for normal and highlighted pixels. Looking up a colour
+    is then a single indexed read. Altitudes above 40000ft get the colour of 40000ft, and the rare altitudes which are
+    not a multiple of 25ft are calculated with the palette directly, so the colours are always exactly the same as
+    those of the palette.
+    """
+
+    step = 25
+    ceiling = 40000
+    unknown = (64, 64, 64)
+
+    def __init__(self, palette=hsv_palette):
+        """
+        :param palette: a function of altitude (0 to 40000ft) and highlight flag returning an RGB colour
+        """
+        self.palette = palette
+        self.normal = [palette(altitude, False) for altitude in range(0, self.ceiling + 1, self.step)]
+        self.highlighted = [palette(altitude, True) for altitude in range(0, self.ceiling + 1, self.step)]
+        self.arrays = None
+
+    def numpy_tables(self):
+        """
+        Get the lookup tables as NumPy arrays, for vectorised lookups. The arrays are created on the first call.
+
+        :return: normal and highlighted colours, each as an array of shape (1601, 3)
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+
+        if self.arrays is None:
+            self.arrays = np.array(self.normal, dtype=np.int64), np.array(self.highlighted, dtype=np.int64)
+        return self.arrays
+
+    def lookup(self, altitude, highlight=False):
+        """
+        Get the colour for an altitude.
+
+        :param int altitude: altitude in feet. Anything which is not a non-negative integer is an unknown altitude.
+        :param bool highlight: make the pixel brighter
+        :return: colour values in RGB
+        :rtype: (int, int, int)
+        """
+
+        if type(altitude) is not int or altitude < 0:
+            return self.unknown
+        if altitude > self.ceiling:
+            altitude = self.ceiling
+
+        index, remainder = divmod(altitude, self.step)
+        if remainder:
+            return self.palette(altitude, highlight)
+
+        if highlight:
+            return self.highlighted[index]
+        return self.normal[index]
+
+
+class Waypoints(object):
+    """
+    Airports, navaids or fixes imported from CSV or GeoJSON files, culled to the area covered by the scope.
+
+    The files are streamed row by row (feature by feature), and only the waypoints within the bounding box of the
+    scope are kept, in arrays of coordinates rather than a dict per waypoint. The files are only read again when the
+    bounding box changes, i.e. when the radius or the origin of the scope changes.
+
+    CSV files need a header row naming the latitude and longitude columns, e.g. latitude_deg and longitude_deg as in
+    the airports.csv of OurAirports. If the file has a type column, the waypoints can be filtered by type. GeoJSON
+    files need to be a FeatureCollection of Point features.
+
+    Iterating over the waypoints yields dicts with icao_code, lat and lon, like the airports added with
+    RadarDaemon.add_airport().
+    """
+
+    lat_columns = ('latitude_deg', 'latitude', 'lat', 'y')
+    lon_columns = ('longitude_deg', 'longitude', 'lon', 'lng', 'long', 'x')
+    name_columns = ('ident', 'icao_code', 'icao', 'gps_code', 'code', 'id', 'name')
+
+    def __init__(self, paths=(), types=None, logger=None, chunk_size=65536):
+        """
+        :param list[str] paths: CSV and GeoJSON files to import
+        :param list[str] types: types of waypoint to import (e.g. large_airport), or None to import all of them
+        :param logging.Logger logger: logger to report unreadable files to
+        :param int chunk_size: number of characters read from a GeoJSON file at a time
+        """
+        self.paths = list(paths)
+        self.types = set(types) if types else None
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.chunk_size = chunk_size
+
+        self.bounds = None
+        self.names = list()
+        self.lat = array.array('d')
+        self.lon = array.array('d')
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        for name, lat, lon in zip(self.names, self.lat, self.lon):
+            yield {"icao_code": name, "lat": lat, "lon": lon}
+
+    def cull(self, bounds):
+        """
+        Import the waypoints within a bounding box, unless they already have been.
+
+        :param (float, float, float, float) bounds: minimum and maximum latitude, minimum and maximum longitude
+        :return: True if the files were read
+        :rtype: bool
+        """
+
+        if bounds == self.bounds:
+            return False
+
+        lat_min, lat_max, lon_min, lon_max = bounds
+        names = list()
+        lats = array.array('d')
+        lons = array.array('d')
+
+        for path in self.paths:
+            try:
+                for name, lat, lon in self.read(path):
+                    if lat_min <= lat <= lat_max and lon_min <= lon <= lon_max:
+                        names.append(name)
+                        lats.append(lat)
+                        lons.append(lon)
+            except (OSError, ValueError) as e:
+                self.logger.error('Cannot import waypoints from {}: {}'.format(path, e))
+
+        self.names, self.lat, self.lon = names, lats, lons
+        self.bounds = bounds
+        self.logger.info('{} waypoints within range'.format(len(names)))
+        return True
+
+    def read(self, path):
+        """
+        Stream the waypoints from a CSV or GeoJSON file, depending on its extension.
+
+        :param str path: path of the file
+        :return: name, latitude and longitude of each waypoint
+        :rtype: collections.Iterator[(str, float, float)]
+        :raises OSError: if the file cannot be read
+        :raises ValueError: if the file is not a valid CSV or GeoJSON file
+        """
+
+        extension = os.path.splitext(path)[1].lower()
+        if extension in ('.geojson', '.json'):
+            with open(path, encoding='utf-8') as file:
+                yield from self.read_geojson(file)
+        else:
+            with open(path, encoding='utf-8', newline='') as file:
+                yield from self.read_csv(file)
+
+    def read_csv(self, file):
+        """
+        Stream the waypoints from a CSV file.
+
+        Rows without valid coordinates are skipped.
+
+        :param file: text file object
+        :rtype: collections.Iterator[(str, float, float)]
+        :raises ValueError: if the header has no latitude or longitude column
+        """
+
+        reader = csv.reader(file)
+        header = [column.strip().lower() for column in next(reader, [])]
+
+        def column(names):
+            for name in names:
+                if name in header:
+                    return header.index(name)
+            return None
+
+        lat_column = column(self.lat_columns)
+        lon_column = column(self.lon_columns)
+        if lat_column is None or lon_column is None:
+            raise ValueError('no latitude or longitude column')
+        name_column = column(self.name_columns)
+        type_column = column(('type',)) if self.types is not None else None
+
+        for row in reader:
+            try:
+                if type_column is not None and row[type_column] not in self.types:
+                    continue
+                lat = float(row[lat_column])
+                lon = float(row[lon_column])
+            except (IndexError, ValueError):
+                continue
+            yield (row[name_column] if name_column is not None else ''), lat, lon
+
+    def read_geojson(self, file):
+        """
+        Stream the waypoints from a GeoJSON FeatureCollection.
+
+        The features are decoded one at a time as the file is read, so the whole collection is never held in memory.
+        Features which are not points are skipped.
+
+        :param file: text file object
+        :rtype: collections.Iterator[(str, float, float)]
+        :raises ValueError: if the file is not a valid FeatureCollection
+        """
+
+        for feature in self.iter_features(file):
+            geometry = feature.get('geometry') or {}
+            if geometry.get('type') != 'Point':
+                continue
+            properties = feature.get('properties') or {}
+            if self.types is not None and properties.get('type') not in self.types:
+                continue
+            try:
+                lon, lat = float(geometry['coordinates'][0]), float(geometry['coordinates'][1])
+            except (KeyError, IndexError, TypeError, ValueError):
+                continue
+
+            name = ''
+            for column in self.name_columns:
+                if properties.get(column):
+                    name = str(properties[column])
+                    break
+            yield name, lat, lon
+
+    def iter_features(self, file):
+        """
+        Decode the features of a GeoJSON FeatureCollection one by one.
+
+        :param file: text file object
+        :rtype: collections.Iterator[dict]
+        :raises ValueError: if the file is not a valid FeatureCollection
+        """
+
+        decoder = json.JSONDecoder()
+        separators = re.compile(r'[\s,]*')
+        buffer = ''
+        eof = False
+
+        # find the start of the features array
+        start = re.compile(r'"features"\s*:\s*\[')
+        match = None
+        while match is None and not eof:
+            chunk = file.read(self.chunk_size)
+            eof = not chunk
+            buffer += chunk
+            match = start.search(buffer)
+        if match is None:
+            raise ValueError('not a GeoJSON FeatureCollection')
+        position = match.end()
+
+        while True:
+            position = separators.match(buffer, position).end()
+            if position < len(buffer) and buffer[position] == ']':
+                return
+
+            try:
+                feature, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # the feature runs on past the end of the buffer
+                if eof:
+                    raise
+                buffer = buffer[position:]
+                position = 0
+                chunk = file.read(self.chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+
+            if isinstance(feature, dict):
+                yield feature
+            position = end
+            if position > self.chunk_size:
+                buffer = buffer[position:]
+                position = 0
+
+
+class ControlClient(object):
+    """
+    A client connected to the control socket of the daemon.
+
+    The client's socket is non-blocking. Whatever the client sends is buffered until a full line (a command) has
+    arrived, and the responses are buffered until the socket is ready to take them, so a slow client never blocks the
+    daemon. Once the client has closed its end of the connection and all responses are sent, the client is done.
+    """
+
+    max_line = 65536
+
+    def __init__(self, sock):
+        """
+        :param socket.socket sock: the client's connection
+        """
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.input = bytearray()
+        self.output = bytearray()
+        self.closing = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    @property
+    def done(self):
+        return self.closing and not self.output
+
+    def receive(self):
+        """
+        Read what the client has sent.
+
+        :return: the complete lines received, without line endings
+        :rtype: list[bytes]
+        """
+
+        try:
+            data = self.sock.recv(4096)
+        except BlockingIOError:
+            return list()
+        except OSError:
+            data = b''
+
+        if self.closing:
+            return list()       # nothing more is taken from a client on its way out
+
+        if not data:
+            # the client has closed the connection; a command without a final newline still counts
+            self.closing = True
+            data = b'\n' if self.input else b''
+
+        self.input += data
+        lines = self.input.split(b'\n')
+        self.input = bytearray(lines.pop())
+        if len(self.input) > self.max_line:
+            self.input.clear()
+            self.closing = True
+            self.send({'ok': False, 'error': 'command too long'})
+
+        return [bytes(line.strip()) for line in lines if line.strip()]
+
+    def send(self, response):
+        """
+        Queue a response to be sent to the client, as a line of JSON.
+
+        :param dict response: the response
+        """
+        self.output += json.dumps(response).encode('utf-8') + b'\n'
+
+    def flush(self):
+        """
+        Send as much of the queued responses as the socket takes.
+        """
+
+        try:
+            sent = self.sock.send(self.output)
+        except BlockingIOError:
+            return
+        except OSError:
+            self.output.clear()
+            self.closing = True
+            return
+        del self.output[:sent]
+
+    def close(self):
+        self.sock.close()
+
+
+class RadarDaemon(Daemon):
+    """
+    Subclass of the Daemon class.
+
+    This subclass builds on top of the generic Daemon class to implement a daemon process, reading a list of aircraft
+    within the range of the ADSB receiver and plotting their relative positions to that of the receiver on the
+    UnicornHAT HD mounted on the host Raspberry PI.
+    """
+
+    # the settings the set command of the control socket can change (see apply_settings())
+    control_settings = ('radius', 'brightness', 'rotation')
+
+    def __init__(self, pidfile, config_file=None, stdin='/dev/null', stdout='/dev/null', stderr='/dev/null'):
+        """
+        Override the init() method of the Daemon class to add extra properties.
+        """
+        self.adsb_host = 'localhost'
+        self.receiverurl = "http://{}/dump1090-fa/data/receiver.json".format(self.adsb_host)
+        self.aircrafturl = "http://{}/dump1090-fa/data/aircraft.json".format(self.adsb_host)
+        self.receiver_ttl = 300
+        self.origin_cache = None
+        self.source = 'json'
+        self.sbs_host = 'localhost'
+        self.sbs_port = 30003
+        self.sbs = None
+        self.record_file = None
+        self.recorder = None
+        self.replay = None
+        self.projection = None
+        self.http = HTTPConnectionPool()
+        self.decoder = JSONDecoder()
+        self.feed = None
+        self.feed_urls = tuple()
+        self.feeds = list()
+        self.feed_pool = None
+        self.scope_radius = 60
+        self.scope_brightness = 0.5
+        self.airport_brightness = 0.2
+        self.scope_rotation = 0
+        self.airports = list()
+        self.waypoints = Waypoints()
+        self.aircraft_in_range = 0
+        self.background_key = None
+        self.vectorize = True
+        self.vectorize_threshold = 50
+        self.palette = 'default'
+        self.colour_map = None
+        self.display = uh
+        self.framebuffer = FrameBuffer(self.display, self.display.get_shape())
+        self.frame_rate = 1.0
+        self.poll_interval = 1.0
+        self.max_poll_interval = 1.0
+        self.cpu_budget = None
+        self.extrapolation = False
+        self.max_extrapolation = 30.0
+        self.trail_length = 0
+        self.trail_fades = list()
+        self.range_filter = True
+        self.circular = False
+        self.registry = AircraftRegistry()
+        self.origin = None
+        self.metrics = Metrics()
+        self.metrics_address = 'localhost'
+        self.metrics_port = None
+        self.metrics_server = None
+        self.snapshots = queue.Queue(maxsize=2)
+        self.fetcher = None
+
+        self.settings = dict()
+        self.reload_requested = False
+        self.watch_config = False
+        self.config_mtime = None
+        self.config_checked = 0
+
+        self.sockaddr = ('localhost', 12345)
+        self.socket = None
+        self.clients = list()
+        self.max_clients = 16
+
+        super().__init__(pidfile, config_file, stdin, stdout, stderr, daemon_name="radarscoped")
+
+    def configure(self):
+        """
+        Override the Daemon.configure() method to configure RadarDaemon.
+
+        See parse_config() and apply_config().
+        """
+
+        self.configuration = configparser.ConfigParser(interpolation=configparser.ExtendedInterpolation())
+
+        if not self.config_file:
+            self.logger.info('No configuration file specified. Running with defaults')
+            return
+
+        if not os.path.exists(self.config_file):
+            print("Configuration file {} does not exist. Exiting".format(self.config_file))
+            raise SystemExit(1)
+
+        self.configuration, settings = self.parse_config(self.config_file)
+        self.apply_config(settings)
+
+    def parse_config(self, config_file):
+        """
+        Parse a configuration file into the settings of the daemon, without changing anything.
+
+        Only the options of the sections present in the file are returned. Anything else keeps its current value.
+
+        :param str config_file: path of the configuration file
+        :return: the parsed configuration, and the settings as a dict of attribute names and values
+        :rtype: (configparser.ConfigParser, dict)
+        :raises configparser.Error: if the file is not a valid configuration file
+        :raises ValueError: if an option has an invalid value
+        """
+
+        configuration = configparser.ConfigParser(interpolation=configparser.ExtendedInterpolation())
+        configuration.read(config_file)
+        settings = dict()
+
+        if configuration.has_section('main'):
+            if 'username' in configuration['main']:
+                settings['username'] = configuration.get('main', 'username')
+
+            loglevel = configuration.get('main', 'loglevel', fallback='INFO')
+            settings['loglevel'] = getattr(logging, loglevel.upper())
+
+            settings['metrics_address'] = configuration.get('main', 'metrics_address', fallback='localhost')
+            metrics_port = configuration.get('main', 'metrics_port', fallback='').strip()
+            settings['metrics_port'] = int(metrics_port) if metrics_port else None
+            settings['watch_config'] = configuration.getboolean('main', 'watch_config', fallback=False)
+
+        if configuration.has_section('scope'):
+            settings['scope_radius'] = configuration.getint('scope', 'radius', fallback=60)
+            settings['scope_brightness'] = configuration.getfloat('scope', 'scope_brightness', fallback=0.5)
+            settings['airport_brightness'] = configuration.getfloat('scope', 'airport_brightness', fallback=0.5)
+            settings['scope_rotation'] = configuration.getint('scope', 'rotation', fallback=0)
+            settings['vectorize'] = configuration.getboolean('scope', 'vectorize', fallback=True)
+            settings['vectorize_threshold'] = configuration.getint('scope', 'vectorize_threshold', fallback=50)
+            settings['frame_rate'] = configuration.getfloat('scope', 'frame_rate', fallback=1.0)
+            if settings['frame_rate'] <= 0:
+                self.logger.error('Invalid frame_rate {}. Using 1.0'.format(settings['frame_rate']))
+                settings['frame_rate'] = 1.0
+            settings['extrapolation'] = configuration.getboolean('scope', 'extrapolation', fallback=False)
+            settings['max_extrapolation'] = configuration.getfloat('scope', 'max_extrapolation', fallback=30.0)
+            settings['range_filter'] = configuration.getboolean('scope', 'range_filter', fallback=True)
+            settings['circular'] = configuration.getboolean('scope', 'circular', fallback=False)
+            settings['trail_length'] = configuration.getint('scope', 'trail_length', fallback=0)
+            if settings['trail_length'] < 0:
+                self.logger.error('Invalid trail_length {}. Not drawing trails'.format(settings['trail_length']))
+                settings['trail_length'] = 0
+            settings['palette'] = configuration.get('scope', 'palette', fallback='default')
+            if settings['palette'] not in PALETTES:
+                self.logger.error('Unknown palette {}. Using the default palette'.format(settings['palette']))
+                settings['palette'] = 'default'
+            settings['display'] = (
+                configuration.get('scope', 'display', fallback='hat'),
+                configuration.get('scope', 'display_path', fallback='').strip() or None
+            )
+
+        if configuration.has_section('ADSB'):
+            adsb_host = settings['adsb_host'] = configuration.get('ADSB', 'adsb_host', fallback='localhost')
+            settings['receiverurl'] = configuration.get('ADSB', 'receiver_url',
+                                                        fallback='http://{}/dump1090-fa/data/receiver.json'.format(
+                                                            adsb_host
+                                                        ))
+            settings['aircrafturl'] = configuration.get('ADSB', 'aircraft_url',
+                                                        fallback='http://{}/dump1090-fa/data/aircraft.json'.format(
+                                                            adsb_host
+                                                        ))
+            feeds = configuration.get('ADSB', 'feeds', fallback='')
+            settings['feed_urls'] = tuple(url.strip() for url in feeds.split(',') if url.strip())
+            settings['receiver_ttl'] = configuration.getfloat('ADSB', 'receiver_ttl', fallback=300)
+            poll_interval = settings['poll_interval'] = configuration.getfloat('ADSB', 'poll_interval', fallback=1.0)
+            settings['max_poll_interval'] = configuration.getfloat('ADSB', 'max_poll_interval', fallback=poll_interval)
+            cpu_budget = configuration.get('ADSB', 'cpu_budget', fallback='').strip()
+            settings['cpu_budget'] = float(cpu_budget) if cpu_budget else None
+            settings['expiry'] = configuration.getfloat('ADSB', 'expiry', fallback=60)
+
+            settings['source'] = configuration.get('ADSB', 'source', fallback='json')
+            if settings['source'] not in ('json', 'sbs', 'replay'):
+                self.logger.error('Unknown ADSB source {}. Using json'.format(settings['source']))
+                settings['source'] = 'json'
+            settings['sbs_host'] = configuration.get('ADSB', 'sbs_host', fallback=adsb_host.split(':')[0])
+            settings['sbs_port'] = configuration.getint('ADSB', 'sbs_port', fallback=30003)
+            settings['record_file'] = configuration.get('ADSB', 'record_file', fallback='').strip() or None
+            settings['replay'] = (
+                configuration.get('ADSB', 'replay_file', fallback='').strip() or None,
+                configuration.getfloat('ADSB', 'replay_speed', fallback=1.0),
+                configuration.getboolean('ADSB', 'replay_loop', fallback=False)
+            )
+            if settings['source'] == 'replay' and settings['replay'][0] is None:
+                self.logger.error('No replay_file given to replay. Using json')
+                settings['source'] = 'json'
+
+            settings['http'] = (
+                configuration.getfloat('ADSB', 'connect_timeout', fallback=2.0),
+                configuration.getfloat('ADSB', 'read_timeout', fallback=5.0),
+                configuration.getint('ADSB', 'retries', fallback=2),
+                configuration.getfloat('ADSB', 'retry_backoff', fallback=0.5)
+            )
+            settings['json_decoder'] = configuration.get('ADSB', 'json_decoder', fallback='auto')
+            if configuration.getboolean('ADSB', 'json_filter', fallback=False):
+                self.logger.warning('json_filter is no longer supported, and is ignored')
+
+        if configuration.has_section('airports'):
+            airports = list()
+            for airport in configuration.items(section='airports'):
+                icao_code = airport[0]
+                coordinates = airport[1].strip().split(',')
+                airports.append((icao_code, float(coordinates[0]), float(coordinates[1])))
+            settings['airports'] = tuple(airports)
+
+        if configuration.has_section('waypoints'):
+            files = configuration.get('waypoints', 'files', fallback='')
+            types = configuration.get('waypoints', 'types', fallback='')
+            settings['waypoints'] = (
+                tuple(path.strip() for path in files.split(',') if path.strip()),
+                tuple(waypoint_type.strip() for waypoint_type in types.split(',') if waypoint_type.strip())
+            )
+
+        return configuration, settings
+
+    def apply_config(self, settings):
+        """
+        Apply the settings parsed by parse_config() to the daemon.
+
+        Only the settings which differ from the current ones are applied, and only the caches and threads affected
+        by them are rebuilt: e.g. a new radius is picked up by the projection and the background layer on the next
+        frame, a new palette rebuilds the altitude colour lookup table, new HTTP options rebuild the connection pool.
+        While the daemon runs, a new brightness or rotation is sent to the display, a new polling interval to the
+        fetcher, and the SBS source and the metrics endpoint are restarted if their settings change.
+
+        :param dict settings: settings as returned by parse_config()
+        :return: names of the settings which changed
+        :rtype: set[str]
+        """
+
+        settings = dict(settings)
+        changed = set()
+
+        # the username given on the command line takes precedence
+        username = settings.pop('username', None)
+        if username is not None and not self.username:
+            self.username = username
+
+        if 'loglevel' in settings:
+            loglevel = settings.pop('loglevel')
+            if loglevel != self.logger.level:
+                self.logger.setLevel(loglevel)
+                changed.add('loglevel')
+
+        if 'expiry' in settings:
+            expiry = settings.pop('expiry')
+            if expiry != self.registry.expiry:
+                self.registry.expiry = expiry
+                changed.add('expiry')
+
+        # settings which are rebuilt into objects
+        for name in ('http', 'json_decoder', 'replay', 'display', 'airports', 'waypoints'):
+            if name in settings:
+                value = settings.pop(name)
+                if value != self.settings.get(name):
+                    self.settings[name] = value
+                    changed.add(name)
+
+        for name, value in settings.items():
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                changed.add(name)
+
+        if 'http' in changed:
+            connect_timeout, read_timeout, retries, backoff = self.settings['http']
+            # the fetcher may still be using a connection of the old pool, which closes it once released
+            http, self.http = self.http, HTTPConnectionPool(connect_timeout=connect_timeout, read_timeout=read_timeout,
+                                                            retries=retries, backoff=backoff)
+            http.close()
+
+        if 'json_decoder' in changed:
+            try:
+                self.decoder = JSONDecoder(backend=self.settings['json_decoder'])
+            except ValueError as e:
+                self.logger.error('{}. Using the default JSON decoder'.format(e))
+                self.decoder = JSONDecoder()
+
+        if 'extrapolation' in changed and not self.extrapolation:
+            self.registry.reset_positions()
+
+        if 'trail_length' in changed:
+            self.registry.set_trail_length(self.trail_length)
+
+        if 'record_file' in changed and self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+        if changed & {'source', 'replay'}:
+            # the replay, if any, starts over, and its clock isn't comparable with the real one
+            self.replay = None
+            self.registry = AircraftRegistry(self.registry.expiry, trail_length=self.trail_length)
+
+        if 'display' in changed:
+            name, path = self.settings['display']
+            try:
+                display = create_display(name, path, uh.get_shape())
+            except ValueError as e:
+                self.logger.error('{}. Using the UnicornHAT HD'.format(e))
+                display = uh
+            self.set_display(display)
+
+        if 'airports' in changed:
+            self.airports = list()
+            for icao_code, latitude, longitude in self.settings['airports']:
+                self.add_airport(icao_code, latitude, longitude)
+
+        if 'waypoints' in changed:
+            paths, types = self.settings['waypoints']
+            self.waypoints = Waypoints(paths=paths, types=types, logger=self.logger)
+            self.invalidate_background()
+
+        self.get_colour_map()
+
+        if self.fetcher is not None:
+            self.apply_running(changed)
+
+        return changed
+
+    def set_display(self, display):
+        """
+        Draw the scope on another display, e.g. a MemoryDisplay to run the daemon headless.
+
+        :param display: the unicornhathd module, or one of the displays of this module
+        """
+
+        if display is self.display:
+            return
+        if self.fetcher is not None:
+            self.display.off()
+            display.brightness(self.scope_brightness)
+            display.rotation(self.scope_rotation)
+        self.display = display
+        self.framebuffer = FrameBuffer(display, display.get_shape())
+        self.invalidate_background()
+
+    def apply_running(self, changed):
+        """
+        Apply changed settings to the display and the threads of the running daemon.
+
+        :param set[str] changed: names of the settings which changed
+        """
+
+        if 'scope_brightness' in changed:
+            self.display.brightness(self.scope_brightness)
+            self.framebuffer.invalidate()
+
+        if 'scope_rotation' in changed:
+            self.display.rotation(self.scope_rotation)
+            self.framebuffer.invalidate()
+
+        scheduler = self.fetcher.scheduler
+        if scheduler is not None and changed & {'poll_interval', 'max_poll_interval', 'cpu_budget'}:
+            scheduler.min_interval = self.poll_interval
+            scheduler.max_interval = max(self.poll_interval, self.max_poll_interval)
+            scheduler.cpu_budget = self.cpu_budget
+            scheduler.interval = self.poll_interval
+            self.fetcher.set_interval(self.poll_interval)
+
+        if changed & {'source', 'sbs_host', 'sbs_port'}:
+            if self.sbs is not None:
+                self.sbs.stop()
+                self.sbs = None
+            self.start_sbs()
+
+        if changed & {'metrics_address', 'metrics_port'}:
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
+                self.metrics_server = None
+            self.start_metrics_server()
+
+    def setup_server_socket(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(self.sockaddr)
+        self.socket.listen()
+
+    def destroy_server_socket(self):
+        # self.socket.shutdown(socket.SHUT_RDWR)
+        self.socket.close()
+        self.socket = None
+
+        for client in self.clients:
+            client.close()
+        self.clients = list()
+
+    def service_control(self, timeout):
+        """
+        Wait up to timeout seconds for the control socket and its clients, and serve them.
+
+        :param float timeout: maximum number of seconds to wait
+        """
+
+        # a client on its way out stays readable once it has sent EOF, so it is only waited on until its output is sent
+        rlist = [self.socket] + [client for client in self.clients if not client.closing]
+        wlist = [client for client in self.clients if client.output]
+        ready, writable, _ = select.select(rlist, wlist, [], timeout)
+
+        for sock in ready:
+            self.connection_handler(sock)
+            if self.socket is None:
+                return      # restarted
+
+        for client in writable:
+            client.flush()
+
+        for client in [client for client in self.clients if client.done]:
+            client.close()
+            self.clients.remove(client)
+
+    def connection_handler(self, sock):
+        """
+        Accept a new client of the control socket, or run the commands a client has sent.
+
+        The control protocol is line-delimited JSON: every command is a JSON object on a line of its own, e.g.
+        {"command": "set", "radius": 40}, and every response is a JSON object on a line of its own, with "ok" set to
+        true, or to false and the "error". Commands can also be sent as plain words, e.g. set radius 40.
+
+        :param sock: the listening socket, or a ControlClient
+        """
+
+        if sock is self.socket:
+            conn, _ = sock.accept()
+            client = ControlClient(conn)
+            if len(self.clients) >= self.max_clients:
+                client.send({'ok': False, 'error': 'too many clients'})
+                client.closing = True
+            self.clients.append(client)
+            return
+
+        for line in sock.receive():
+            try:
+                request = self.parse_command(line)
+                if request.get('command') == 'restart':
+                    self.restart()
+                    return
+                response = self.execute(request)
+            except (ValueError, TypeError) as e:
+                response = {'ok': False, 'error': str(e)}
+            sock.send(response)
+
+    @staticmethod
+    def parse_command(line):
+        """
+        Parse a line sent to the control socket.
+
+        :param bytes line: a JSON object, or plain words, e.g. set radius 40
+        :return: the command as a dict with the name of the command in "command"
+        :rtype: dict
+        :raises ValueError: if the line cannot be parsed
+        """
+
+        text = line.decode('utf-8')
+        if text.startswith('{'):
+            request = json.loads(text)
+            if not isinstance(request.get('command'), str):
+                raise ValueError('no command given')
+            return request
+
+        words = text.split()
+        request = {'command': words[0]}
+        if len(words) == 3:
+            request[words[1]] = json.loads(words[2])
+        elif len(words) != 1:
+            raise ValueError('cannot parse {}'.format(text))
+        return request
+
+    def execute(self, request):
+        """
+        Run a command sent to the control socket.
+
+        The commands are:
+          - set: change any of radius (NM), brightness (0.0 to 1.0) or rotation (degrees) of the scope
+          - reload-config: read the configuration file again
+          - stats: get the timings and counters (see stats())
+          - snapshot: get the aircraft and the frame currently shown (see snapshot())
+
+        :param dict request: the command
+        :return: the response
+        :rtype: dict
+        :raises ValueError: if the command or its arguments are not valid
+        """
+
+        command = request['command']
+
+        if command == 'set':
+            settings = {name: value for name, value in request.items() if name != 'command'}
+            for name in settings:
+                if name not in self.control_settings:
+                    raise ValueError('unknown setting {}'.format(name))
+            self.apply_settings(**settings)
+            return {'ok': True}
+        elif command == 'reload-config':
+            return {'ok': True, 'changed': sorted(self.reload_config())}
+        elif command == 'stats':
+            return {'ok': True, 'stats': self.stats()}
+        elif command == 'snapshot':
+            return {'ok': True, 'snapshot': self.snapshot()}
+        raise ValueError('unknown command {}'.format(command))
+
+    def apply_settings(self, radius=None, brightness=None, rotation=None):
+        """
+        Change the settings of the scope while it runs.
+
+        All the settings are validated before any of them is changed.
+
+        :param int radius: radius of the scope in Nautical Miles
+        :param float brightness: brightness of the scope, from 0.0 to 1.0
+        :param int rotation: rotation of the display in degrees
+        :raises ValueError: if a setting is not valid
+        """
+
+        if radius is not None and (type(radius) is not int or radius <= 0):
+            raise ValueError('radius must be a positive integer')
+        if brightness is not None and (type(brightness) not in (int, float) or not 0 <= brightness <= 1):
+            raise ValueError('brightness must be between 0.0 and 1.0')
+        if rotation is not None and type(rotation) is not int:
+            raise ValueError('rotation must be an integer')
+
+        if radius is not None and radius != self.scope_radius:
+            # the projection, the background and the range filter all follow the radius
+            self.scope_radius = radius
+            self.logger.info('Scope radius set to {} NM'.format(radius))
+
+        if brightness is not None and brightness != self.scope_brightness:
+            self.scope_brightness = brightness
+            self.display.brightness(brightness)
+            self.framebuffer.invalidate()
+
+        if rotation is not None and rotation != self.scope_rotation:
+            self.scope_rotation = rotation
+            self.display.rotation(rotation)
+            self.framebuffer.invalidate()
+
+    def reload_config(self):
+        """
+        Read the configuration file again and apply what has changed, without restarting the daemon.
+
+        If the file cannot be parsed, the current configuration is kept.
+
+        :return: names of the settings which changed
+        :rtype: set[str]
+        :raises ValueError: if the configuration file cannot be parsed
+        """
+
+        if not self.config_file:
+            raise ValueError('no configuration file')
+
+        self.logger.info('Reloading configuration')
+        try:
+            configuration, settings = self.parse_config(self.config_file)
+        except (configparser.Error, ValueError, AttributeError) as e:
+            self.logger.error('Cannot reload configuration from {}: {}'.format(self.config_file, e))
+            raise ValueError('cannot reload configuration: {}'.format(e))
+
+        self.configuration = configuration
+        changed = self.apply_config(settings)
+        self.logger.info('Configuration reloaded. Changed: {}'.format(', '.join(sorted(changed)) or 'nothing'))
+        return changed
+
+    def snapshot(self):
+        """
+        Get the state of the scope: the receiver position, the radius, the aircraft and the frame last shown.
+
+        :return: origin, radius, aircraft with a known position, and the frame as a hex string of RGB values, by
+            columns, along with its width and height
+        :rtype: dict
+        """
+
+        aircraft = [{'hex': plane.hex, 'lat': plane.lat, 'lon': plane.lon, 'altitude': plane.altitude,
+                     'track': plane.track, 'speed': plane.speed} for plane in self.registry.positioned()]
+        return {
+            'origin': self.origin,
+            'radius': self.scope_radius,
+            'aircraft': aircraft,
+            'width': self.framebuffer.width,
+            'height': self.framebuffer.height,
+            'frame': self.framebuffer.previous.hex(),
+        }
+
+    def stats(self):
+        """
+        Get the timings of the stages of fetching and drawing the aircraft, the counters and the frame rate.
+
+        See Metrics.summary().
+
+        :rtype: dict
+        """
+
+        return self.metrics.summary()
+
+    def send_command(self, command):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.connect(self.sockaddr)
+        sock.send(bytes(command.encode('utf-8')))
+        sock.shutdown(socket.SHUT_RDWR)
+        sock.close()
+
+    def add_airport(self, icao_code, latitude, longitude):
+        """
+        Add an airport to the static list of airports for plotting
+        :param str icao_code: ICAO code of the airport (e.g. EIDW for Dublin)
+        :param float latitude: latitude of the ARP
+        :param float longitude: longitude of the ARP
+        """
+
+        self.airports.append({
+            "icao_code": icao_code,
+            "lat": latitude,
+            "lon": longitude
+        })
+        self.invalidate_background()
+
+    @staticmethod
+    def departure(lat, chlon=1):
+        """
+        Calculate the geographical departure - an East-West distance at a given latitude.
+
+        :param float lat: the latitude at which to calculate the departure.
+        :param float chlon: change of longitude in degrees
+        :return float: geographic departure in Nautical Miles.
+        """
+
+        return chlon * 60 * math.cos(math.radians(lat))
+
+    def coord_span(self, radius, origin=(0, 0)):
+        """
+        Calculate the span of latitudes and longitudes "visible" on the screen for a given radius (in Nautical Miles)
+        from the centre position as set by the origin.
+
+        For example, given GPS coordinates of the origin as (53, -6) and a radius of 72 NM, the span of coordinates
+        visible on the screen will be:
+
+            minimum latitude:   51.8°
+            maximum latitude:   54.2°
+            span of latitudes:   1.2°
+
+            minimum longitude:  -7.99°
+            maximum longitude:  -4.00°
+            span of longitudes:  1.99°
+
+        :param int radius: the radius for which to calculate the lat/lon span
+        :param (float, float) origin: GPS coordinates of centre point
+        :return: a dictionary with minimum, maximum and spans for latitudes and longitudes
+        :rtype: dict
+        """
+
+        lat = origin[0]
+        lon = origin[1]
+
+        lat_delta = float(radius / 60.0)
+        lon_delta = float(radius / self.departure(lat))
+
+        return {
+            "lat": {
+                "min": lat - lat_delta,
+                "max": lat + lat_delta,
+                "delta": lat_delta
+            },
+            "lon": {
+                "min": lon - lon_delta,
+                "max": lon + lon_delta,
+                "delta": lon_delta
+            }
+        }
+
+    def fetch(self, url, headers=None):
+        """
+        Send a GET request to a web server and return the response.
+
+        The request is sent over a persistent connection from the daemon's HTTPConnectionPool. A 304 Not Modified
+        response to a conditional request is returned like any other response, with an empty body.
+
+        :param str url: URL to fetch
+        :param dict headers: extra request headers, e.g. If-None-Match
+        :return: HTTP status, response headers and the response body
+        :rtype: (int, http.client.HTTPMessage, bytes)
+        :raises urllib.error.HTTPError: if the server responds with an error status
+        :raises OSError: if the request fails
+        :raises http.client.HTTPException: if the server sends an invalid response
+        """
+
+        status, response_headers, body = self.http.request(url, headers)
+        if status >= 400:
+            raise urllib.error.HTTPError(url, status, http.client.responses.get(status, ''), response_headers, None)
+        # only the receiver of aircraft_url is recorded: the feeds of other receivers would be mixed up with it
+        if status == 200 and self.record_file and url in (self.aircrafturl, self.receiverurl):
+            self.record(url, response_headers, body)
+        return status, response_headers, body
+
+    def record(self, url, headers, body):
+        """
+        Append a document fetched from the ADSB receiver to the log in record_file, to be replayed later.
+
+        :param str url: URL the document was fetched from
+        :param http.client.HTTPMessage headers: response headers
+        :param bytes body: the response body
+        """
+
+        recorder = self.recorder
+        if recorder is None or recorder.path != self.record_file:
+            recorder = self.recorder = FeedRecorder(self.record_file, logger=self.logger)
+        if headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        recorder.record(urllib.parse.urlsplit(url).path.rsplit('/', 1)[-1], body)
+
+    def get_replay(self):
+        """
+        Get the replay of the log in replay_file, which the aircraft are taken from with source = replay.
+
+        :rtype: FeedReplay
+        """
+
+        if self.replay is None:
+            path, speed, loop = self.settings.get('replay', (None, 1.0, False))
+            if path is None:
+                raise ValueError('No replay_file given to replay')
+            self.replay = FeedReplay(path, speed=speed, loop=loop, logger=self.logger)
+        return self.replay
+
+    def clock(self):
+        """
+        Get the time.monotonic() time of the daemon, which is the time of the replay when replaying a recording.
+
+        :rtype: float
+        """
+        if self.source == 'replay' and self.replay is not None:
+            return self.replay.clock()
+        return time.monotonic()
+
+    def get_json(self, url):
+        """
+        Fetch JSON data from a web server and return a dictionary with same.
+
+        :param str url: URL where to fetch the JSON data from
+        :return: a dictionary with JSON data
+        :rtype: dict
+        """
+
+        json_data = dict()
+
+        try:
+            _, headers, data = self.fetch(url)
+        except (OSError, http.client.HTTPException) as e:
+            self.logger.error("{}: Error opening url: {}".format(type(e).__name__, url))
+            return json_data
+
+        encoding = headers.get_content_charset('utf-8')
+        json_data = self.decoder.decode(data, encoding)
+        return json_data
+
+    def get_aircraft(self):
+        """
+        Get a list of aircraft within the range of the ADSB receiver
+
+        Depending on the configured source, the aircraft are either fetched from aircraft.json (see AircraftFeed),
+        taken from the table maintained by the SBSSource thread, or replayed from a recording (see FeedReplay).
+
+        :return: a list of all aircraft in the range of the receiver.
+        :rtype: list[dict]
+        """
+
+        if self.source == 'sbs':
+            return self.sbs.get_aircraft() if self.sbs is not None else list()
+
+        feeds = self.get_feeds()
+        if len(feeds) == 1:
+            return feeds[0].get_aircraft()
+
+        # the feeds are fetched concurrently, so the slowest one, not all of them, holds up the others
+        if self.feed_pool is None:
+            self.feed_pool = concurrent.futures.ThreadPoolExecutor(len(feeds), thread_name_prefix='feed')
+        with self.metrics.timer('fetch'):
+            all_aircraft = list(self.feed_pool.map(AircraftFeed.get_aircraft, feeds))
+
+        # the aircraft last fetched from a receiver which is down aren't reported again
+        fetched = [(feed.time, aircraft) for feed, aircraft in zip(feeds, all_aircraft) if not feed.failed]
+        return self.merge_aircraft([aircraft for _, aircraft in fetched], [when for when, _ in fetched])
+
+    def get_feeds(self):
+        """
+        Get the aircraft feeds: aircraft_url, followed by the other receivers listed in feeds.
+
+        The feeds of the other receivers are named after their host, to tell their fetch times and errors apart.
+        Only aircraft_url is recorded to record_file, and replayed when replaying a recording.
+
+        :rtype: list[AircraftFeed]
+        """
+
+        fetch = self.get_replay().fetch if self.source == 'replay' else self.fetch
+        urls = [self.aircrafturl]
+        if self.source == 'json':
+            urls.extend(url for url in self.feed_urls if url != self.aircrafturl)
+
+        feeds = self.feeds
+        if [feed.url for feed in feeds] != urls or any(feed.decoder is not self.decoder or feed.fetch != fetch
+                                                       for feed in feeds):
+            current = {feed.url: feed for feed in feeds if feed.decoder is self.decoder and feed.fetch == fetch}
+            feeds = list()
+            for url in urls:
+                name = (urllib.parse.urlsplit(url).netloc or url) if len(urls) > 1 else None
+                feed = current.get(url)
+                if feed is None or feed.name != name:
+                    feed = AircraftFeed(url, fetch, self.decoder, logger=self.logger, metrics=self.metrics, name=name)
+                feeds.append(feed)
+            self.feeds = feeds
+            self.feed = feeds[0]
+            if self.feed_pool is not None:
+                self.feed_pool.shutdown(wait=False)
+                self.feed_pool = None
+        return feeds
+
+    @staticmethod
+    def merge_aircraft(all_aircraft, times=None):
+        """
+        Merge the aircraft reported by several receivers by their ICAO hex address.
+
+        Of the reports of an aircraft seen by more than one receiver, the one with the freshest position (the latest
+        time minus seen_pos) is kept, or if none has a position, the one heard from last (the latest time minus seen).
+        The seen and seen_pos ages are relative to the time of each aircraft.json, so receivers whose documents were
+        written at different times, or fetched at different times, are compared by the time the aircraft were seen.
+
+        :param list[list[dict]] all_aircraft: aircraft as listed in the aircraft.json of each receiver
+        :param list[float] times: time ("now") of the aircraft.json of each receiver; None if all are the same
+        :return: aircraft in the same format as aircraft.json
+        :rtype: list[dict]
+        """
+
+        merged = dict()
+        for aircraft, when in zip(all_aircraft, times if times is not None else itertools.repeat(0.0)):
+            when = when or 0.0
+            for plane in aircraft:
+                icao = plane.get('hex')
+                if icao is None:
+                    continue
+                other = merged.get(icao)
+                if 'lat' in plane and 'lon' in plane:
+                    seen = when - plane.get('seen_pos', 0)
+                    if other is None or not other[1] or seen > other[0]:
+                        merged[icao] = (seen, True, plane)
+                elif other is None or not other[1] and when - plane.get('seen', 0) > other[0]:
+                    merged[icao] = (when - plane.get('seen', 0), False, plane)
+        return [plane for _, _, plane in merged.values()]
+
+    def get_receiver_origin(self):
+        """
+        Get the GPS coordinates of the ADSB receiver
+
+        :return: lat/lon of the ADSB receiver
+        :rtype: (float, float)
+        """
+
+        data = self.get_json(self.receiverurl)
+        if "lat" in data and "lon" in data:
+            latitude = data["lat"]
+            longitude = data["lon"]
+            return latitude, longitude
+        else:
+            return None, None
+
+    def get_origin(self):
+        """
+        Get the GPS coordinates of the ADSB receiver from the receiver origin cache.
+
+        Unlike get_receiver_origin(), this doesn't fetch receiver.json on every call. See ReceiverOriginCache.
+
+        :return: lat/lon of the ADSB receiver, or (None, None) if it is not known yet
+        :rtype: (float, float)
+        """
+
+        fetch = self.get_replay().fetch if self.source == 'replay' else self.fetch
+        cache = self.origin_cache
+        if cache is None or cache.url != self.receiverurl or cache.ttl != self.receiver_ttl or cache.fetch != fetch:
+            cache = ReceiverOriginCache(fetch, self.receiverurl, ttl=self.receiver_ttl, logger=self.logger,
+                                        decoder=self.decoder)
+            self.origin_cache = cache
+        cache.decoder = self.decoder
+        return cache.get()
+
+    @staticmethod
+    def pixel_origin(shape=None):
+        """
+        Get the pixel coordinates of the ADSB receiver on the display
+
+        This should always be the centre of the LED matrix.
+        :param (int, int) shape: width and height of the display; defaults to the shape of the UnicornHAT HD
+        :return: pixel coordinates of the ADSB receiver
+        :rtype: (int, int)
+        """
+
+        if shape is None:
+            shape = uh.get_shape()
+        x = math.floor(shape[0] / 2)
+        y = math.floor(shape[1] / 2)
+        return int(x), int(y)
+
+    @staticmethod
+    def pixel_radius(shape=None):
+        """
+        Find and return the radius in pixels for the LED Matrix.
+
+        This function will return a minimum of half the length or half the height of the screen in pixels.
+        :param (int, int) shape: width and height of the display; defaults to the shape of the UnicornHAT HD
+        :return: a length of radius in pixels
+        :rtype: int
+        """
+
+        if shape is None:
+            shape = uh.get_shape()
+        radius = math.floor(max(shape[0] / 2, shape[1] / 2))
+        return radius
+
+    def get_projection(self, radius, origin):
+        """
+        Get the projection of GPS coordinates onto the display for a given radius and origin.
+
+        The projection is only recreated when the radius, the origin or the shape of the display changes.
+
+        :param int radius: radius in Nautical Miles
+        :param (float, float) origin: GPS coordinates of the centre point (origin)
+        :rtype: Projection
+        """
+
+        shape = self.display.get_shape()
+        if self.projection is None or not self.projection.matches(radius, origin, shape):
+            self.projection = Projection(radius, origin, shape)
+        return self.projection
+
+    def pixel_pos(self, radius, origin, position):
+        """
+        Calculate the pixel coordinates for a GPS position given the GPS coordinates of the origin and a radius in
+        Nautical Miles.
+
+        :param int radius: radius in Nautical Miles
+        :param (float, float) origin: GPS coordinates of the centre point (origin)
+        :param (float, float) position: GPS coordinates to plot (i.e. of the aircraft)
+        :return: a tuple of pixel coordinates (x, y)
+        :rtype: (int, int)
+        """
+
+        return self.get_projection(radius, origin).project(position[0], position[1])
+
+    @staticmethod
+    def normalise(value, min_value=0, max_value=45000, bottom=0.0, top=1.0):
+        """
+        Scale a measured value (by default from a range 0..45000) to a fraction between 0.0 and 1.0.
+
+        All values below or above the min/max range are clipped to min/max respectively.
+
+        The calculation is taken from Ask Dr Math page:
+        http://mathforum.org/library/drmath/view/60433.html
+
+        :param float value: actual measured value
+        :param float min_value: minimum of the range of values
+        :param float max_value: maximum of the range of values
+        :param float bottom: minimum of the normalised range
+        :param float top: maximum of the normalised range
+        :return: a normalised value
+        :rtype: float
+        """
+        if value < min_value:
+            value = min_value
+        if value > max_value:
+            value = max_value
+        normalised = bottom + (value - min_value) * (top - bottom)/(max_value - min_value)
+        return normalised
+
+    @staticmethod
+    def hsv2rgb(h, s, v):
+        """
+        A wrapper method for colorsys.hsv_to_rgb().
+
+        The colorsys.hsv_to_rgb() uses and returns normalised values for each colour coordinate (i.e. values from
+        0.0 to 1.0). unicornhathd.set_pixel() requires RGB colors as values from 0 to 255.
+
+        This method converts normalised values to 8-bit integers.
+
+        :param float h: hue
+        :param float s: saturation
+        :param float v: value
+        :return: RGB colour components as (r, g, b)
+        :rtype: (int, int, int)
+        """
+        return tuple(int(i * 255) for i in colorsys.hsv_to_rgb(h, s, v))
+
+    def get_colour_map(self):
+        """
+        Get the altitude colour lookup table for the configured palette.
+
+        The lookup table is only rebuilt when the palette changes.
+
+        :rtype: AltitudeColourMap
+        """
+
+        palette = PALETTES[self.palette]
+        if self.colour_map is None or self.colour_map.palette is not palette:
+            self.colour_map = AltitudeColourMap(palette)
+        return self.colour_map
+
+    def get_altitude_colour(self, altitude=None, highlight=False):
+        """
+        Get a colour corresponding to a given altitude.
+
+        This looks up an RGB colour for any altitude between 0 and 45000ft in the configured palette, by default in
+        a similar fashion as per dump1090-fa web interface. Altitudes above 40000ft have the colour of 40000ft.
 
         If altitude is None, this method will simply return a dark gray colour.
 
@@ -720,20 +4060,7 @@ class RadarDaemon(Daemon):
         :rtype: (int, int, int)
         """
 
-        if type(altitude) is not int:
-            altitude = None
-
-        if altitude is None or altitude < 0:            # handle special case of unknown altitude
-            return 64, 64, 64
-
-        hue = self.normalise(altitude, min_value=0, max_value=40000, bottom=0.0, top=0.85)
-        if highlight:
-            intensity = 1
-            saturation = 0.50
-        else:
-            intensity = 0.66
-            saturation = 1
-        return self.hsv2rgb(hue, saturation, intensity)
+        return self.get_colour_map().lookup(altitude, highlight)
 
     def plot_airports(self, airports, origin, radius):
         """
@@ -747,26 +4074,186 @@ class RadarDaemon(Daemon):
         """
 
         brightness_scaling_factor = 64
+        projection = self.get_projection(radius, origin)
+
+        # this calculates the shade of gray (brightness) of the airport depending on the
+        # configuration setting
+        colour = colorsys.hsv_to_rgb(0, 0, self.airport_brightness * brightness_scaling_factor)
+
         for airport in airports:
-            pixel = self.pixel_pos(radius, origin, (airport["lat"], airport["lon"]))
+            pixel = projection.project(airport["lat"], airport["lon"])
 
             # don't plot an airport if it's at or beyond the scope margin
-            if pixel[0] == 0 or pixel[0] == 15 or pixel[1] == 0 or pixel[1] == 15:
+            if pixel[0] == 0 or pixel[0] == projection.max_x or pixel[1] == 0 or pixel[1] == projection.max_y:
                 continue
 
-            # this calculates the shade of gray (brightness) of the airport depending on the
-            # configuration setting
-            colour = colorsys.hsv_to_rgb(0, 0, self.airport_brightness * brightness_scaling_factor)
-            uh.set_pixel(pixel[0], pixel[1], colour[0], colour[1], colour[2])
+            self.framebuffer.set_pixel(pixel[0], pixel[1], colour[0], colour[1], colour[2])
+
+    def plot_waypoints(self, origin, radius):
+        """
+        Plot the imported waypoints within range on the UnicornHAT HD, in the same colour as the airports.
+
+        The waypoints are only imported again when the area covered by the scope changes.
+
+        :param (float, float) origin: GPS coordinates of the receiver as lat, lon
+        :param int radius: scope radius in Nautical Miles
+        """
+
+        if not self.waypoints.paths:
+            return
+
+        span = self.coord_span(radius, origin)
+        self.waypoints.cull((span['lat']['min'], span['lat']['max'], span['lon']['min'], span['lon']['max']))
+        self.plot_airports(self.waypoints, origin, radius)
 
     def plot_receiver(self):
         """
         Plot the position of the ADSB receiver on the Radar Scope
         """
-        rcvr = self.pixel_origin()
-        uh.set_pixel(rcvr[0], rcvr[1], 255, 255, 255)  # display the position of the receiver on the UnicornHAT
+        rcvr = self.pixel_origin(self.display.get_shape())
+        self.framebuffer.set_pixel(rcvr[0], rcvr[1], 255, 255, 255)  # display the position of the receiver
+
+    @staticmethod
+    def draw_order(position):
+        """
+        Sort key placing aircraft in the order they should be drawn on the scope.
+
+        Aircraft with unknown altitude are drawn first, followed by the remaining aircraft from the highest to the
+        lowest, so that when two aircraft share a pixel, the lower one is on top.
+
+        :param position: lat, lon and altitude of an aircraft
+        :rtype: (int, int)
+        """
+
+        altitude = position[2]
+        if type(altitude) is not int or altitude < 0:
+            return 0, 0
+        return 1, -altitude
+
+    def render_aircraft(self, positions, projection):
+        """
+        Project and colour the positions of aircraft.
+
+        The aircraft are resolved into a z-buffer first: the occupants of each pixel are counted, and the aircraft on
+        top (the last one in draw_order(), i.e. the lowest, or of several at the same altitude the last one listed)
+        gives the pixel its colour. Pixels shared by several aircraft, and the pixel directly overhead the receiver,
+        are highlighted. Each pixel is returned once, so it is only set once per frame.
+
+        Large lists of aircraft are rendered in a single vectorised pass with NumPy (if it is installed and
+        vectorisation is enabled), smaller ones one by one in pure Python. Both give the same results.
+
+        :param list[(float, float, float)] positions: list of aircraft positions, \
+                where each element of the list is a tuple of lat, lon, altitude for a given aircraft
+        :param Projection projection: projection of GPS coordinates onto the display
+        :return: pixels to set, as (x, y, r, g, b), ordered by x, y
+        :rtype: list[(int, int, int, int, int)]
+        """
+
+        if self.vectorize and np is not None and len(positions) >= self.vectorize_threshold:
+            return self.render_aircraft_numpy(positions, projection)
+        return self.render_aircraft_python(positions, projection)
+
+    def render_aircraft_python(self, positions, projection):
+        """
+        Pure Python implementation of render_aircraft().
+        """
+
+        started = time.perf_counter()
+
+        # z-buffer: the draw order key and altitude of the aircraft on top, and the number of occupants of each pixel
+        depth = dict()
+        occupants = dict()
+        for position in positions:
+            pixel = projection.project(position[0], position[1])
+            key = self.draw_order(position)
+
+            top = depth.get(pixel)
+            if top is None:
+                occupants[pixel] = 1
+                depth[pixel] = (key, position[2])
+            else:
+                occupants[pixel] += 1
+                if key >= top[0]:
+                    depth[pixel] = (key, position[2])
+
+        projected = time.perf_counter()
+        self.metrics.record('project', projected - started)
+
+        rcvr = self.pixel_origin(self.display.get_shape())
+        pixels = list()
+        for pixel, (_, altitude) in sorted(depth.items()):
+            # make the pixel extra bright if several aircraft overlap, or if it's directly overhead the receiver
+            highlight = occupants[pixel] > 1 or pixel == rcvr
+
+            colour = self.get_altitude_colour(altitude, highlight=highlight)
+            pixels.append((pixel[0], pixel[1], colour[0], colour[1], colour[2]))
+
+        self.metrics.record('colour', time.perf_counter() - projected)
+        return pixels
+
+    def render_aircraft_numpy(self, positions, projection):
+        """
+        NumPy implementation of render_aircraft().
+
+        This repeats the floating point operations of Projection.project() element-wise and in the same order, and
+        takes the colours from the same AltitudeColourMap, so the results are identical to those of
+        render_aircraft_python().
+        """
 
-    def plot_aircraft(self, positions, origin, radius):
+        started = time.perf_counter()
+        count = len(positions)
+        lat = np.fromiter((position[0] for position in positions), dtype=np.float64, count=count)
+        lon = np.fromiter((position[1] for position in positions), dtype=np.float64, count=count)
+        alt = np.fromiter((position[2] if type(position[2]) is int else -1 for position in positions),
+                          dtype=np.int64, count=count)
+
+        # project
+        x = projection.x_origin + ((lon - projection.origin[1]) / projection.deg_per_px_lon) * projection.x_sign
+        y = projection.y_origin + ((lat - projection.origin[0]) / projection.deg_per_px_lat) * projection.y_sign
+        if projection.flip_x:
+            x = projection.shape[0] - x
+        if projection.flip_y:
+            y = projection.shape[1] - y
+
+        # clip
+        x = np.clip(x, 0, projection.max_x).astype(np.int64)
+        y = np.clip(y, 0, projection.max_y).astype(np.int64)
+
+        # z-buffer: count the occupants of each pixel, and find the last aircraft drawn on each one in the draw
+        # order, the same as sorted(positions, key=self.draw_order) (np.lexsort is stable)
+        known = alt >= 0
+        pixel = x * (projection.max_y + 1) + y
+        occupants = np.bincount(pixel, minlength=(projection.max_x + 1) * (projection.max_y + 1))
+        order = np.lexsort((np.where(known, -alt, 0), known))[::-1]
+        pixel, first = np.unique(pixel[order], return_index=True)
+        top = order[first]
+
+        x, y, alt, known = x[top], y[top], alt[top], known[top]
+
+        projected = time.perf_counter()
+        self.metrics.record('project', projected - started)
+
+        # colour map
+        rcvr = self.pixel_origin(self.display.get_shape())
+        highlight = (occupants[pixel] > 1) | ((x == rcvr[0]) & (y == rcvr[1]))
+
+        colour_map = self.get_colour_map()
+        normal, highlighted = colour_map.numpy_tables()
+
+        index, remainder = np.divmod(np.clip(alt, 0, colour_map.ceiling), colour_map.step)
+        rgb = np.where(highlight[:, np.newaxis], highlighted[index], normal[index])
+        rgb[~known] = colour_map.unknown
+
+        # altitudes off the lookup table grid are rare, look them up one by one
+        for i in np.flatnonzero(known & (remainder != 0)).tolist():
+            rgb[i] = colour_map.lookup(int(alt[i]), bool(highlight[i]))
+
+        pixels = np.column_stack((x, y, rgb))
+        pixels = [tuple(pixel) for pixel in pixels.tolist()]
+        self.metrics.record('colour', time.perf_counter() - projected)
+        return pixels
+
+    def plot_aircraft(self, positions, origin, radius, trails=None):
         """
         Plot the positions of all aircraft in range of the ADSB receiver on the Radar Scope
 
@@ -774,100 +4261,448 @@ class RadarDaemon(Daemon):
                 where each element of the list is a tuple of lat, lon, altitude for a given aircraft
         :param [float, float] origin: the latitude and longitude of the ADSB receiver
         :param int radius: the radius of the Radar Scope in Nautical Miles
+        :param trails: trails to plot behind the aircraft, see plot_trails()
         :return:
         """
 
-        rcvr = self.pixel_origin()
-        for position in positions:
-            pixel = self.pixel_pos(radius, origin, (position[0], position[1]))
+        projection = self.get_projection(radius, origin)
+        pixels = self.render_aircraft(positions, projection)
 
-            # make the pixel extra bright if it's directly overhead the receiver
-            if pixel == rcvr:
-                highlight = True
-            else:
-                highlight = False
+        with self.metrics.timer('draw'):
+            if trails is not None:
+                self.plot_trails(trails, projection)
+            for x, y, r, g, b in pixels:
+                self.framebuffer.set_pixel(x, y, r, g, b)
+
+    def plot_trails(self, trails, projection):
+        """
+        Plot the trails of aircraft as fading pixels, in the colours of the altitudes of the positions.
+
+        The older a position, the darker its pixel. Each trail is plotted from its oldest position to its newest, so
+        newer positions are drawn over older ones. Positions out of the area covered by the scope are left out,
+        rather than drawn on its border. The samples are read straight from the ring buffers of the trails.
+
+        :param collections.Iterable[Trail] trails: trails of the aircraft
+        :param Projection projection: projection of GPS coordinates onto the display
+        """
+
+        fades = self.trail_fades
+        if len(fades) != self.trail_length:
+            # from 60% of the colour for the newest position down to 10% for the oldest one
+            fades = self.trail_fades = [0.6 - 0.5 * age / max(self.trail_length - 1, 1)
+                                        for age in range(self.trail_length)]
+
+        lat_delta = projection.deg_per_px_lat * projection.y_origin
+        lon_delta = projection.deg_per_px_lon * projection.x_origin
+        lat_min, lat_max = projection.origin[0] - lat_delta, projection.origin[0] + lat_delta
+        lon_min, lon_max = projection.origin[1] - lon_delta, projection.origin[1] + lon_delta
+        lookup = self.get_colour_map().lookup
+        set_pixel = self.framebuffer.set_pixel
+
+        for trail in trails:
+            lats, lons, altitudes, size = trail.lat, trail.lon, trail.altitude, trail.size
+            for age in range(min(trail.count, len(fades)) - 1, -1, -1):
+                i = (trail.head - 1 - age) % size
+                lat, lon = lats[i], lons[i]
+                if not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
+                    continue
+                x, y = projection.project(lat, lon)
+                colour = lookup(altitudes[i])
+                fade = fades[age]
+                set_pixel(x, y, colour[0] * fade, colour[1] * fade, colour[2] * fade)
+
+    def plot_background(self, origin, radius):
+        """
+        Plot the static background of the Radar Scope: the receiver and the airports.
 
-            colour = self.get_altitude_colour(position[2], highlight=highlight)
-            uh.set_pixel(pixel[0], pixel[1], colour[0], colour[1], colour[2])
+        The imported waypoints are plotted first, so that the configured airports are drawn on top of them.
 
-    def plot(self, positions, radius=60):
+        The background is kept by the frame buffer, and only plotted again when the origin, the radius, the rotation,
+        the shape of the display or the airport brightness changes, or after invalidate_background().
+
+        :param (float, float) origin: GPS coordinates of the receiver as lat, lon
+        :param int radius: scope radius in Nautical Miles
+        """
+
+        key = (tuple(origin), radius, self.scope_rotation, self.display.get_shape(),
+               self.airport_brightness)
+        if key == self.background_key:
+            return
+
+        self.framebuffer.clear_background()
+        self.framebuffer.clear()
+        self.plot_receiver()
+        if origin[0] is not None:
+            self.plot_waypoints(origin, radius)
+            self.plot_airports(self.airports, origin, radius)
+        self.framebuffer.set_background()
+        self.background_key = key
+
+    def invalidate_background(self):
+        """
+        Have the static background plotted again for the next frame, e.g. when the list of airports changes.
+        """
+        self.background_key = None
+
+    def plot(self, positions, radius=60, origin=None, trails=None):
         """
         Plot aircraft positions on the UnicornHAT HD.
 
         :param list[(float, float, float)] positions: list of aircraft positions, \
                 where each element of the list is a tuple of lat, lon, altitude for a given aircraft
         :param int radius: radius in Nautical Miles
+        :param (float, float) origin: GPS coordinates of the receiver; fetched from the receiver if not given
+        :param collections.Iterable[Trail] trails: trails to plot behind the aircraft
         """
-        origin = self.get_receiver_origin()
+        if origin is None:
+            origin = self.get_origin()
 
-        # clear the display buffer
-        uh.clear()
+        # start the frame with the receiver and the airports
+        self.plot_background(origin, radius)
+        self.framebuffer.clear()
 
-        self.plot_receiver()
-        self.plot_airports(self.airports, origin, radius)
-        self.plot_aircraft(positions, origin, radius)
+        # without the receiver position there is nothing to plot the aircraft against
+        if origin[0] is not None:
+            self.plot_aircraft(positions, origin, radius, trails)
+
+        # redraw the screen, if anything has changed
+        with self.metrics.timer('show'):
+            shown = self.framebuffer.show()
+        self.metrics.count('frames_shown' if shown else 'frames_skipped')
+        self.metrics.set('changed_pixels', self.framebuffer.changed_pixels)
+
+    @staticmethod
+    def parse_positions(all_aircraft):
+        """
+        Extract the positions of aircraft from the list of aircraft reported by the ADSB receiver.
+
+        Aircraft without a known position are skipped. The barometric altitude is preferred over the geometric one.
+
+        :param list[dict] all_aircraft: aircraft as listed in aircraft.json
+        :return: list of aircraft positions, where each element of the list is a list of lat, lon, altitude
+        :rtype: list[[float, float, float]]
+        """
+
+        ac_positions = list()
+        for plane in all_aircraft:
+            if "lat" in plane and "lon" in plane:
+                lat = plane["lat"]
+                lon = plane["lon"]
+                if "alt_baro" in plane:
+                    alt = plane["alt_baro"]
+                elif "alt_geom" in plane:
+                    alt = plane["alt_geom"]
+                elif "altitude" in plane:
+                    alt = plane["altitude"]
+                else:
+                    alt = None      # set to unknown value
+                ac_positions.append([lat, lon, alt])
+        return ac_positions
+
+    def fetch_snapshot(self):
+        """
+        Fetch the aircraft and the receiver position from the ADSB receiver.
+
+        This runs in the AircraftFetcher thread.
+
+        :return: a new snapshot, or None if aircraft.json hasn't changed since the last fetch
+        :rtype: Snapshot
+        """
+
+        aircraft = self.get_aircraft()
+        if self.source != 'sbs' and not any(feed.changed for feed in self.feeds):
+            return None
+        return Snapshot(aircraft, self.get_origin(), self.clock())
+
+    def snapshot_traffic(self, snapshot):
+        """
+        Count the aircraft of a snapshot within range of the scope, for the PollScheduler.
+
+        This runs in the AircraftFetcher thread, as soon as the snapshot is fetched, so polling speeds up again with
+        the first aircraft back in range rather than once it has been rendered. The positions reported are counted
+        within the box covered by the scope (or anywhere, without the range filter), without extrapolating them.
+
+        :param Snapshot snapshot: the snapshot just fetched
+        :return: number of aircraft with a position in range
+        :rtype: int
+        """
+
+        if snapshot is None:
+            return 0
+
+        lat_min, lat_max, lon_min, lon_max = -90, 90, -180, 180
+        if self.range_filter and snapshot.origin is not None and snapshot.origin[0] is not None:
+            span = self.coord_span(self.scope_radius, snapshot.origin)
+            lat_min, lat_max = span['lat']['min'], span['lat']['max']
+            lon_min, lon_max = span['lon']['min'], span['lon']['max']
+
+        in_range = 0
+        for plane in snapshot.aircraft:
+            lat, lon = plane.get("lat"), plane.get("lon")
+            if lat is not None and lon is not None and lat_min <= lat <= lat_max and lon_min <= lon <= lon_max:
+                in_range += 1
+        return in_range
+
+    def latest_snapshot(self, snapshot=None):
+        """
+        Take all snapshots from the queue and return the most recent one.
+
+        :param Snapshot snapshot: the snapshot to return if the queue is empty
+        :rtype: Snapshot
+        """
+
+        while True:
+            try:
+                snapshot = self.snapshots.get_nowait()
+            except queue.Empty:
+                return snapshot
+
+    def update(self, snapshot):
+        """
+        Merge a new snapshot into the aircraft registry.
+
+        :param Snapshot snapshot: the snapshot to merge
+        """
+
+        self.registry.merge(snapshot.aircraft, snapshot.timestamp)
+        self.origin = snapshot.origin
+
+    def closest_aircraft(self):
+        """
+        Find the aircraft closest to the ADSB receiver.
 
-        # redraw the screen
-        uh.show()
+        :return: the closest aircraft and its distance in Nautical Miles, or (None, None) if not known
+        :rtype: (Aircraft, float)
+        """
+
+        if self.origin is None:
+            return None, None
+        return self.registry.nearest(*self.origin)
+
+    def render(self, now=None):
+        """
+        Render the aircraft in the registry on the Radar Scope.
+
+        :param float now: time.monotonic() time of the frame; defaults to now
+        """
+
+        if self.origin is None:
+            return      # nothing fetched yet
+        if self.origin[0] is None:
+            # without the receiver position there is no range to filter on, and nothing to plot the aircraft against
+            self.plot([], self.scope_radius, self.origin)
+            return
+
+        if now is None:
+            now = self.clock()
+
+        started = time.perf_counter()
+        self.registry.expire(now)
+        bounds = centre = None
+        if self.range_filter:
+            span = self.coord_span(self.scope_radius, self.origin)
+            bounds = span['lat']['min'], span['lat']['max'], span['lon']['min'], span['lon']['max']
+            if self.circular:
+                centre = self.origin
+        positions = self.registry.positions(now if self.extrapolation else None, self.max_extrapolation,
+                                            bounds, centre, self.scope_radius)
+        self.metrics.record('filter', time.perf_counter() - started)
+
+        if len(positions) != self.aircraft_in_range:
+            self.aircraft_in_range = len(positions)
+            self.metrics.set('aircraft_in_range', self.aircraft_in_range)
+            self.logger.info('{} aircraft in range'.format(self.aircraft_in_range))
+
+        trails = self.registry.trails(bounds) if self.trail_length else None
+        self.plot(positions, self.scope_radius, self.origin, trails)
 
     def run(self):
         """
         The RadarDaemon's run loop (the worker).
+
+        The aircraft are fetched by an AircraftFetcher thread, while this loop renders the latest snapshot at a steady
+        frame rate and services the control socket in between frames.
         """
 
         # preconfigure the display
-        uh.brightness(self.scope_brightness)
-        uh.rotation(self.scope_rotation)
+        self.display.brightness(self.scope_brightness)
+        self.display.rotation(self.scope_rotation)
+        self.framebuffer.invalidate()
+
+        if self.dont_daemonize:
+            signal.signal(signal.SIGHUP, self.sighup_handler)
+
+        self.start_sbs()
+
+        scheduler = PollScheduler(self.poll_interval, self.max_poll_interval, self.cpu_budget,
+                                  traffic=self.snapshot_traffic)
+        self.fetcher = AircraftFetcher(self.fetch_snapshot, self.snapshots, self.poll_interval, self.logger, scheduler,
+                                       self.metrics)
+        self.fetcher.start()
+
+        self.start_metrics_server()
+        self.config_mtime = self.get_config_mtime()
 
-        rlist = [self.socket]
+        next_frame = time.monotonic()
 
         while True:
 
-            all_aircraft = self.get_aircraft()
-            ac_positions = list()
-            for plane in all_aircraft:
-                if "lat" in plane and "lon" in plane:
-                    lat = plane["lat"]
-                    lon = plane["lon"]
-                    if "alt_baro" in plane:
-                        alt = plane["alt_baro"]
-                    elif "alt_geom" in plane:
-                        alt = plane["alt_geom"]
-                    elif "altitude" in plane:
-                        alt = plane["altitude"]
-                    else:
-                        alt = None      # set to unknown value
-                    ac_positions.append([lat, lon, alt])
-
-            if len(ac_positions) != self.aircraft_in_range:
-                self.aircraft_in_range = len(ac_positions)
-                self.logger.info('{} aircraft in range'.format(self.aircraft_in_range))
-
-            self.plot(ac_positions, self.scope_radius)
-
-            ready_sock, _, _ = select.select(rlist, [], [], 1)
-            for rsock in ready_sock:
-                self.connection_handler(rsock)
+            if self.reload_requested or self.config_file_changed():
+                self.reload_requested = False
+                try:
+                    self.reload_config()
+                except ValueError:
+                    pass        # logged, and the current configuration is kept
+
+            snapshot = self.latest_snapshot()
+            if snapshot is not None:
+                self.update(snapshot)
+            self.render()
+            self.metrics.frame()
+
+            next_frame = self.wait_for_frame(next_frame)
+
+    def wait_for_frame(self, last_frame):
+        """
+        Serve the control socket until the next frame is due.
+
+        The next frame is scheduled 1 / frame_rate seconds after the last one, skipping the frames the render loop is
+        already too late for. The control socket is served at least once, even when the frame took longer than that,
+        so that slow frames never leave the clients waiting.
+
+        :param float last_frame: time.monotonic() time the last frame was due
+        :return: time.monotonic() time the next frame is due
+        :rtype: float
+        """
+
+        now = time.monotonic()
+        next_frame = max(last_frame + 1 / self.frame_rate, now)
+
+        self.service_control(max(0.0, next_frame - now))
+        now = time.monotonic()
+        while now < next_frame:
+            self.service_control(next_frame - now)
+            now = time.monotonic()
+        return next_frame
 
     def start(self):
         self.setup_server_socket()
         super().start()
 
+    def start_sbs(self):
+        """
+        Start the SBSSource thread, if the aircraft are taken from the SBS-1 output.
+        """
+
+        if self.source == 'sbs':
+            self.sbs = SBSSource(self.sbs_host, self.sbs_port, logger=self.logger)
+            self.sbs.start()
+
+    def start_metrics_server(self):
+        """
+        Start serving the metrics to Prometheus, if a metrics port is configured.
+        """
+
+        if self.metrics_port is not None:
+            try:
+                self.metrics_server = MetricsServer((self.metrics_address, self.metrics_port), self.metrics)
+                self.metrics_server.start()
+            except OSError as e:
+                self.logger.error('Cannot serve metrics on port {}: {}'.format(self.metrics_port, e))
+
+    def sighup_handler(self, signo, frame):
+        """
+        Override the Daemon.sighup_handler() method to reload the configuration on SIGHUP.
+
+        The configuration is reloaded by the run loop before the next frame, not in the middle of drawing one.
+        """
+        self.reload_requested = True
+
+    def get_config_mtime(self):
+        """
+        Get the modification time of the configuration file.
+
+        :return: modification time in nanoseconds, or None if there is no configuration file
+        :rtype: int
+        """
+
+        if not self.config_file:
+            return None
+        try:
+            return os.stat(self.config_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def config_file_changed(self, now=None):
+        """
+        Check if the configuration file has been modified, if watching it is enabled.
+
+        The file is checked at most once per second, with a single stat() call.
+
+        :param float now: time.monotonic() time; defaults to now
+        :rtype: bool
+        """
+
+        if not self.watch_config:
+            return False
+
+        if now is None:
+            now = time.monotonic()
+        if now < self.config_checked + 1:
+            return False
+        self.config_checked = now
+
+        mtime = self.get_config_mtime()
+        if mtime is None or mtime == self.config_mtime:
+            return False
+        self.config_mtime = mtime
+        return True
+
+    def stop_threads(self):
+        """
+        Stop the AircraftFetcher, SBSSource and MetricsServer threads, if they're running, and close the recording.
+        """
+        if self.fetcher is not None:
+            self.fetcher.stop()
+            self.fetcher = None
+
+        if self.sbs is not None:
+            self.sbs.stop()
+            self.sbs = None
+
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+        if self.feed_pool is not None:
+            self.feed_pool.shutdown(wait=False)
+            self.feed_pool = None
+
     def stop(self, silent=False):
         """
         Override the Daemon.stop() method to implement turning off the UnicornHAT HD when the daemon exits.
         :param bool silent: when set to true, this will log a message to indicate the daemon has been stopped.
         """
-        uh.off()
+        self.display.off()
+        self.framebuffer.invalidate()
         self.destroy_server_socket()
+        self.stop_threads()
+        self.http.close()
         super().stop(silent)
 
     def sigterm_handler(self, signo, frame):
         """
         Override the Daemon.sigterm_handle() method to turn off the UnicornHAT HD when the daemon process is terminated.
         """
-        uh.off()
+        self.display.off()
+        self.framebuffer.invalidate()
         self.destroy_server_socket()
+        self.stop_threads()
+        self.http.close()
         super().sigterm_handler(signo, frame)
 
 def main():
@@ -5,13 +5,27 @@ To run:
 nosetests -s test_radarscoped.py
 """
 
+import gzip
+import http.client
 import json
+import math
+import os
+import queue
+import random
+import re
+import signal
 import socket
+import tempfile
+import threading
+import time
 import unittest
+import urllib.error
 from multiprocessing import Process
 
 import radarscoped
 import mock_httpd
+from mock_httpd.__main__ import MockHttpdServer, SyntheticTraffic
+from mock_sbs.__main__ import MockSBSServer
 
 class RadarScopeTestCase(unittest.TestCase):
 
@@ -30,6 +44,9 @@ class RadarScopeTestCase(unittest.TestCase):
         self.assertEqual(self.radard.adsb_host, 'localhost:10080')
         self.assertEqual(self.radard.aircrafturl, 'http://localhost:10080/dump1090-fa/data/aircraft.json')
         self.assertEqual(self.radard.receiverurl, 'http://localhost:10080/dump1090-fa/data/receiver.json')
+        self.assertEqual(self.radard.poll_interval, 1.0)
+        self.assertEqual(self.radard.max_poll_interval, 10.0)
+        self.assertIsNone(self.radard.cpu_budget)
 
         self.assertEqual(len(self.radard.airports), 4)
 
@@ -80,6 +97,10 @@ class RadarScopeTestCase(unittest.TestCase):
         data = self.radard.get_json('http://localhost:10080/dump1090-fa/data/receiver.json')
         self.assertEqual(data['version'], '3.5.3')
 
+    def test_get_json_not_found(self):
+        data = self.radard.get_json('http://localhost:10080/dump1090-fa/data/missing.json')
+        self.assertEqual(data, {})
+
     def test_get_aircraft(self):
         self.radard.config_file = 'radarscope.conf'
         self.radard.configure()
@@ -87,6 +108,92 @@ class RadarScopeTestCase(unittest.TestCase):
         ac = self.radard.get_aircraft()
         self.assertEqual(len(ac), 9)
 
+    def test_merge_aircraft(self):
+        merged = radarscoped.RadarDaemon.merge_aircraft([
+            [{'hex': 'a', 'lat': 53.0, 'lon': -6.0, 'seen_pos': 5.0}, {'hex': 'b', 'seen': 1.0}, {'flight': 'X'}],
+            [{'hex': 'a', 'lat': 53.1, 'lon': -6.1, 'seen_pos': 0.5}, {'hex': 'b', 'seen': 0.2},
+             {'hex': 'c', 'seen': 3.0}],
+            [{'hex': 'a', 'seen': 0.0}, {'hex': 'b', 'lat': 54.0, 'lon': -7.0, 'seen_pos': 20.0}]
+        ])
+        merged = {plane['hex']: plane for plane in merged}
+        self.assertEqual(sorted(merged), ['a', 'b', 'c'])
+        self.assertEqual(merged['a']['lat'], 53.1)
+        self.assertEqual(merged['b']['lat'], 54.0)
+
+        # the ages are relative to the time of each document
+        merged = radarscoped.RadarDaemon.merge_aircraft([
+            [{'hex': 'a', 'lat': 53.0, 'lon': -6.0, 'seen_pos': 0.5}, {'hex': 'b', 'seen': 0.1}],
+            [{'hex': 'a', 'lat': 53.1, 'lon': -6.1, 'seen_pos': 5.0}, {'hex': 'b', 'seen': 2.0}]
+        ], [1000.0, 1010.0])
+        self.assertEqual([plane.get('lat') for plane in merged], [53.1, None])
+        self.assertEqual(merged[1]['seen'], 2.0)
+
+    def test_get_aircraft_feeds(self):
+        traffic = SyntheticTraffic(50, seed=1)
+        server = MockHttpdServer(('localhost', 0), traffic)
+        threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        self.radard.config_file = 'radarscope.conf'
+        self.radard.configure()
+        self.radard.logger.disabled = True
+        self.addCleanup(setattr, self.radard.logger, 'disabled', False)
+        self.radard.feed_urls = ('http://localhost:{}/data/aircraft.json'.format(server.server_address[1]),
+                                 'http://localhost:1/data/aircraft.json')
+
+        snapshot = self.radard.fetch_snapshot()
+        self.assertEqual(len(snapshot.aircraft), 9 + 50)
+        self.assertTrue(self.radard.feeds[2].failed)
+        feeds = self.radard.metrics.summary()['feeds']
+        self.assertEqual(sorted(feeds), ['localhost:1', 'localhost:10080', 'localhost:{}'.format(
+            server.server_address[1])])
+        self.assertEqual(feeds['localhost:1']['errors'], 1)
+        self.assertEqual(feeds['localhost:10080']['count'], 1)
+        self.assertIn('radarscope_feed_errors_total{feed="localhost:1"} 1', self.radard.metrics.prometheus())
+        self.radard.stop_threads()
+
+    def test_get_aircraft_concurrent(self):
+        document = b'{"now": 1, "aircraft": [{"hex": "abcdef"}]}'
+        response_headers = http.client.HTTPMessage()
+
+        def fetch(url, headers=None):
+            time.sleep(0.2)
+            return 200, response_headers, document.replace(b'abcdef', url[-6:].encode('ascii'))
+
+        self.radard.fetch = fetch
+        self.radard.aircrafturl = 'http://one/aircraft.json?111111'
+        self.radard.feed_urls = ('http://two/aircraft.json?222222', 'http://three/aircraft.json?333333')
+        started = time.monotonic()
+        aircraft = self.radard.get_aircraft()
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(sorted(plane['hex'] for plane in aircraft), ['111111', '222222', '333333'])
+        self.radard.stop_threads()
+
+    def test_get_aircraft_not_modified(self):
+        response_headers = http.client.HTTPMessage()
+        responses = {
+            'http://one/aircraft.json': [
+                (200, response_headers, b'{"now": 1000.0, "aircraft": [{"hex": "abcdef", "lat": 53.0, "lon": -6.0, '
+                                        b'"seen_pos": 0.5}]}'),
+                (304, response_headers, b'')],
+            'http://two/aircraft.json': [
+                (200, response_headers, b'{"now": 1000.0, "aircraft": [{"hex": "abcdef", "lat": 54.0, "lon": -7.0, '
+                                        b'"seen_pos": 2.0}]}'),
+                (200, response_headers, b'{"now": 1010.0, "aircraft": [{"hex": "abcdef", "lat": 54.1, "lon": -7.1, '
+                                        b'"seen_pos": 3.0}]}')]
+        }
+
+        self.radard.fetch = lambda url, headers=None: responses[url].pop(0)
+        self.radard.aircrafturl = 'http://one/aircraft.json'
+        self.radard.feed_urls = ('http://two/aircraft.json',)
+        self.assertEqual([plane['lat'] for plane in self.radard.get_aircraft()], [53.0])
+
+        # the position reported 3 s ago by two is fresher than the one reported 0.5 s before the unchanged document
+        self.assertEqual([plane['lat'] for plane in self.radard.get_aircraft()], [54.1])
+        self.assertEqual(self.radard.feeds[0].time, 1000.0)
+        self.radard.stop_threads()
+
     def test_get_receiver_origin(self):
         self.radard.config_file = 'radarscope.conf'
         self.radard.configure()
@@ -95,6 +202,152 @@ class RadarScopeTestCase(unittest.TestCase):
         self.assertEqual(rcvr[0], 53.34)
         self.assertEqual(rcvr[1], -6.22)
 
+    def test_get_origin(self):
+        self.radard.config_file = 'radarscope.conf'
+        self.radard.configure()
+
+        self.assertEqual(self.radard.get_origin(), (53.34, -6.22))
+        cache = self.radard.origin_cache
+        self.assertEqual(self.radard.get_origin(), (53.34, -6.22))
+        self.assertIs(self.radard.origin_cache, cache)
+
+        # receiver.json is decoded with the configured decoder
+        self.assertIs(cache.decoder, self.radard.decoder)
+        self.radard.apply_config({'json_decoder': 'json'})
+        self.radard.get_origin()
+        self.assertIs(cache.decoder, self.radard.decoder)
+        self.assertEqual(cache.decoder.backend, 'json')
+
+    def test_parse_positions(self):
+        aircraft = [
+            {'hex': 'a', 'lat': 53.1, 'lon': -6.1, 'alt_baro': 1000, 'alt_geom': 1100, 'altitude': 1200},
+            {'hex': 'b', 'lat': 53.2, 'lon': -6.2, 'alt_geom': 2100, 'altitude': 2200},
+            {'hex': 'c', 'lat': 53.3, 'lon': -6.3, 'altitude': 3200},
+            {'hex': 'd', 'lat': 53.4, 'lon': -6.4},
+            {'hex': 'e', 'altitude': 5200},
+        ]
+
+        positions = self.radard.parse_positions(aircraft)
+        self.assertEqual(positions, [[53.1, -6.1, 1000], [53.2, -6.2, 2100], [53.3, -6.3, 3200], [53.4, -6.4, None]])
+
+    def test_fetch_snapshot(self):
+        self.radard.config_file = 'radarscope.conf'
+        self.radard.configure()
+
+        snapshot = self.radard.fetch_snapshot()
+        self.assertEqual(len(snapshot.aircraft), 9)
+        self.assertEqual(snapshot.origin, (53.34, -6.22))
+
+        # aircraft.json hasn't changed
+        self.assertIsNone(self.radard.fetch_snapshot())
+
+    def test_update_render(self):
+        self.radard.config_file = 'radarscope.conf'
+        self.radard.configure()
+        self.radard.framebuffer = radarscoped.FrameBuffer(RecordingDisplay(), (16, 16))
+
+        self.radard.render()
+        self.assertEqual(self.radard.framebuffer.shows, 0)
+
+        self.radard.update(self.radard.fetch_snapshot())
+        self.radard.render()
+        self.assertEqual(self.radard.aircraft_in_range, 7)
+        self.assertEqual(self.radard.framebuffer.shows, 1)
+
+    def test_plot_background(self):
+        self.radard.framebuffer = radarscoped.FrameBuffer(RecordingDisplay(), (16, 16))
+        self.radard.add_airport('EIDW', 53.42, -6.27)
+        plotted = list()
+        plot_airports = self.radard.plot_airports
+        self.radard.plot_airports = lambda *args: plotted.append(args) or plot_airports(*args)
+
+        self.radard.plot([[53.5, -5, 20000]], 72, (53.34, -6.22))
+        self.radard.plot([[53.5, -4.9, 21000]], 72, (53.34, -6.22))
+        self.assertEqual(len(plotted), 1)
+
+        framebuffer = self.radard.framebuffer
+        airport = self.radard.get_projection(72, (53.34, -6.22)).project(53.42, -6.27)
+        self.assertEqual(framebuffer.get_pixel(*self.radard.pixel_origin()), (255, 255, 255))
+        self.assertEqual(framebuffer.get_pixel(*airport), (12, 12, 12))
+        self.assertEqual(framebuffer.display.shows, 2)
+
+        self.radard.plot([], 60, (53.34, -6.22))
+        self.assertEqual(len(plotted), 2)
+
+        self.radard.add_airport('EICK', 51.84, -8.49)
+        self.radard.plot([], 60, (53.34, -6.22))
+        self.assertEqual(len(plotted), 3)
+
+    def test_render_range_filter(self):
+        self.radard.framebuffer = radarscoped.FrameBuffer(RecordingDisplay(), (16, 16))
+        self.radard.scope_radius = 60
+        self.radard.update(radarscoped.Snapshot([
+            {'hex': 'a', 'lat': 53.3, 'lon': -6.2, 'altitude': 1000},
+            {'hex': 'b', 'lat': 54.2, 'lon': -4.6, 'altitude': 2000},
+            {'hex': 'c', 'lat': 48.9, 'lon': 2.4, 'altitude': 3000},
+        ], (53.34, -6.22)))
+
+        self.radard.render()
+        self.assertEqual(self.radard.aircraft_in_range, 2)
+
+        self.radard.circular = True
+        self.radard.render()
+        self.assertEqual(self.radard.aircraft_in_range, 1)
+
+        self.radard.range_filter = False
+        self.radard.render()
+        self.assertEqual(self.radard.aircraft_in_range, 3)
+
+        aircraft, distance = self.radard.closest_aircraft()
+        self.assertEqual(aircraft.hex, 'a')
+        self.assertLess(distance, 3)
+
+    def test_render_no_origin(self):
+        display = radarscoped.MemoryDisplay((16, 16))
+        self.radard.set_display(display)
+        self.radard.update(radarscoped.Snapshot([{'hex': 'a', 'lat': 53.3, 'lon': -6.2, 'altitude': 1000}],
+                                                (None, None)))
+
+        # receiver.json has never been fetched: only the receiver is drawn
+        self.radard.render()
+        self.assertEqual(self.radard.aircraft_in_range, 0)
+        self.assertEqual(display.shows, 1)
+        lit = [(x, y) for x in range(16) for y in range(16) if display.get_pixel(x, y) != (0, 0, 0)]
+        self.assertEqual(lit, [self.radard.pixel_origin()])
+
+    def test_render_trails(self):
+        self.radard.framebuffer = radarscoped.FrameBuffer(RecordingDisplay(), (16, 16))
+        self.radard.scope_radius = 60
+        self.radard.apply_config({'trail_length': 3})
+        for t in range(5):
+            self.radard.update(radarscoped.Snapshot([
+                {'hex': 'a', 'lat': 53.34, 'lon': -6.22 + t * 0.25, 'alt_baro': 10000},
+                {'hex': 'b', 'lat': 57.0, 'lon': -6.22 + t * 0.25, 'alt_baro': 10000},
+            ], (53.34, -6.22), timestamp=time.monotonic()))
+        self.radard.render()
+
+        colour = self.radard.get_altitude_colour(10000)
+        x_origin, y_origin = self.radard.pixel_origin()
+        lit = [(x, self.radard.framebuffer.get_pixel(x, y_origin)) for x in range(x_origin + 1, 16)]
+        lit = [(x, pixel) for x, pixel in lit if any(pixel)]
+        # the aircraft, and the two positions before it fading away
+        self.assertEqual(lit[-1][1], colour)
+        self.assertEqual(len(lit), 3)
+        self.assertEqual([x for x, _ in lit], sorted(x for x, _ in lit))
+        self.assertGreater(lit[1][1][0] + lit[1][1][1] + lit[1][1][2], lit[0][1][0] + lit[0][1][1] + lit[0][1][2])
+        self.assertLess(sum(lit[1][1]), sum(colour))
+
+    def test_latest_snapshot(self):
+        self.assertIsNone(self.radard.latest_snapshot())
+
+        first = radarscoped.Snapshot([], (53.34, -6.22))
+        second = radarscoped.Snapshot([], (53.34, -6.22))
+        self.radard.snapshots.put(first)
+        self.radard.snapshots.put(second)
+
+        self.assertIs(self.radard.latest_snapshot(), second)
+        self.assertIs(self.radard.latest_snapshot(second), second)
+
     def test_setup_server_socket(self):
         self.assertIsNone(self.radard.socket)
 
@@ -108,6 +361,275 @@ class RadarScopeTestCase(unittest.TestCase):
         sock.close()
         self.assertEqual(result, 0)
 
+    def control_session(self, *lines, clients=1):
+        """
+        Send lines to the control socket from a number of clients, serving them until they all get a response to
+        each line.
+        """
+
+        socks = [socket.create_connection(self.radard.sockaddr, timeout=2) for _ in range(clients)]
+        for sock in socks:
+            sock.sendall(b''.join(line + b'\n' for line in lines))
+            sock.shutdown(socket.SHUT_WR)
+
+        responses = [b''] * clients
+        deadline = time.monotonic() + 2
+        while any(response.count(b'\n') < len(lines) for response in responses) and time.monotonic() < deadline:
+            self.radard.service_control(0.01)
+            for i, sock in enumerate(socks):
+                sock.setblocking(False)
+                try:
+                    responses[i] += sock.recv(65536)
+                except BlockingIOError:
+                    pass
+
+        for sock in socks:
+            sock.close()
+        return [[json.loads(line) for line in response.splitlines()] for response in responses]
+
+    def test_stats_command(self):
+        self.radard.setup_server_socket()
+        self.addCleanup(self.radard.destroy_server_socket)
+        self.radard.framebuffer = radarscoped.FrameBuffer(RecordingDisplay(), (16, 16))
+        self.radard.update(radarscoped.Snapshot([{'hex': 'a', 'lat': 53.3, 'lon': -6.2, 'altitude': 1000}],
+                                                (53.34, -6.22)))
+        self.radard.render()
+        self.radard.metrics.frame()
+
+        # the gauges are kept up to date for /metrics, without the stats command
+        changed = self.radard.framebuffer.changed_pixels
+        self.assertGreater(changed, 0)
+        self.assertIn('radarscope_changed_pixels {}\n'.format(changed), self.radard.metrics.prometheus())
+
+        [[response]] = self.control_session(b'stats')
+        stats = response['stats']
+        for stage in ('filter', 'project', 'colour', 'draw', 'show'):
+            self.assertEqual(stats['stages'][stage]['count'], 1)
+        self.assertEqual(stats['gauges']['aircraft_in_range'], 1)
+        self.assertEqual(stats['frame_rate'], 0)
+        self.assertEqual(stats['counters']['frames_shown'], 1)
+        self.assertNotIn('frames_skipped', stats['counters'])
+
+        # an unchanged frame isn't sent to the display again, and is counted as skipped
+        self.radard.render()
+        [[response]] = self.control_session(b'stats')
+        counters = response['stats']['counters']
+        self.assertEqual((counters['frames_shown'], counters['frames_skipped']),
+                         (self.radard.framebuffer.shows, self.radard.framebuffer.skipped_shows))
+        self.assertEqual(self.radard.framebuffer.skipped_shows, 1)
+        self.assertIn('radarscope_frames_skipped_total 1\n', self.radard.metrics.prometheus())
+
+    def test_control_protocol(self):
+        self.radard.setup_server_socket()
+        self.addCleanup(self.radard.destroy_server_socket)
+        self.radard.framebuffer = radarscoped.FrameBuffer(RecordingDisplay(), (16, 16))
+        self.radard.update(radarscoped.Snapshot([{'hex': 'a', 'lat': 53.3, 'lon': -6.2, 'altitude': 1000}],
+                                                (53.34, -6.22)))
+        self.radard.render()
+
+        responses = self.control_session(
+            b'{"command": "set", "radius": 40, "brightness": 0.25, "rotation": 90}',
+            b'set radius 30',
+            b'{"command": "set", "radius": -5, "brightness": 0.5}',
+            b'{"command": "snapshot"}',
+            b'launch',
+            b'{"radius": 10}',
+            b'{not json',
+            b'set colour 3',
+            clients=3
+        )
+
+        for response in responses:
+            self.assertEqual([r['ok'] for r in response], [True, True, False, True, False, False, False, False])
+            self.assertEqual(response[4]['error'], 'unknown command launch')
+            self.assertEqual(response[7]['error'], 'unknown setting colour')
+
+            snapshot = response[3]['snapshot']
+            self.assertEqual(snapshot['radius'], 30)
+            self.assertEqual(snapshot['aircraft'][0]['hex'], 'a')
+            self.assertEqual(len(bytes.fromhex(snapshot['frame'])), 16 * 16 * 3)
+
+        self.assertEqual((self.radard.scope_radius, self.radard.scope_brightness, self.radard.scope_rotation),
+                         (30, 0.25, 90))
+        self.assertFalse(self.radard.framebuffer.valid)
+        self.assertEqual(self.radard.clients, [])
+
+    def test_control_too_many_clients(self):
+        self.radard.setup_server_socket()
+        self.addCleanup(self.radard.destroy_server_socket)
+        self.radard.max_clients = 0
+
+        [[response]] = self.control_session(b'stats')
+        self.assertEqual(response, {'ok': False, 'error': 'too many clients'})
+
+    def test_control_late_frames(self):
+        self.radard.setup_server_socket()
+        self.addCleanup(self.radard.destroy_server_socket)
+        self.radard.frame_rate = 10
+
+        sock = socket.create_connection(self.radard.sockaddr, timeout=2)
+        self.addCleanup(sock.close)
+        sock.sendall(b'stats\n')
+
+        # every frame takes longer than 1 / frame_rate, and the control socket is still served in between
+        next_frame = time.monotonic()
+        for _ in range(3):
+            time.sleep(0.15)
+            next_frame = self.radard.wait_for_frame(next_frame)
+        self.assertLessEqual(next_frame, time.monotonic())
+        self.assertEqual(len(self.radard.clients), 1)
+        self.assertTrue(json.loads(sock.recv(65536))['ok'])
+
+    def test_control_closing_client(self):
+        self.radard.setup_server_socket()
+        self.addCleanup(self.radard.destroy_server_socket)
+
+        # a client which has sent EOF, and doesn't read the responses filling its socket buffer
+        conn, peer = socket.socketpair()
+        self.addCleanup(peer.close)
+        client = radarscoped.ControlClient(conn)
+        client.output += b'x' * (8 << 20)
+        client.closing = True
+        peer.shutdown(socket.SHUT_WR)
+        self.radard.clients.append(client)
+        self.radard.service_control(0)
+
+        # the client is waited on until it can take more, rather than waking the loop up over and over
+        started = time.monotonic()
+        self.radard.service_control(0.2)
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+        self.assertEqual(self.radard.clients, [client])
+
+        peer.close()
+        self.radard.service_control(0.2)
+        self.assertEqual(self.radard.clients, [])
+
+    def write_config(self, path, **replacements):
+        with open('radarscope.conf') as file:
+            config = file.read()
+        for option, value in replacements.items():
+            config = re.sub(r'(?m)^{} = .*$'.format(option), '{} = {}'.format(option, value), config)
+        with open(path, 'w') as file:
+            file.write(config)
+
+    def test_parse_config(self):
+        configuration, settings = self.radard.parse_config('radarscope.conf')
+        self.assertEqual(self.radard.scope_radius, 60)
+        self.assertEqual(settings['scope_radius'], 72)
+        self.assertEqual(settings['http'], (2.0, 5.0, 2, 0.5))
+        self.assertEqual(settings['airports'][0], ('eidw', 53.45, -6.27))
+        self.assertEqual(configuration.get('ADSB', 'source'), 'json')
+
+    def test_parse_config_trail_length(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'radarscope.conf')
+        self.write_config(path, trail_length=-5)
+
+        with self.assertLogs(self.radard.logger, 'ERROR'):
+            configuration, settings = self.radard.parse_config(path)
+        self.assertEqual(settings['trail_length'], 0)
+
+    def test_parse_config_frame_rate(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'radarscope.conf')
+        self.write_config(path, frame_rate=0)
+
+        with self.assertLogs(self.radard.logger, 'ERROR'):
+            configuration, settings = self.radard.parse_config(path)
+        self.assertEqual(settings['frame_rate'], 1.0)
+
+    def test_reload_config(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.radard.config_file = os.path.join(directory.name, 'radarscope.conf')
+        self.write_config(self.radard.config_file)
+        self.radard.configure()
+
+        http, decoder, projection = self.radard.http, self.radard.decoder, self.radard.get_projection(72, (53, -6))
+        self.radard.scope_radius = 10
+        self.assertEqual(self.radard.reload_config(), {'scope_radius'})
+        self.assertEqual(self.radard.scope_radius, 72)
+        self.assertEqual(len(self.radard.airports), 4)
+
+        self.write_config(self.radard.config_file, palette='colourblind', read_timeout=9, EGNS='54.1,-4.6')
+        self.assertEqual(self.radard.reload_config(), {'palette', 'http', 'airports'})
+        self.assertEqual(self.radard.colour_map.palette, radarscoped.PALETTES['colourblind'])
+        self.assertIsNot(self.radard.http, http)
+        self.assertTrue(http.closed)
+        self.assertFalse(self.radard.http.closed)
+        self.assertEqual(self.radard.http.read_timeout, 9)
+        self.assertIs(self.radard.decoder, decoder)
+        self.assertIs(self.radard.get_projection(72, (53, -6)), projection)
+        self.assertEqual(self.radard.airports[3], {'icao_code': 'egns', 'lat': 54.1, 'lon': -4.6})
+
+        # a broken file leaves the configuration as it is
+        self.write_config(self.radard.config_file, radius='seventy')
+        with self.assertRaises(ValueError):
+            self.radard.reload_config()
+        self.assertEqual(self.radard.scope_radius, 72)
+
+    def test_reload_running(self):
+        self.radard.config_file = 'radarscope.conf'
+        self.radard.configure()
+        self.radard.fetcher = radarscoped.AircraftFetcher(self.radard.fetch_snapshot, self.radard.snapshots,
+                                                          scheduler=radarscoped.PollScheduler(1.0, 10.0))
+        self.radard.framebuffer = radarscoped.FrameBuffer(RecordingDisplay(), (16, 16))
+        self.radard.framebuffer.show()
+
+        changed = self.radard.apply_config({'scope_brightness': 0.8, 'max_poll_interval': 30.0, 'scope_radius': 72})
+        self.assertEqual(changed, {'scope_brightness', 'max_poll_interval'})
+        self.assertFalse(self.radard.framebuffer.valid)
+        self.assertEqual(self.radard.fetcher.scheduler.max_interval, 30)
+
+    def test_reload_display(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.radard.config_file = os.path.join(directory.name, 'radarscope.conf')
+        self.write_config(self.radard.config_file, display='memory')
+        self.radard.configure()
+        self.assertIsInstance(self.radard.display, radarscoped.MemoryDisplay)
+
+        self.radard.origin = (53.34, -6.22)
+        self.radard.render()
+        self.assertEqual(self.radard.display.get_pixel(*self.radard.pixel_origin()), (255, 255, 255))
+
+        self.write_config(self.radard.config_file, display='lcd')
+        self.assertEqual(self.radard.reload_config(), {'display'})
+        self.assertIs(self.radard.display, radarscoped.uh)
+
+    def test_reload_extrapolation(self):
+        self.radard.apply_config({'extrapolation': True})
+        self.radard.registry.merge([{'hex': 'a', 'lat': 53, 'lon': -6, 'altitude': 1000, 'track': 0, 'speed': 360}],
+                                   timestamp=100)
+        self.radard.registry.positions(now=130)
+        position = self.radard.registry.aircraft['a'].position
+        self.assertAlmostEqual(position[0], 53.05)
+
+        # switching the extrapolation off puts the aircraft back where they were reported
+        self.assertEqual(self.radard.apply_config({'extrapolation': False}), {'extrapolation'})
+        self.assertEqual(position, [53, -6, 1000])
+
+    def test_watch_config(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.radard.config_file = os.path.join(directory.name, 'radarscope.conf')
+        self.write_config(self.radard.config_file, watch_config='yes')
+        self.radard.configure()
+        self.radard.config_mtime = self.radard.get_config_mtime()
+
+        self.assertFalse(self.radard.config_file_changed(now=100))
+        os.utime(self.radard.config_file, ns=(0, self.radard.config_mtime + 10 ** 9))
+        # checked at most once a second
+        self.assertFalse(self.radard.config_file_changed(now=100.5))
+        self.assertTrue(self.radard.config_file_changed(now=101))
+        self.assertFalse(self.radard.config_file_changed(now=102))
+
+    def test_sighup(self):
+        self.radard.sighup_handler(signal.SIGHUP, None)
+        self.assertTrue(self.radard.reload_requested)
+
     def test_destroy_server_socket(self):
         self.radard.setup_server_socket()
         self.assertEqual(self.radard.socket.family, socket.AF_INET)
@@ -164,6 +686,102 @@ class RadarScopeTestCase(unittest.TestCase):
             pixel = self.radard.pixel_pos(72, origin, position[0])
             self.assertEqual(pixel, position[1])
 
+    def test_get_projection(self):
+        projection = self.radard.get_projection(72, (53, -6))
+        self.assertIs(self.radard.get_projection(72, (53, -6)), projection)
+        self.assertIsNot(self.radard.get_projection(60, (53, -6)), projection)
+
+        span = self.radard.coord_span(72, (53, -6))
+        self.assertEqual(projection.deg_per_px_lat, span["lat"]["delta"] / self.radard.pixel_radius())
+        self.assertEqual(projection.deg_per_px_lon, span["lon"]["delta"] / self.radard.pixel_radius())
+
+    def test_projection(self):
+        projection = radarscoped.Projection(72, (-33.9, 151.2), (16, 16))
+
+        positions = [
+            ((-31.9, 151.2), (8, 15)),
+            ((-36.9, 151.2), (8, 0)),
+            ((-33.9, 149.2), (0, 8)),
+            ((-33.9, 152.2), (13, 8)),
+            ((-33.9, 151.2), (8, 8)),
+        ]
+
+        for position in positions:
+            self.assertEqual(projection.project(*position[0]), position[1])
+
+        self.assertEqual(projection.project_many([p[0] for p in positions]), [p[1] for p in positions])
+
+    def test_projection_immutable(self):
+        projection = radarscoped.Projection(72, (53, -6), (16, 16))
+
+        with self.assertRaises(AttributeError):
+            projection.radius = 60
+
+    def random_positions(self, count, origin=(53.34, -6.22)):
+        generator = random.Random(count)
+        altitudes = [None, 'ground', -50, 0, 40000, 45000, 11250, 11263, 3.5]
+        positions = [[53.34, -6.22, 8000], [53.34, -6.22, 30000]]
+        while len(positions) < count:
+            lat = origin[0] + generator.uniform(-2.5, 2.5)
+            lon = origin[1] + generator.uniform(-4, 4)
+            if generator.random() < 0.2:
+                alt = generator.choice(altitudes)
+            else:
+                alt = generator.randrange(0, 45000, 25)
+            positions.append([lat, lon, alt])
+        return positions
+
+    def test_render_aircraft_python(self):
+        projection = self.radard.get_projection(72, (53, -6))
+        positions = [[53, -6, 30000], [54, -7, None], [53, -6, 1000], [53.5, -5, 20000]]
+
+        pixels = self.radard.render_aircraft_python(positions, projection)
+        self.assertEqual(pixels, [
+            (3, 14, 64, 64, 64),
+            (8, 8) + self.radard.get_altitude_colour(1000, highlight=True),
+            (12, 11) + self.radard.get_altitude_colour(20000),
+        ])
+
+    def test_render_aircraft_collisions(self):
+        projection = self.radard.get_projection(72, (53, -6))
+        positions = [[53.5, -5, 20000], [53.5, -5, None], [53.5, -5, 5000], [53.5, -5, 12000], [54, -7, None],
+                     [54, -7, 'ground']]
+
+        pixels = self.radard.render_aircraft_python(positions, projection)
+        self.assertEqual(pixels, [
+            (3, 14, 64, 64, 64),
+            (12, 11) + self.radard.get_altitude_colour(5000, highlight=True),
+        ])
+
+    def test_plot_aircraft_once(self):
+        # the frame buffer is written to directly, so record the calls to it
+        self.radard.framebuffer = RecordingDisplay()
+        self.radard.plot_aircraft(self.random_positions(500), (53.34, -6.22), 72)
+
+        pixels = [pixel[:2] for pixel in self.radard.framebuffer.pixels]
+        self.assertGreater(len(pixels), 100)
+        self.assertEqual(len(pixels), len(set(pixels)))
+
+    @unittest.skipIf(radarscoped.np is None, 'NumPy not installed')
+    def test_render_aircraft_numpy(self):
+        for origin in [(53.34, -6.22), (-33.9, 151.2)]:
+            projection = self.radard.get_projection(72, origin)
+            positions = self.random_positions(500, origin)
+
+            self.assertEqual(self.radard.render_aircraft_numpy(positions, projection),
+                             self.radard.render_aircraft_python(positions, projection))
+
+    def test_render_aircraft_fallback(self):
+        projection = self.radard.get_projection(72, (53.34, -6.22))
+        positions = self.random_positions(100)
+        expected = self.radard.render_aircraft_python(positions, projection)
+
+        self.radard.vectorize = False
+        self.assertEqual(self.radard.render_aircraft(positions, projection), expected)
+
+        self.radard.vectorize = True
+        self.assertEqual(self.radard.render_aircraft(positions, projection), expected)
+
     def test_normalise(self):
         normalise = self.radard.normalise
         n = normalise(22500, min_value=0, max_value=45000, bottom=0.0, top=1.0)
@@ -203,6 +821,1148 @@ class RadarScopeTestCase(unittest.TestCase):
         a = self.radard.get_altitude_colour('invalid')
         self.assertEqual(a, (64, 64, 64))
 
+    def test_altitude_colour_map(self):
+        colour_map = radarscoped.AltitudeColourMap()
+        normalise = self.radard.normalise
+        hsv2rgb = self.radard.hsv2rgb
+
+        for altitude in range(0, 45001):
+            hue = normalise(altitude, min_value=0, max_value=40000, bottom=0.0, top=0.85)
+            self.assertEqual(colour_map.lookup(altitude), hsv2rgb(hue, 1, 0.66))
+            self.assertEqual(colour_map.lookup(altitude, highlight=True), hsv2rgb(hue, 0.50, 1))
+
+    def test_palettes(self):
+        for name, palette in radarscoped.PALETTES.items():
+            colour_map = radarscoped.AltitudeColourMap(palette)
+            for colour in colour_map.normal + colour_map.highlighted:
+                self.assertEqual(len(colour), 3)
+                for component in colour:
+                    self.assertIsInstance(component, int)
+                    self.assertTrue(0 <= component <= 255, name)
+
+    def test_get_colour_map(self):
+        colour_map = self.radard.get_colour_map()
+        self.assertIs(self.radard.get_colour_map(), colour_map)
+
+        self.radard.palette = 'colourblind'
+        self.assertIsNot(self.radard.get_colour_map(), colour_map)
+        self.assertEqual(self.radard.get_altitude_colour(0), (68, 1, 84))
+        self.assertEqual(self.radard.get_altitude_colour(40000), (253, 231, 37))
+
+
+class RecordingDisplay(object):
+    """
+    A display recording all calls made to it, in place of the unicornhathd module.
+    """
+
+    def __init__(self):
+        self.pixels = list()
+        self.shows = 0
+        self.clears = 0
+
+    def clear(self):
+        self.clears += 1
+
+    def set_pixel(self, x, y, r, g, b):
+        self.pixels.append((x, y, r, g, b))
+
+    def show(self):
+        self.shows += 1
+
+
+class AircraftFetcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshots = queue.Queue(maxsize=2)
+        self.count = 0
+        self.fetched = threading.Event()
+
+    def fetch(self):
+        self.count += 1
+        if self.count == 3:
+            raise ValueError('invalid response')
+        if self.count == 5:
+            self.fetched.set()
+        return radarscoped.Snapshot([{'hex': 'a', 'altitude': self.count}], (53.34, -6.22))
+
+    def test_fetcher(self):
+        fetcher = radarscoped.AircraftFetcher(self.fetch, self.snapshots, interval=0.01)
+        fetcher.logger.disabled = True
+        fetcher.start()
+        self.assertTrue(self.fetched.wait(2))
+        fetcher.stop()
+        fetcher.join(2)
+        fetcher.logger.disabled = False
+
+        self.assertFalse(fetcher.is_alive())
+        latest = [self.snapshots.get_nowait().aircraft[0]['altitude'] for _ in range(self.snapshots.qsize())]
+        self.assertEqual(latest[-1], self.count)
+        self.assertLessEqual(len(latest), 2)
+
+    def test_put_full_queue(self):
+        fetcher = radarscoped.AircraftFetcher(self.fetch, self.snapshots)
+        for altitude in range(4):
+            fetcher.put(radarscoped.Snapshot([{'hex': 'a', 'altitude': altitude}], (53.34, -6.22)))
+
+        self.assertEqual([self.snapshots.get_nowait().aircraft[0]['altitude'] for _ in range(2)], [2, 3])
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = radarscoped.Metrics(window=100)
+
+    def test_percentiles(self):
+        for duration in range(1, 201):
+            self.metrics.record('fetch', duration / 1000)
+
+        fetch = self.metrics.summary()['stages']['fetch']
+        self.assertEqual(fetch['count'], 200)
+        self.assertAlmostEqual(fetch['sum'], 20.1)
+        # only the last 100 samples count
+        self.assertEqual((fetch['p50'], fetch['p95'], fetch['p99']), (0.15, 0.195, 0.199))
+
+        self.assertIsNone(self.metrics.summary()['stages']['show']['p50'])
+
+    def test_timer(self):
+        with self.assertRaises(ValueError):
+            with self.metrics.timer('decode'):
+                raise ValueError()
+        self.assertEqual(self.metrics.summary()['stages']['decode']['count'], 1)
+
+    def test_frame_rate(self):
+        self.assertEqual(self.metrics.frame_rate(), 0)
+        for frame in range(11):
+            self.metrics.frame(100 + frame * 0.2)
+        self.assertAlmostEqual(self.metrics.frame_rate(), 5)
+
+    def test_prometheus(self):
+        self.metrics.record('fetch', 0.25)
+        self.metrics.count('fetch_errors', 3)
+        self.metrics.set('aircraft_in_range', 7)
+
+        text = self.metrics.prometheus()
+        self.assertIn('radarscope_stage_seconds{stage="fetch",quantile="0.99"} 0.25\n', text)
+        self.assertIn('radarscope_stage_seconds_count{stage="fetch"} 1\n', text)
+        self.assertIn('radarscope_stage_seconds{stage="show",quantile="0.5"} NaN\n', text)
+        self.assertIn('radarscope_fetch_errors_total 3\n', text)
+        self.assertIn('radarscope_aircraft_in_range 7\n', text)
+        self.assertIn('radarscope_frame_rate 0.0\n', text)
+
+    def test_server(self):
+        self.metrics.count('fetch_errors')
+        server = radarscoped.MetricsServer(('localhost', 0), self.metrics)
+        server.start()
+        self.addCleanup(server.stop)
+
+        connection = http.client.HTTPConnection('localhost', server.server_address[1], timeout=2)
+        connection.request('GET', '/metrics')
+        response = connection.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertIn(b'radarscope_fetch_errors_total 1\n', response.read())
+
+        connection.request('GET', '/')
+        response = connection.getresponse()
+        response.read()
+        self.assertEqual(response.status, 404)
+        connection.close()
+
+
+class PollSchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.in_range = 5
+        self.scheduler = radarscoped.PollScheduler(1.0, 10.0, traffic=lambda snapshot: self.in_range)
+
+    def test_back_off(self):
+        intervals = [self.scheduler.next_interval(False) for _ in range(5)]
+        self.assertEqual(intervals, [2, 4, 8, 10, 10])
+
+        self.assertEqual(self.scheduler.next_interval(True), 1)
+
+    def test_no_traffic(self):
+        self.in_range = 0
+        self.assertEqual(self.scheduler.next_interval(True), 2)
+        self.assertEqual(self.scheduler.next_interval(True), 4)
+
+        self.in_range = 1
+        self.assertEqual(self.scheduler.next_interval(True), 1)
+
+    def test_cpu_budget(self):
+        self.scheduler.cpu_budget = 0.1
+        self.assertEqual(self.scheduler.next_interval(True, cpu_time=0.05), 1)
+        self.assertAlmostEqual(self.scheduler.next_interval(True, cpu_time=0.3), 3)
+        self.assertEqual(self.scheduler.next_interval(True, cpu_time=5), 10)
+
+    def test_fixed(self):
+        scheduler = radarscoped.PollScheduler(1.0, 0.5)
+        self.assertEqual(scheduler.next_interval(False), 1)
+
+    def test_snapshot_traffic(self):
+        radard = radarscoped.RadarDaemon('/tmp/test_radard.pid')
+        radard.scope_radius = 60
+        scheduler = radarscoped.PollScheduler(1.0, 10.0, traffic=radard.snapshot_traffic)
+        self.assertEqual(scheduler.next_interval(False), 2)
+        self.assertEqual(scheduler.next_interval(True, snapshot=radarscoped.Snapshot([], (53.34, -6.22))), 4)
+
+        # the aircraft back in range speed polling up straight away, before the snapshot is even rendered
+        snapshot = radarscoped.Snapshot([
+            {'hex': 'a', 'lat': 53.3, 'lon': -6.2, 'altitude': 1000},
+            {'hex': 'b', 'lat': 48.9, 'lon': 2.4, 'altitude': 3000},
+            {'hex': 'c', 'altitude': 3000},
+        ], (53.34, -6.22))
+        self.assertEqual(radard.snapshot_traffic(snapshot), 1)
+        self.assertEqual(scheduler.next_interval(True, snapshot=snapshot), 1)
+
+        radard.range_filter = False
+        self.assertEqual(radard.snapshot_traffic(snapshot), 2)
+        self.assertEqual(radard.snapshot_traffic(radarscoped.Snapshot(snapshot.aircraft, (None, None))), 2)
+
+    def test_fetcher(self):
+        # nothing ever changes, so the fetcher backs off from 10ms to 80ms
+        metrics = radarscoped.Metrics()
+        fetcher = radarscoped.AircraftFetcher(lambda: None, queue.Queue(), interval=0.01,
+                                              scheduler=radarscoped.PollScheduler(0.01, 0.08), metrics=metrics)
+        self.assertEqual(metrics.summary()['gauges']['poll_interval'], 0.01)
+        fetcher.start()
+        time.sleep(0.5)
+        fetcher.stop()
+        fetcher.join(2)
+
+        self.assertEqual(fetcher.interval, 0.08)
+        self.assertIn('radarscope_poll_interval 0.08\n', metrics.prometheus())
+        self.assertLess(fetcher.fetches, 12)
+
+
+class AircraftRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = radarscoped.AircraftRegistry(expiry=60)
+
+    def test_merge(self):
+        self.registry.merge([
+            {'hex': 'a', 'lat': 53.1, 'lon': -6.1, 'altitude': 1000, 'track': 90, 'speed': 300, 'vert_rate': 640,
+             'seen': 1, 'seen_pos': 1.5},
+            {'hex': 'b', 'lat': 53.2, 'lon': -6.2, 'alt_baro': 2000, 'alt_geom': 2100, 'track': 180, 'gs': 250.5,
+             'baro_rate': -320},
+            {'hex': 'c', 'altitude': 3000, 'seen': 5},
+            {'lat': 53.4, 'lon': -6.4},
+        ], timestamp=100)
+
+        self.assertEqual(len(self.registry), 3)
+        a = self.registry.aircraft['a']
+        self.assertEqual((a.lat, a.lon, a.altitude, a.track, a.speed, a.vert_rate), (53.1, -6.1, 1000, 90, 300, 640))
+        self.assertEqual((a.last_seen, a.last_pos), (99, 98.5))
+
+        b = self.registry.aircraft['b']
+        self.assertEqual((b.altitude, b.speed, b.vert_rate), (2000, 250.5, -320))
+
+        self.assertEqual([aircraft.hex for aircraft in self.registry.positioned()], ['a', 'b'])
+        self.assertEqual(self.registry.positions(), [[53.1, -6.1, 1000], [53.2, -6.2, 2000]])
+
+    def test_merge_in_place(self):
+        self.registry.merge([{'hex': 'a', 'lat': 53.1, 'lon': -6.1, 'altitude': 1000}], timestamp=100)
+        a = self.registry.aircraft['a']
+        position = a.position
+
+        self.registry.merge([{'hex': 'a', 'altitude': 1100}], timestamp=101)
+        self.assertIs(self.registry.aircraft['a'], a)
+        self.assertEqual(self.registry.positions(), [])
+
+        self.registry.merge([{'hex': 'a', 'lat': 53.2, 'lon': -6.2, 'altitude': 1200}], timestamp=102)
+        self.assertIs(self.registry.positions()[0], position)
+        self.assertEqual(position, [53.2, -6.2, 1200])
+
+    def test_expire(self):
+        self.registry.merge([{'hex': 'a', 'seen': 10}, {'hex': 'b'}], timestamp=100)
+
+        self.registry.expire(now=150)
+        self.assertEqual(sorted(self.registry.aircraft), ['a', 'b'])
+
+        self.registry.expire(now=151)
+        self.assertEqual(sorted(self.registry.aircraft), ['b'])
+
+    def test_dead_reckon(self):
+        # 360 kt due north for a minute is 6 NM, i.e. 0.1 degree of latitude
+        lat, lon = self.registry.dead_reckon(53, -6, 0, 360, 60)
+        self.assertAlmostEqual(lat, 53.1)
+        self.assertAlmostEqual(lon, -6)
+
+        # 6 NM due west at 60 degrees latitude is 0.2 degree of longitude
+        lat, lon = self.registry.dead_reckon(60, -6, 270, 360, 60)
+        self.assertAlmostEqual(lat, 60)
+        self.assertAlmostEqual(lon, -6.2)
+
+    def test_extrapolate(self):
+        self.registry.expiry = 2000
+        self.registry.merge([
+            {'hex': 'a', 'lat': 53, 'lon': -6, 'altitude': 10000, 'track': 0, 'speed': 360, 'vert_rate': 1000,
+             'seen_pos': 30},
+            {'hex': 'b', 'lat': 53, 'lon': -6, 'altitude': 10000},
+            {'hex': 'c', 'lat': 53, 'lon': -6, 'altitude': 'ground', 'track': 90, 'speed': 360, 'vert_rate': 1000,
+             'seen_pos': 1000},
+        ], timestamp=100)
+
+        extrapolated = self.registry.positions(now=130, max_extrapolation=60)
+        self.assertAlmostEqual(extrapolated[0][0], 53.1)
+        self.assertAlmostEqual(extrapolated[0][1], -6)
+        self.assertEqual(extrapolated[0][2], 11000)
+
+        self.assertEqual(extrapolated[1], [53, -6, 10000])
+
+        # stale positions are only extrapolated for max_extrapolation seconds
+        self.assertAlmostEqual(extrapolated[2][0], 53)
+        self.assertAlmostEqual(extrapolated[2][1], -6 + 6 / 60 / math.cos(math.radians(53)))
+        self.assertEqual(extrapolated[2][2], 'ground')
+
+        # extrapolation always starts from the reported position
+        self.assertAlmostEqual(self.registry.positions(now=100, max_extrapolation=60)[0][0], 53.05)
+
+    def test_range_filter(self):
+        self.registry.merge([
+            {'hex': 'a', 'lat': 53, 'lon': -6, 'altitude': 1000},
+            {'hex': 'b', 'lat': 53.9, 'lon': -5.1, 'altitude': 2000},
+            {'hex': 'c', 'lat': 51, 'lon': -6, 'altitude': 3000},
+            {'hex': 'd', 'lat': 53.02, 'lon': -4.99, 'altitude': 4000, 'track': 270, 'speed': 360},
+        ], timestamp=100)
+
+        bounds = (52, 54, -7, -5)
+        self.assertEqual(self.registry.positions(bounds=bounds), [[53, -6, 1000], [53.9, -5.1, 2000]])
+
+        # b is in the corner of the box, over 60 NM from the centre
+        self.assertEqual(self.registry.positions(bounds=bounds, centre=(53, -6), radius=60), [[53, -6, 1000]])
+
+        # d moves into the box from outside
+        positions = self.registry.positions(now=110, bounds=bounds)
+        self.assertEqual(sorted(position[2] for position in positions), [1000, 2000, 4000])
+
+    def test_index(self):
+        self.registry.merge([{'hex': 'a', 'lat': 53, 'lon': -6}, {'hex': 'b', 'lat': 51, 'lon': -6}], timestamp=100)
+        self.registry.merge([{'hex': 'a', 'lat': 51.1, 'lon': -6}, {'hex': 'b'}, {'hex': 'c', 'lat': 53, 'lon': -6,
+                                                                                 'seen': 10}], timestamp=110)
+        self.assertEqual(sorted(self.registry.index.cell_of), ['a', 'c'])
+
+        aircraft, distance = self.registry.nearest(51, -6)
+        self.assertEqual(aircraft.hex, 'a')
+        self.assertAlmostEqual(distance, 6, places=3)
+
+        self.registry.expire(now=161)
+        self.assertEqual(list(self.registry.index.cell_of), ['a'])
+        self.assertEqual(list(self.registry.positioned((52, 54, -7, -5))), [])
+
+    def test_trails(self):
+        self.registry.set_trail_length(4)
+        for t in range(6):
+            self.registry.merge([{'hex': 'a', 'lat': 53 + t / 10, 'lon': -6, 'alt_baro': 1000 * t},
+                                 {'hex': 'b', 'lat': 51, 'lon': -6, 'alt_baro': 'ground'}], timestamp=100 + t)
+        trail = self.registry.aircraft['a'].trail
+        self.assertEqual(len(trail), 4)
+        newest = [trail.head - 1 - age for age in range(4)]
+        self.assertEqual([round(trail.lat[i], 4) for i in newest], [53.5, 53.4, 53.3, 53.2])
+        self.assertEqual([trail.altitude[i] for i in newest], [5000, 4000, 3000, 2000])
+
+        # an aircraft which doesn't move adds nothing to its trail
+        trail = self.registry.aircraft['b'].trail
+        self.assertEqual((len(trail), trail.altitude[0]), (1, -1))
+        self.assertEqual(len(list(self.registry.trails((52, 54, -7, -5)))), 1)
+
+        # the trails of expired aircraft are reused
+        self.registry.expire(now=170)
+        self.assertEqual(len(self.registry.spare_trails), 2)
+        self.registry.merge([{'hex': 'c', 'lat': 53, 'lon': -6}], timestamp=171)
+        self.assertIs(self.registry.aircraft['c'].trail, trail)
+        self.assertEqual(len(trail), 1)
+
+        self.registry.set_trail_length(0)
+        self.registry.merge([{'hex': 'c', 'lat': 53.1, 'lon': -6}], timestamp=172)
+        self.assertIsNone(self.registry.aircraft['c'].trail)
+
+        # a negative length is taken as no trails
+        self.registry.set_trail_length(-3)
+        self.assertEqual(self.registry.trail_length, 0)
+        self.registry.merge([{'hex': 'c', 'lat': 53.2, 'lon': -6}], timestamp=173)
+        self.assertIsNone(self.registry.aircraft['c'].trail)
+        with self.assertRaises(ValueError):
+            radarscoped.Trail(-3)
+
+
+class GridIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.index = radarscoped.GridIndex(cell_size=0.5)
+        self.generator = random.Random(13)
+        self.items = dict()
+        for number in range(500):
+            item = radarscoped.Aircraft(str(number))
+            item.lat = 53 + self.generator.uniform(-5, 5)
+            item.lon = -6 + self.generator.uniform(-8, 8)
+            self.index.update(item.hex, item, item.lat, item.lon)
+            self.items[item.hex] = item
+
+    def test_update(self):
+        item = self.items['0']
+        self.index.update('0', item, 60.1, 10.1)
+        self.assertEqual(self.index.cell_of['0'], (120, 20))
+        self.assertIn('0', self.index.cells[(120, 20)])
+
+        self.index.discard('0')
+        self.index.discard('0')
+        self.assertNotIn((120, 20), self.index.cells)
+        self.assertEqual(len(self.index), 499)
+
+    def test_query(self):
+        for bounds in [(52, 54, -7, -5), (52.2, 52.3, -7.9, -7.8), (40, 60, -20, 10), (0, 1, 0, 1)]:
+            lat_min, lat_max, lon_min, lon_max = bounds
+            expected = sorted(item.hex for item in self.items.values()
+                              if lat_min <= item.lat <= lat_max and lon_min <= item.lon <= lon_max)
+            found = sorted(item.hex for item in self.index.query(*bounds)
+                           if lat_min <= item.lat <= lat_max and lon_min <= item.lon <= lon_max)
+            self.assertEqual(found, expected)
+
+    def test_nearest(self):
+        for _ in range(50):
+            lat = 53 + self.generator.uniform(-10, 10)
+            lon = -6 + self.generator.uniform(-15, 15)
+            expected = min(self.items.values(),
+                           key=lambda item: radarscoped.GridIndex.haversine(lat, lon, item.lat, item.lon))
+
+            item, distance = self.index.nearest(lat, lon)
+            self.assertIs(item, expected)
+            self.assertAlmostEqual(distance, radarscoped.GridIndex.haversine(lat, lon, item.lat, item.lon))
+
+        self.assertEqual(radarscoped.GridIndex().nearest(53, -6), (None, None))
+
+    def test_extent(self):
+        def extent():
+            return [min(row for row, _ in self.index.cells), max(row for row, _ in self.index.cells),
+                    min(col for _, col in self.index.cells), max(col for _, col in self.index.cells)]
+
+        self.assertEqual(self.index.extent, extent())
+
+        # the extent follows the items moved out to a far cell, and back again
+        item = self.items['0']
+        item.lat, item.lon = 70.1, 20.1
+        self.index.update('0', item, item.lat, item.lon)
+        self.assertEqual(self.index.extent, extent())
+        self.assertIs(self.index.nearest(70, 20)[0], item)
+        item.lat, item.lon = 53, -6
+        self.index.update('0', item, item.lat, item.lon)
+        self.assertEqual(self.index.extent, extent())
+
+        for key in sorted(self.items, key=lambda key: self.items[key].lat)[:400]:
+            self.index.discard(key)
+            self.assertEqual(self.index.extent, extent())
+        for key in list(self.index.cell_of):
+            self.index.discard(key)
+        self.assertIsNone(self.index.extent)
+        self.assertEqual((self.index.rows, self.index.cols), ({}, {}))
+        self.assertEqual(self.index.nearest(53, -6), (None, None))
+
+    def test_haversine(self):
+        haversine = radarscoped.GridIndex.haversine
+        self.assertAlmostEqual(haversine(53, -6, 54, -6), 60)
+        self.assertAlmostEqual(haversine(0, 0, 0, 1), 60)
+        self.assertAlmostEqual(haversine(0, 0, 0, 180), 180 * 60)
+        # Dublin to London Heathrow
+        self.assertAlmostEqual(haversine(53.421, -6.270, 51.470, -0.454), 243, delta=1)
+
+
+class FeedReplayTestCase(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'adsb.log.gz')
+
+        recorder = radarscoped.FeedRecorder(self.path)
+        recorder.record('aircraft.json', self.document(0), timestamp=1000.0)
+        recorder.record('receiver.json', b'{"lat": 53.34, "lon": -6.22}', timestamp=1000.1)
+        recorder.record('aircraft.json', self.document(0), timestamp=1001.0)
+        recorder.record('aircraft.json', self.document(1), timestamp=1001.0)
+        recorder.close()
+
+        # appending after a restart
+        recorder = radarscoped.FeedRecorder(self.path)
+        for i in range(2, 20):
+            recorder.record('aircraft.json', self.document(i), timestamp=1000.0 + i)
+        recorder.close()
+
+    @staticmethod
+    def document(i):
+        return json.dumps({'now': 1000.0 + i, 'aircraft': [{'hex': 'abcdef', 'lat': 53 + i / 100, 'lon': -6}]},
+                          indent=1).encode('utf-8')
+
+    def test_read(self):
+        records = list(radarscoped.FeedRecorder.read(self.path))
+        self.assertEqual(len(records), 21)
+        self.assertEqual(records[1], (1000.1, 'receiver.json', b'{"lat": 53.34, "lon": -6.22}'))
+        self.assertEqual(records[-1], (1019.0, 'aircraft.json', self.document(19)))
+
+    def test_read_truncated(self):
+        with open(self.path, 'rb') as file:
+            log = file.read()
+        with open(self.path, 'wb') as file:
+            file.write(log[:-20])
+        records = list(radarscoped.FeedRecorder.read(self.path))
+        self.assertTrue(10 < len(records) < 21)
+        self.assertEqual(records[-1][2], self.document(len(records) - 2))
+
+    def test_replay_fast(self):
+        replay = radarscoped.FeedReplay(self.path, speed=0)
+        status, headers, body = replay.fetch('http://localhost/data/aircraft.json')
+        self.assertEqual((status, body), (200, self.document(0)))
+        started = replay.clock()
+        self.assertEqual(json.loads(replay.fetch('http://localhost/data/receiver.json')[2])['lat'], 53.34)
+
+        for i in range(1, 20):
+            self.assertEqual(replay.fetch('http://localhost/data/aircraft.json')[2], self.document(i))
+        self.assertAlmostEqual(replay.clock() - started, 19)
+        self.assertFalse(replay.finished)
+        self.assertEqual(replay.fetch('http://localhost/data/aircraft.json')[2], self.document(19))
+        self.assertTrue(replay.finished)
+
+        with self.assertRaises(urllib.error.HTTPError):
+            replay.fetch('http://localhost/data/stats.json')
+
+    def test_replay_loop(self):
+        replay = radarscoped.FeedReplay(self.path, speed=0, loop=True)
+        for i in range(20):
+            replay.fetch('http://localhost/data/aircraft.json')
+        started = replay.clock()
+        self.assertEqual(replay.fetch('http://localhost/data/aircraft.json')[2], self.document(0))
+        self.assertEqual(replay.fetch('http://localhost/data/aircraft.json')[2], self.document(1))
+        self.assertGreater(replay.clock(), started)
+        self.assertFalse(replay.finished)
+
+    def test_replay_accelerated(self):
+        replay = radarscoped.FeedReplay(self.path, speed=10)
+        self.assertEqual(replay.fetch('http://localhost/data/aircraft.json')[2], self.document(0))
+        self.assertEqual(replay.fetch('http://localhost/data/aircraft.json')[2], self.document(0))
+
+        # a second later, the replay is 10 seconds further
+        replay.started -= 1
+        self.assertEqual(replay.fetch('http://localhost/data/aircraft.json')[2], self.document(10))
+        self.assertAlmostEqual(replay.clock() - time.monotonic(), 9, places=1)
+
+    def test_daemon(self):
+        self.radard = radarscoped.RadarDaemon('/tmp/test_radard.pid')
+        self.radard.config_file = 'radarscope.conf'
+        self.radard.configure()
+        self.radard.record_file = self.path + '.new'
+        snapshot = self.radard.fetch_snapshot()
+        self.assertEqual(len(snapshot.aircraft), 9)
+        self.radard.stop_threads()
+
+        configuration, settings = self.radard.parse_config('radarscope.conf')
+        settings.update(source='replay', replay=(self.radard.record_file, 0, False), record_file=None)
+        self.assertEqual(self.radard.apply_config(settings), {'source', 'replay', 'record_file'})
+        snapshot = self.radard.fetch_snapshot()
+        self.assertEqual(len(snapshot.aircraft), 9)
+        self.assertEqual(snapshot.origin, self.radard.get_receiver_origin())
+        self.assertEqual(snapshot.timestamp, self.radard.replay.clock())
+        self.assertIsNone(self.radard.fetch_snapshot())
+
+
+    def test_daemon_feeds(self):
+        traffic = SyntheticTraffic(50, seed=1)
+        server = MockHttpdServer(('localhost', 0), traffic)
+        threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        self.radard = radarscoped.RadarDaemon('/tmp/test_radard.pid')
+        self.radard.config_file = 'radarscope.conf'
+        self.radard.configure()
+        self.radard.record_file = self.path + '.new'
+        self.radard.feed_urls = ('http://localhost:{}/data/aircraft.json'.format(server.server_address[1]),)
+        snapshot = self.radard.fetch_snapshot()
+        self.assertEqual(len(snapshot.aircraft), 9 + 50)
+        self.radard.stop_threads()
+
+        # only the receiver of aircraft_url is recorded
+        records = list(radarscoped.FeedRecorder.read(self.radard.record_file))
+        self.assertEqual(sorted(name for _, name, _ in records), ['aircraft.json', 'receiver.json'])
+        self.assertEqual(len(json.loads(records[0][2])['aircraft']), 9)
+
+class SBSSourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockSBSServer(('localhost', 0), speed=0, loop=False)
+        threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True).start()
+        self.source = radarscoped.SBSSource('localhost', self.server.server_address[1], reconnect_delay=0.01)
+        self.source.logger.disabled = True
+
+    def tearDown(self):
+        self.source.stop()
+        if self.source.is_alive():
+            self.source.join(2)
+        self.source.logger.disabled = False
+        self.server.shutdown()
+        self.server.server_close()
+
+    def wait_for(self, condition):
+        for _ in range(200):
+            if condition():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def test_get_aircraft(self):
+        self.source.start()
+        self.assertTrue(self.wait_for(lambda: self.source.messages >= len(self.server.messages)))
+
+        all_aircraft = {plane['hex']: plane for plane in self.source.get_aircraft()}
+        self.assertEqual(len(all_aircraft), 8)
+
+        plane = all_aircraft['4ca292']
+        self.assertEqual(plane['flight'], 'EIN34Y')
+        self.assertEqual(plane['squawk'], '3043')
+        self.assertEqual(plane['altitude'], 8100)
+        self.assertEqual(plane['lat'], 53.2367)
+        self.assertEqual(plane['lon'], -5.72457)
+        self.assertEqual(plane['speed'], 285)
+        self.assertEqual(plane['track'], 328)
+        self.assertEqual(plane['vert_rate'], -512)
+        self.assertLess(plane['seen_pos'], 5)
+
+        self.assertNotIn('lat', all_aircraft['4ca836'])
+        self.assertEqual(len(radarscoped.RadarDaemon.parse_positions(all_aircraft.values())), 7)
+
+    def test_reconnect(self):
+        self.source.start()
+        self.assertTrue(self.wait_for(lambda: self.source.connections >= 2))
+
+    def test_connection_refused(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.source.start()
+        time.sleep(0.1)
+
+        # the source keeps on trying to connect
+        self.assertTrue(self.source.is_alive())
+        self.assertEqual(self.source.connections, 0)
+        self.assertEqual(self.source.get_aircraft(), [])
+
+    def test_handle_message_invalid(self):
+        self.source.handle_message(b'MSG,3,1,1,4CA292,1,,,,,,xyz,,,53.1,-6.1,,,0,0,0,0')
+        self.source.handle_message(b'STA,,1,1,4CA292,1,,,,,,,,,,,,,,,,')
+        self.source.handle_message(b'MSG,3,1,1')
+
+        self.assertEqual(list(self.source.aircraft), ['4ca292'])
+        self.assertNotIn('altitude', self.source.aircraft['4ca292'])
+
+        # a message with an invalid field updates none of the others
+        self.source.handle_message(b'MSG,3,1,1,4CA292,1,,,,,,8100,,,53.1,-6.1,,,0,0,0,0')
+        self.source.handle_message(b'MSG,3,1,1,4CA292,1,,,,,,9000,,,53.2,xyz,,,0,0,0,0')
+        plane = self.source.aircraft['4ca292']
+        self.assertEqual((plane['altitude'], plane['lat'], plane['lon']), (8100, 53.1, -6.1))
+
+    def test_expire(self):
+        self.source.handle_message(b'MSG,5,1,1,4CA292,1,,,,,,8100,,,,,,,0,0,0,0')
+        self.source.expire(time.monotonic() + 299)
+        self.assertIn('4ca292', self.source.aircraft)
+
+        self.source.expire(time.monotonic() + 301)
+        self.assertEqual(self.source.aircraft, {})
+        self.assertEqual(self.source.times, {})
+
+
+class FrameBufferTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.display = RecordingDisplay()
+        self.framebuffer = radarscoped.FrameBuffer(self.display, (16, 16))
+
+    def test_first_frame(self):
+        self.framebuffer.set_pixel(3, 4, 255, 128, 0)
+        self.assertEqual(self.framebuffer.get_pixel(3, 4), (255, 128, 0))
+
+        self.assertTrue(self.framebuffer.show())
+        self.assertEqual(self.display.clears, 1)
+        self.assertEqual(self.display.shows, 1)
+        self.assertEqual(len(self.display.pixels), 256)
+        self.assertIn((3, 4, 255, 128, 0), self.display.pixels)
+        self.assertEqual(self.framebuffer.changed_pixels, 256)
+
+    def test_unchanged_frame(self):
+        self.framebuffer.set_pixel(3, 4, 255, 128, 0)
+        self.framebuffer.show()
+
+        self.framebuffer.clear()
+        self.framebuffer.set_pixel(3, 4, 255, 128, 0)
+        self.assertFalse(self.framebuffer.show())
+        self.assertEqual(self.display.shows, 1)
+        self.assertEqual(self.framebuffer.changed_pixels, 0)
+        self.assertEqual(self.framebuffer.skipped_shows, 1)
+
+    def test_background(self):
+        self.framebuffer.set_pixel(8, 8, 255, 255, 255)
+        self.framebuffer.set_background()
+
+        self.framebuffer.set_pixel(3, 4, 255, 128, 0)
+        self.framebuffer.clear()
+        self.assertEqual(self.framebuffer.get_pixel(8, 8), (255, 255, 255))
+        self.assertEqual(self.framebuffer.get_pixel(3, 4), (0, 0, 0))
+
+        self.framebuffer.clear_background()
+        self.framebuffer.clear()
+        self.assertEqual(self.framebuffer.get_pixel(8, 8), (0, 0, 0))
+
+    def test_changed_frame(self):
+        self.framebuffer.set_pixel(3, 4, 255, 128, 0)
+        self.framebuffer.show()
+        self.display.pixels = list()
+
+        self.framebuffer.clear()
+        self.framebuffer.set_pixel(3, 5, 255, 128, 0)
+        self.framebuffer.set_pixel(15, 15, 12.8, 12.8, 12.8)
+        self.assertTrue(self.framebuffer.show())
+        self.assertEqual(self.display.shows, 2)
+        self.assertEqual(sorted(self.display.pixels), [(3, 4, 0, 0, 0), (3, 5, 255, 128, 0), (15, 15, 12, 12, 12)])
+        self.assertEqual(self.framebuffer.changed_pixels, 3)
+
+    def test_invalidate(self):
+        self.framebuffer.show()
+        self.framebuffer.invalidate()
+
+        self.assertTrue(self.framebuffer.show())
+        self.assertEqual(self.display.clears, 2)
+        self.assertEqual(self.framebuffer.changed_pixels, 256)
+
+
+class DisplayTestCase(unittest.TestCase):
+
+    def test_memory(self):
+        display = radarscoped.create_display('memory', shape=(16, 8))
+        self.assertEqual(display.get_shape(), (16, 8))
+        framebuffer = radarscoped.FrameBuffer(display, display.get_shape())
+        framebuffer.set_pixel(15, 7, 255, 128, 0)
+        self.assertEqual(display.get_pixel(15, 7), (0, 0, 0))
+
+        framebuffer.show()
+        self.assertEqual(display.get_pixel(15, 7), (255, 128, 0))
+        self.assertEqual(display.shows, 1)
+        self.assertEqual(display.frame, framebuffer.frame)
+        display.off()
+        self.assertEqual(display.get_pixel(15, 7), (0, 0, 0))
+
+    def test_image(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        display = radarscoped.create_display('image', os.path.join(directory.name, 'scope.ppm'), (4, 2))
+        display.set_pixel(1, 1, 255, 128, 0)
+        display.set_pixel(3, 0, 0, 0, 255)
+        display.show()
+        with open(display.path, 'rb') as file:
+            self.assertEqual(file.read(), b'P6 4 2 255\n' + bytes(9) + bytes((0, 0, 255)) +
+                             bytes(3) + bytes((255, 128, 0)) + bytes(6))
+
+        display = radarscoped.ImageDisplay(os.path.join(directory.name, 'scope-{:03d}.png'), (4, 2), scale=2)
+        display.set_pixel(1, 1, 255, 128, 0)
+        display.show()
+        display.show()
+        self.assertEqual(sorted(os.listdir(directory.name)), ['scope-001.png', 'scope-002.png', 'scope.ppm'])
+        with open(os.path.join(directory.name, 'scope-002.png'), 'rb') as file:
+            png = file.read()
+        self.assertEqual(png[:8], b'\x89PNG\r\n\x1a\n')
+        self.assertEqual(png[16:24], bytes((0, 0, 0, 8, 0, 0, 0, 4)))
+        data = radarscoped.zlib.decompress(png[png.index(b'IDAT') + 4:png.index(b'IEND') - 8])
+        self.assertEqual(len(data), 4 * (1 + 8 * 3))
+        self.assertEqual(data[2 * 25 + 1 + 2 * 3:2 * 25 + 1 + 4 * 3], bytes((255, 128, 0)) * 2)
+
+    def test_create_display(self):
+        self.assertIs(radarscoped.create_display('hat'), radarscoped.uh)
+        self.assertIsInstance(radarscoped.create_display('null'), radarscoped.NullDisplay)
+        with self.assertRaises(ValueError):
+            radarscoped.create_display('image')
+        with self.assertRaises(ValueError):
+            radarscoped.create_display('lcd')
+
+
+class HTTPConnectionPoolTestCase(unittest.TestCase):
+
+    url = 'http://localhost:10080/dump1090-fa/data/receiver.json'
+
+    def setUp(self):
+        self.pool = radarscoped.HTTPConnectionPool(retries=1, backoff=0)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_request(self):
+        status, headers, body = self.pool.request(self.url)
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-type'], 'application/json')
+        self.assertEqual(json.loads(body.decode('utf-8'))['version'], '3.5.3')
+
+    def test_connection_reused(self):
+        self.pool.request(self.url)
+        conn = self.pool.idle[('http', 'localhost:10080')][0]
+
+        self.pool.request(self.url)
+        self.assertEqual(self.pool.idle[('http', 'localhost:10080')], [conn])
+
+    def test_stale_connection(self):
+        self.pool.request(self.url)
+        self.pool.idle[('http', 'localhost:10080')][0].sock.close()
+
+        status, _, _ = self.pool.request(self.url)
+        self.assertEqual(status, 200)
+
+    def test_connection_refused(self):
+        with self.assertRaises(OSError):
+            self.pool.request('http://localhost:1/receiver.json')
+
+    def test_mock_conditional(self):
+        _, headers, _ = self.pool.request(self.url)
+        etag = headers['ETag']
+
+        status, _, body = self.pool.request(self.url, {'If-None-Match': etag})
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b'')
+
+        status, _, _ = self.pool.request(self.url, {'If-Modified-Since': headers['Last-Modified']})
+        self.assertEqual(status, 304)
+
+        status, _, _ = self.pool.request(self.url, {'If-None-Match': '"outdated"'})
+        self.assertEqual(status, 200)
+
+    def test_mock_gzip(self):
+        status, headers, body = self.pool.request(self.url, {'Accept-Encoding': 'gzip'})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(body).decode('utf-8'))['version'], '3.5.3')
+
+    def test_close(self):
+        self.pool.request(self.url)
+        conn = self.pool.idle[('http', 'localhost:10080')][0]
+
+        self.pool.close()
+        self.assertEqual(self.pool.idle, {})
+        self.assertIsNone(conn.sock)
+
+    def test_release_after_close(self):
+        conn, _ = self.pool.acquire('http', 'localhost:10080')
+
+        self.pool.close()
+        self.pool.release('http', 'localhost:10080', conn)
+        self.assertEqual(self.pool.idle, {})
+        self.assertIsNone(conn.sock)
+
+
+class SyntheticTrafficTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.traffic = SyntheticTraffic(500, origin=(53.34, -6.22), radius=100, interval=0.05, seed=1)
+        self.server = MockHttpdServer(('localhost', 0), self.traffic)
+        threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True).start()
+        self.url = 'http://localhost:{}/dump1090-fa/data/'.format(self.server.server_address[1])
+        self.pool = radarscoped.HTTPConnectionPool(retries=1, backoff=0)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_receiver(self):
+        _, _, body = self.pool.request(self.url + 'receiver.json')
+        self.assertEqual(json.loads(body)['lat'], 53.34)
+
+    def test_aircraft(self):
+        status, headers, body = self.pool.request(self.url + 'aircraft.json', {'Accept-Encoding': 'gzip'})
+        self.assertEqual(status, 200)
+        aircraft = json.loads(gzip.decompress(body))['aircraft']
+        self.assertEqual(len(aircraft), 500)
+        self.assertEqual(len({plane['hex'] for plane in aircraft}), 500)
+        for plane in aircraft:
+            self.assertLessEqual(math.hypot((plane['lat'] - 53.34) * 60,
+                                            (plane['lon'] + 6.22) * 60 * math.cos(math.radians(53.34))), 100)
+
+        # the document is cached until the next update
+        status, _, _ = self.pool.request(self.url + 'aircraft.json', {'If-None-Match': headers['ETag']})
+        self.assertIn(status, (200, 304))
+        time.sleep(0.2)
+        status, _, body = self.pool.request(self.url + 'aircraft.json', {'If-None-Match': headers['ETag']})
+        self.assertEqual(status, 200)
+        self.assertNotEqual(json.loads(body)['aircraft'][0]['lat'], aircraft[0]['lat'])
+
+    def test_update(self):
+        document = self.traffic.document
+        self.traffic.update(60)
+        self.assertIsNot(self.traffic.document, document)
+        self.assertNotEqual(self.traffic.document[2], document[2])
+        self.assertEqual(len(json.loads(self.traffic.document[0])['aircraft']), 500)
+
+    def test_level_off(self):
+        climbing, descending = self.traffic.spawn(), self.traffic.spawn()
+        climbing.update(alt_baro=30000, cruise=35000, lat=53.34, lon=-6.22, gs=100.0)
+        descending.update(alt_baro=12000, cruise=9000, lat=53.34, lon=-6.22, gs=100.0)
+        for _ in range(600):
+            self.traffic.move(climbing, 1.0)
+            self.traffic.move(descending, 1.0)
+
+        self.assertEqual((climbing['alt_baro'], climbing['baro_rate']), (35000, 0))
+        self.assertEqual((descending['alt_baro'], descending['baro_rate']), (9000, 0))
+
+        self.traffic.aircraft = [climbing]
+        self.traffic.update(0.0)
+        self.assertEqual(json.loads(self.traffic.document[0])['aircraft'][0]['alt_baro'], 35000)
+
+
+class JSONDecoderTestCase(unittest.TestCase):
+
+    document = b'{"now": 1516655801.7, "aircraft": [{"hex": "4ca292", "flight": "EIN34Y  ", "lat": 53.2, ' \
+               b'"lon": -5.7, "altitude": 8100, "squawk": "3043", "mlat": [], "rssi": -11.5}]}'
+
+    def installed_backends(self):
+        modules = {'orjson': radarscoped.orjson, 'ujson': radarscoped.ujson, 'json': radarscoped.json}
+        return [name for name in radarscoped.JSONDecoder.backends if modules[name] is not None]
+
+    def test_decode(self):
+        expected = json.loads(self.document)
+        for backend in self.installed_backends():
+            decoder = radarscoped.JSONDecoder(backend)
+            self.assertEqual(decoder.backend, backend)
+            self.assertEqual(decoder.decode(self.document), expected)
+
+    def test_decode_encoding(self):
+        for backend in self.installed_backends():
+            decoder = radarscoped.JSONDecoder(backend)
+            document = '{"flight": "\u00c9I"}'.encode('latin-1')
+            self.assertEqual(decoder.decode(document, 'ISO-8859-1'), {'flight': '\u00c9I'})
+
+    def test_decode_invalid(self):
+        for backend in self.installed_backends():
+            with self.assertRaises(ValueError):
+                radarscoped.JSONDecoder(backend).decode(b'{"now": ')
+
+    def test_auto(self):
+        self.assertEqual(radarscoped.JSONDecoder().backend, self.installed_backends()[0])
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            radarscoped.JSONDecoder('simplejson')
+
+
+class AircraftFeedTestCase(unittest.TestCase):
+
+    url = 'http://localhost:10080/dump1090-fa/data/aircraft.json'
+
+    def setUp(self):
+        self.pool = radarscoped.HTTPConnectionPool(retries=0)
+        self.requests = list()
+        self.responses = list()
+
+    def tearDown(self):
+        self.pool.close()
+
+    def fetch(self, url, headers):
+        self.requests.append(headers)
+        if self.responses:
+            response = self.responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return self.pool.request(url, headers)
+
+    def feed(self):
+        feed = radarscoped.AircraftFeed(self.url, self.fetch, radarscoped.JSONDecoder())
+        feed.logger.disabled = True
+        self.addCleanup(setattr, feed.logger, 'disabled', False)
+        return feed
+
+    def test_get_aircraft(self):
+        feed = self.feed()
+
+        aircraft = feed.get_aircraft()
+        self.assertTrue(feed.changed)
+        self.assertEqual(len(aircraft), 9)
+        self.assertEqual(self.requests[0], {'Accept-Encoding': 'gzip'})
+        self.assertEqual(feed.now, b'1516655801.7')
+
+        self.assertIs(feed.get_aircraft(), aircraft)
+        self.assertFalse(feed.changed)
+        self.assertEqual(self.requests[1]['If-None-Match'], feed.etag)
+        self.assertEqual(self.requests[1]['If-Modified-Since'], feed.last_modified)
+        self.assertEqual((feed.fetches, feed.not_modified, feed.unchanged), (2, 1, 0))
+
+    def test_unchanged_now(self):
+        feed = self.feed()
+        aircraft = feed.get_aircraft()
+
+        headers = http.client.HTTPMessage()
+        self.responses.append((200, headers, b'{ "now" : 1516655801.7, "aircraft" : [ invalid'))
+        self.assertIs(feed.get_aircraft(), aircraft)
+        self.assertFalse(feed.changed)
+        self.assertEqual(feed.unchanged, 1)
+
+        self.responses.append((200, headers, b'{ "now" : 1516655802.7, "aircraft" : [ {"hex": "4ca292"} ] }'))
+        self.assertEqual(feed.get_aircraft(), [{'hex': '4ca292'}])
+        self.assertTrue(feed.changed)
+
+    def test_fetch_failure(self):
+        feed = self.feed()
+        aircraft = feed.get_aircraft()
+
+        self.responses.append(OSError('connection refused'))
+        self.assertIs(feed.get_aircraft(), aircraft)
+        self.assertFalse(feed.changed)
+
+        self.responses.append((200, http.client.HTTPMessage(), b'{ "now" : 1516655802.7, "aircraft" : [ invalid'))
+        self.assertIs(feed.get_aircraft(), aircraft)
+        self.assertFalse(feed.changed)
+
+        summary = feed.metrics.summary()
+        self.assertEqual(summary['counters'], {'fetch_errors': 2})
+        self.assertEqual(summary['stages']['fetch']['count'], 3)
+        self.assertEqual(summary['stages']['decode']['count'], 1)
+
+
+class ReceiverOriginCacheTestCase(unittest.TestCase):
+
+    class Headers(dict):
+        pass
+
+    def setUp(self):
+        self.requests = list()
+        self.responses = list()
+        self.cache = radarscoped.ReceiverOriginCache(self.fetch, 'http://localhost/receiver.json', ttl=60)
+
+    def fetch(self, url, headers):
+        self.requests.append(headers)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def respond(self, lat=53.34, lon=-6.22, etag='"abc"'):
+        body = json.dumps({'lat': lat, 'lon': lon}).encode('utf-8')
+        self.responses.append((200, self.Headers(ETag=etag), body))
+
+    def expire(self):
+        self.cache.expires = 0
+        self.cache.get()
+        self.cache.revalidation.join()
+
+    def test_get_cached(self):
+        self.respond()
+        self.assertEqual(self.cache.get(), (53.34, -6.22))
+        self.assertEqual(self.cache.get(), (53.34, -6.22))
+        self.assertEqual(len(self.requests), 1)
+
+    def test_revalidate_conditional(self):
+        self.respond()
+        self.cache.get()
+
+        self.responses.append((304, self.Headers(), b''))
+        self.expire()
+        self.assertEqual(self.requests[1], {'If-None-Match': '"abc"'})
+        self.assertEqual(self.cache.get(), (53.34, -6.22))
+
+        self.respond(lat=53.35, etag='"def"')
+        self.expire()
+        self.assertEqual(self.cache.get(), (53.35, -6.22))
+        self.assertEqual(self.cache.etag, '"def"')
+
+    def test_fetch_failure_keeps_last_origin(self):
+        self.respond()
+        self.cache.get()
+
+        self.responses.append(OSError('connection refused'))
+        self.expire()
+        self.assertEqual(self.cache.get(), (53.34, -6.22))
+
+    def test_fetch_failure_no_origin(self):
+        self.responses.append(OSError('connection refused'))
+        self.assertEqual(self.cache.get(), (None, None))
+
+        # a failed fetch is not retried before the retry interval
+        self.assertEqual(self.cache.get(), (None, None))
+        self.assertEqual(len(self.requests), 1)
+
+
+class WaypointsTestCase(unittest.TestCase):
+
+    bounds = (52, 54, -7, -5)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_csv(self):
+        path = self.write('airports.csv', '\n'.join([
+            '"id","ident","type","name","latitude_deg","longitude_deg"',
+            '1,"EIDW","large_airport","Dublin Airport",53.421299,-6.27007',
+            '2,"EIWT","small_airport","Weston Airport",53.3522,-6.48611',
+            '3,"EGLL","large_airport","London Heathrow Airport",51.4706,-0.461941',
+            '4,"XXXX","closed","Broken",,',
+        ]))
+
+        waypoints = radarscoped.Waypoints([path])
+        self.assertTrue(waypoints.cull(self.bounds))
+        self.assertEqual(list(waypoints), [{'icao_code': 'EIDW', 'lat': 53.421299, 'lon': -6.27007},
+                                           {'icao_code': 'EIWT', 'lat': 53.3522, 'lon': -6.48611}])
+        self.assertFalse(waypoints.cull(self.bounds))
+
+        waypoints = radarscoped.Waypoints([path], types=['large_airport'])
+        waypoints.cull(self.bounds)
+        self.assertEqual([waypoint['icao_code'] for waypoint in waypoints], ['EIDW'])
+
+        waypoints.cull((50, 55, -7, 0))
+        self.assertEqual([waypoint['icao_code'] for waypoint in waypoints], ['EIDW', 'EGLL'])
+
+    def test_geojson(self):
+        features = [
+            {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [-6.27007, 53.421299]},
+             'properties': {'ident': 'EIDW', 'name': 'Dublin Airport, "Collinstown" [1940]'}},
+            {'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': [[-6, 53], [-6.1, 53.1]]},
+             'properties': {}},
+            {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [-0.461941, 51.4706]},
+             'properties': {'ident': 'EGLL'}},
+            {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [-6.1, 53.1]},
+             'properties': {'name': 'ABBEY'}},
+        ]
+        path = self.write('waypoints.geojson', json.dumps({'type': 'FeatureCollection', 'features': features},
+                                                          indent=2))
+
+        # read the file a few characters at a time, so that the features straddle the chunks
+        waypoints = radarscoped.Waypoints([path], chunk_size=7)
+        waypoints.cull(self.bounds)
+        self.assertEqual(list(waypoints), [{'icao_code': 'EIDW', 'lat': 53.421299, 'lon': -6.27007},
+                                           {'icao_code': 'ABBEY', 'lat': 53.1, 'lon': -6.1}])
+
+    def test_invalid_files(self):
+        paths = [
+            os.path.join(self.directory.name, 'missing.csv'),
+            self.write('header.csv', 'ident,name\nEIDW,Dublin\n'),
+            self.write('truncated.geojson', '{"type": "FeatureCollection", "features": [{"type": "Feature"'),
+            self.write('valid.csv', 'ident,lat,lon\nEIDW,53.42,-6.27\n'),
+        ]
+
+        waypoints = radarscoped.Waypoints(paths)
+        with self.assertLogs(waypoints.logger, 'ERROR') as logs:
+            waypoints.cull(self.bounds)
+        self.assertEqual(len(logs.output), 3)
+        self.assertEqual(len(waypoints), 1)
+
+    def test_plot_waypoints(self):
+        path = self.write('airports.csv', 'ident,lat,lon\nEIDW,53.42,-6.27\nEGLL,51.47,-0.46\n')
+        radard = radarscoped.RadarDaemon('/tmp/test_radard.pid')
+        radard.framebuffer = radarscoped.FrameBuffer(RecordingDisplay(), (16, 16))
+        radard.waypoints = radarscoped.Waypoints([path])
+
+        radard.plot([], 72, (53.34, -6.22))
+        pixel = radard.get_projection(72, (53.34, -6.22)).project(53.42, -6.27)
+        self.assertEqual(radard.framebuffer.get_pixel(*pixel), (12, 12, 12))
+        self.assertEqual(len(radard.waypoints), 1)
+
 
 if __name__ == '__main__':
     unittest.main()